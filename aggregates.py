@@ -0,0 +1,170 @@
+"""
+Materialised history aggregates.
+
+Triggers on `history` keep two tables current inside the same transaction
+as every insert and delete, so the dashboard never scans `history`:
+
+  history_totals   one row per (file_type, verdict): count + ai_score sum
+  history_rollups  the same per minute / hour / day bucket
+  history_version  one counter bumped on every change (history ETags)
+
+/api/stats reads the handful of totals rows; the time-series endpoint does
+an index range scan over one granularity of the rollups.
+"""
+from datetime import datetime, timedelta, timezone
+
+
+GRANULARITIES = {
+    # name: (strftime bucket format, bucket length)
+    "minute": ("%Y-%m-%d %H:%M:00", timedelta(minutes=1)),
+    "hour":   ("%Y-%m-%d %H:00:00", timedelta(hours=1)),
+    "day":    ("%Y-%m-%d 00:00:00", timedelta(days=1)),
+}
+
+
+def _rollup_sql(sign, row):
+    """UPSERTs applying one history row (`row` = NEW or OLD) to totals and rollups."""
+    key = f"COALESCE({row}.file_type, ''), COALESCE({row}.verdict, '')"
+    score = f"{sign}COALESCE({row}.ai_score, 0)"
+    statements = [
+        f"INSERT INTO history_totals (file_type, verdict, count, ai_score_sum) "
+        f"VALUES ({key}, {sign}1, {score}) "
+        f"ON CONFLICT (file_type, verdict) DO UPDATE SET "
+        f"count = count + excluded.count, ai_score_sum = ai_score_sum + excluded.ai_score_sum;"
+    ]
+    for name, (fmt, _) in GRANULARITIES.items():
+        statements.append(
+            f"INSERT INTO history_rollups (granularity, bucket, file_type, verdict, count, ai_score_sum) "
+            f"VALUES ('{name}', strftime('{fmt}', {row}.timestamp), {key}, {sign}1, {score}) "
+            f"ON CONFLICT (granularity, bucket, file_type, verdict) DO UPDATE SET "
+            f"count = count + excluded.count, ai_score_sum = ai_score_sum + excluded.ai_score_sum;"
+        )
+    return "\n".join(statements)
+
+
+def init_aggregates(conn):
+    """Create the aggregate tables and triggers; backfill them from an existing history."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS history_totals (
+            file_type    TEXT NOT NULL,
+            verdict      TEXT NOT NULL,
+            count        INTEGER NOT NULL,
+            ai_score_sum REAL NOT NULL,
+            PRIMARY KEY (file_type, verdict)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS history_rollups (
+            granularity  TEXT NOT NULL,
+            bucket       TEXT NOT NULL,
+            file_type    TEXT NOT NULL,
+            verdict      TEXT NOT NULL,
+            count        INTEGER NOT NULL,
+            ai_score_sum REAL NOT NULL,
+            PRIMARY KEY (granularity, bucket, file_type, verdict)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS history_aggregates_insert AFTER INSERT ON history
+        BEGIN
+            {_rollup_sql("", "NEW")}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS history_aggregates_delete AFTER DELETE ON history
+        BEGIN
+            {_rollup_sql("-", "OLD")}
+        END
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS history_version (
+            id      INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO history_version (id, version) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS history_version_{event.lower()} AFTER {event} ON history
+            BEGIN
+                UPDATE history_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+    has_history = conn.execute("SELECT EXISTS (SELECT 1 FROM history)").fetchone()[0]
+    has_totals  = conn.execute("SELECT EXISTS (SELECT 1 FROM history_totals)").fetchone()[0]
+    if has_history and not has_totals:
+        rebuild_aggregates(conn)
+
+
+def rebuild_aggregates(conn):
+    """Recompute both tables from `history` (one full scan)."""
+    conn.execute("DELETE FROM history_totals")
+    conn.execute("DELETE FROM history_rollups")
+    conn.execute('''
+        INSERT INTO history_totals (file_type, verdict, count, ai_score_sum)
+        SELECT COALESCE(file_type, ''), COALESCE(verdict, ''), COUNT(*), TOTAL(ai_score)
+        FROM history GROUP BY 1, 2
+    ''')
+    for name, (fmt, _) in GRANULARITIES.items():
+        conn.execute(f'''
+            INSERT INTO history_rollups (granularity, bucket, file_type, verdict, count, ai_score_sum)
+            SELECT '{name}', strftime('{fmt}', timestamp), COALESCE(file_type, ''), COALESCE(verdict, ''),
+                   COUNT(*), TOTAL(ai_score)
+            FROM history GROUP BY 2, 3, 4
+        ''')
+
+
+def history_version(conn):
+    """Changes whenever a history row is inserted, updated or deleted."""
+    return conn.execute("SELECT version FROM history_version WHERE id = 1").fetchone()[0]
+
+
+def totals(conn):
+    """{"total", "by_type", "by_verdict", "avg_ai_score"} from history_totals."""
+    rows = conn.execute(
+        "SELECT file_type, verdict, count, ai_score_sum FROM history_totals WHERE count > 0"
+    ).fetchall()
+    return _summarise(rows)
+
+
+def timeseries(conn, granularity, since, until=None, file_type=None):
+    """Buckets in [since, until] (datetimes, UTC), oldest first."""
+    fmt, _ = GRANULARITIES[granularity]
+    sql    = ("SELECT bucket, file_type, verdict, count, ai_score_sum FROM history_rollups "
+              "WHERE granularity = ? AND bucket >= ? AND count > 0")
+    params = [granularity, since.strftime(fmt)]
+    if until is not None:
+        sql += " AND bucket <= ?"
+        params.append(until.strftime(fmt))
+    if file_type:
+        sql += " AND file_type = ?"
+        params.append(file_type)
+    sql += " ORDER BY bucket"
+
+    buckets = {}
+    for bucket, *rest in conn.execute(sql, params).fetchall():
+        buckets.setdefault(bucket, []).append(rest)
+    return [{"bucket": bucket, **_summarise(rows)} for bucket, rows in buckets.items()]
+
+
+def default_since(granularity, limit):
+    """Start of the bucket `limit - 1` buckets before the current one (UTC)."""
+    _, step = GRANULARITIES[granularity]
+    return datetime.now(timezone.utc).replace(tzinfo=None) - step * (limit - 1)
+
+
+def _summarise(rows):
+    total, score_sum = 0, 0.0
+    by_type, by_verdict = {}, {}
+    for file_type, verdict, count, ai_score_sum in rows:
+        total     += count
+        score_sum += ai_score_sum
+        by_type[file_type]  = by_type.get(file_type, 0) + count
+        by_verdict[verdict] = by_verdict.get(verdict, 0) + count
+    return {
+        "total":        total,
+        "by_type":      by_type,
+        "by_verdict":   by_verdict,
+        "avg_ai_score": round(score_sum / total, 4) if total else None
+    }
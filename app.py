@@ -1,37 +1,179 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, g
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
-import requests
+import re
+import math
+import time
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 from config import Config
+from http_client import clients, pool_stats, preconnect
+from router import router
+from jobs import job_queue, TERMINAL
+from cache import result_cache, hash_text
+from phash import near_duplicates, dhash_file
+from spool import UploadSpool, MultipartBody, SpooledRequest
+from documents import split_windows, select_for_provider, combine
+from text_engine import engine
+from storage import Database, BatchWriter, connect
+from assets import StaticAssets
+from outbox import outbox
+from blobs import blob_store, init_blob_refs
+from limits import limits
+from profiling import profiler, phase
+from media import FrameSampler, UnsupportedMedia, frames as media_frames, spread, combine as combine_frames
+from reports import export_rows, csv_chunks, ndjson_chunks, build_report, prune_reports, REPORT_NAME
+from aggregates import init_aggregates, history_version, totals, timeseries, default_since, GRANULARITIES
+from cascade import text_cascade, image_cascade, image_metadata_score, NEUTRAL_SCORE
+import cascade
+import metrics
+import profiling
 import json
 import hashlib
+import hmac
+import base64
+import uuid
+import threading
+import zlib
+
+# Cache namespaces — one per provider/model, so a verdict is only reused
+# for the same model that produced it.
+SIGHTENGINE_CACHE_NS = "sightengine/genai"
+HUGGINGFACE_CACHE_NS = "huggingface/therealvish/ai-image-detector"
+OPENROUTER_CACHE_NS  = "openrouter/openai/gpt-3.5-turbo"
+_CACHE_NS = {
+    "sightengine": SIGHTENGINE_CACHE_NS,
+    "huggingface": HUGGINGFACE_CACHE_NS,
+    "openrouter":  OPENROUTER_CACHE_NS,
+}
 
 
 # Serve static files from the current directory
 app = Flask(__name__, static_folder='.', static_url_path='')
 app.config.from_object(Config)
+app.request_class = SpooledRequest          # uploads are hashed + buffered in memory, see spool.py
+if Config.PROXY_HOPS:
+    # Behind a load balancer: the client address comes from X-Forwarded-For
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.PROXY_HOPS)
 
 # ── CORS: allow every origin so the static HTML frontend can reach the API ──
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=["ETag", "Server-Timing", "X-Profile-Id"])
+
+# ── Request metrics: count + latency per route template (not per URL).
+#    Phase timings go out as Server-Timing; a request asked for with
+#    X-Profile (admin token) or picked by the sample rate is profiled too
+#    (see profiling.py). ──
+@app.before_request
+def _start_timer():
+    g._started = time.perf_counter()
+    profiling.begin()
+    if request.path.startswith('/api/') and not request.path.startswith('/api/admin/'):
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        if request.headers.get('X-Profile') and _is_admin():
+            g._profile = profiler.start(route, request.method, "header")
+        elif profiler.wanted():
+            g._profile = profiler.start(route, request.method, "sampled")
+
+
+@app.after_request
+def _record_request(response):
+    started = getattr(g, "_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        route   = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.http_latency.observe(elapsed, route, request.method)
+        metrics.http_requests.inc(route, request.method, str(response.status_code))
+
+        phases  = profiling.end()
+        profile = g.pop("_profile", None)
+        if profile is not None:
+            profiler.finish(profile, response.status_code, elapsed, phases)
+            response.headers["X-Profile-Id"] = profile.id
+        if Config.SERVER_TIMING and (phases or profile is not None):
+            response.headers["Server-Timing"] = profiling.server_timing(
+                phases, elapsed, profile.id if profile is not None else None)
+    return response
+
+
+@app.teardown_request
+def _end_profile(exc):
+    if g.pop("_profile", None) is not None:
+        profiler.release()                      # the request failed before after_request
+    profiling.end()
+
+# ── Admission: per-client rate limit on the analysis endpoints (see limits.py).
+#    Batch endpoints charge one token per item themselves; media and document
+#    requests pay one here and one more per extra provider call they schedule. ──
+_PER_ITEM_ENDPOINTS = {"analyze_images", "analyze_text_batch"}
+
+
+@app.before_request
+def _admit():
+    if request.method == 'POST' and request.path.startswith('/api/analyze/') \
+            and request.endpoint not in _PER_ITEM_ENDPOINTS:
+        return _rate_limited()
+
+
+def _rate_limited(cost=1, paid=0):
+    """None when the client may run `cost` more analyses now, else a 429 response."""
+    refused = _rate_limit_refusal(cost, paid)
+    return _reply(refused, 429) if refused else None
+
+
+def _rate_limit_refusal(cost, paid=0):
+    """None when the client may run `cost` more analyses now (`paid` already spent), else the 429 body."""
+    if cost <= 0:
+        return None
+    wait = limits.take(request.remote_addr or "unknown", cost, paid)
+    if not wait:
+        return None
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.rate_limited.inc(route)
+    retry_after = max(1, math.ceil(wait))
+    return {"success": False, "error": f"Rate limit exceeded — retry in {retry_after}s", "retry_after": retry_after}
+
+
+def _reply(body, status):
+    """jsonify(body) with `status`, plus Retry-After when the body carries one (429/503)."""
+    response = jsonify(body)
+    response.status_code = status
+    if "retry_after" in body:
+        response.headers["Retry-After"] = str(body["retry_after"])
+    return response
 
 # Create directories
 os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(Config.REPORT_FOLDER, exist_ok=True)
 
+# ── Batch fan-out: one shared pool; every provider call holds one of that
+#    provider's slots, capped across all workers (see limits.py) ──
+_batch_pool = ThreadPoolExecutor(max_workers=Config.BATCH_WORKERS, thread_name_prefix="batch")
+
+
+def _limited(name, fn):
+    """Wrap a provider function so each call holds one of that provider's slots."""
+    profile = profiling.current()               # sample the pool thread into the request's profile
+    def call(*args):
+        with profiler.attached(profile, f"provider:{name}"), limits.slot(name):
+            return fn(*args)
+    return call
+
 
 # ─────────────────────────────────────────────
 # DATABASE
 # ─────────────────────────────────────────────
+db = Database(Config.DATABASE, row_factory=sqlite3.Row)     # dict-like rows
+
+
 def get_db():
-    conn = sqlite3.connect(Config.DATABASE)
-    conn.row_factory = sqlite3.Row          # dict-like rows
-    return conn
+    """This thread's reused connection (WAL + tuned pragmas, see storage.py)."""
+    return db.conn()
 
 
-def init_db():
-    conn = get_db()
+def init_db(conn):
     conn.execute('''
         CREATE TABLE IF NOT EXISTS history (
             id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -41,18 +183,20 @@ def init_db():
             human_score REAL,
             verdict     TEXT,
             confidence  REAL,
-            timestamp   DATETIME DEFAULT CURRENT_TIMESTAMP
+            timestamp   DATETIME DEFAULT CURRENT_TIMESTAMP,
+            blob        TEXT
         )
     ''')
-    conn.commit()
-    conn.close()
-
+    if "blob" not in {row[1] for row in conn.execute("PRAGMA table_info(history)")}:
+        conn.execute("ALTER TABLE history ADD COLUMN blob TEXT")    # hash of the stored upload, see blobs.py
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_history_file_type ON history (file_type, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_history_verdict ON history (verdict, timestamp)')
+    init_aggregates(conn)               # counters + rollups maintained by triggers
+    init_blob_refs(conn)                # blob reference counts, also by triggers
 
-init_db()
 
-
-def init_newsletter_db():
-    conn = get_db()
+def init_newsletter_db(conn):
     conn.execute('''
         CREATE TABLE IF NOT EXISTS newsletter_subscribers (
             id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -60,19 +204,60 @@ def init_newsletter_db():
             subscribed_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    conn.commit()
-    conn.close()
 
 
-init_newsletter_db()
+# Bump when init_db / init_newsletter_db change, so existing databases re-run them
+SCHEMA_VERSION = 2
+
+
+def ensure_schema():
+    """Create or migrate the schema unless PRAGMA user_version says it is current.
+
+    Once per deployment rather than once per process: the first worker to
+    get here takes the write lock and runs the DDL, the others wait on the
+    lock, see the version and return.  True when this call ran the DDL.
+    """
+    conn = connect(Config.DATABASE, timeout=30, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return False
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+                conn.execute("ROLLBACK")
+                return False
+            init_db(conn)
+            init_newsletter_db(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+    finally:
+        conn.close()
 
 
 # ─────────────────────────────────────────────
 # SERVE STATIC FILES
 # ─────────────────────────────────────────────
+# `python assets.py build` writes minified, fingerprinted, precompressed
+# files to ASSET_DIR; without a build the source files are served as-is.
+assets = StaticAssets(os.path.join(app.root_path, Config.ASSET_DIR))
+
+
 @app.route('/')
 def serve_index():
-    return send_file('index.html')
+    response = assets.response("index.html")
+    return response if response is not None else send_file('index.html')
+
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    response = assets.response(f"assets/{filename}")
+    if response is None:
+        return jsonify({"error": "Not found"}), 404
+    return response
 
 
 @app.route('/css/<path:filename>')
@@ -93,119 +278,439 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "message": "OmniDetect AI Backend",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "cache": result_cache.stats(),
+        "near_duplicates": near_duplicates.stats(),
+        "http": pool_stats(),
+        "router": router.stats(),
+        "cascade": cascade.stats(),
+        "history_writer": history_writer.stats(),
+        "outbox": outbox.stats(),
+        "uploads": blob_store.stats(),
+        "limits": limits.stats()
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of this worker's counters and histograms."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 # ─────────────────────────────────────────────
 # IMAGE ANALYSIS
 # ─────────────────────────────────────────────
 @app.route('/api/analyze/image', methods=['POST'])
 def analyze_image():
     try:
-        if 'image' not in request.files:
+        with phase("upload"):
+            files = request.files
+
+        if 'image' not in files:
             return jsonify({"success": False, "error": "No image provided"}), 400
 
-        image = request.files['image']
+        image = files['image']
         if image.filename == '':
             return jsonify({"success": False, "error": "No selected file"}), 400
 
-        filename = image.filename
-        filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-        image.save(filepath)
+        upload = _as_spool(image)
 
-        # 1️⃣ Try Sightengine
-        result = analyze_with_sightengine(filepath)
+        if _wants_async(request.form):
+            with upload.reader() as reader:
+                job_id = job_queue.submit("image", {"filename": image.filename}, reader.read())
+            return _job_accepted(job_id)
 
-        # 2️⃣ Fallback → HuggingFace
-        if "error" in result:
-            print(f"[WARN] Sightengine failed: {result['error']} — trying HuggingFace")
-            result = analyze_with_huggingface(filepath)
-
-        if "error" in result:
-            return jsonify({"success": False, "error": result["error"]}), 502
+        body, status = _analyze_image_upload(upload, image.filename)
+        return _reply(body, status)
 
-        ai_score    = float(result.get("ai_generated", 0.5))
-        human_score = round(1 - ai_score, 4)
-        ai_score    = round(ai_score, 4)
-
-        if ai_score > 0.75:
-            verdict = "AI Generated"
-        elif ai_score < 0.25:
-            verdict = "Human Created"
-        else:
-            verdict = "Uncertain"
-
-        confidence = round(1 - abs(ai_score - 0.5) * 2, 4)   # how far from 50/50
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
-        _save_history(filename, 'image', ai_score, human_score, verdict, confidence)
 
+@app.route('/api/analyze/images', methods=['POST'])
+def analyze_images():
+    """Batch variant: many files under the `images` field, scored concurrently."""
+    try:
+        files = request.files.getlist('images') or request.files.getlist('image')
+        if not files:
+            return jsonify({"success": False, "error": "No images provided"}), 400
+        if len(files) > Config.BATCH_MAX_FILES:
+            return jsonify({"success": False, "error": f"Too many files (max {Config.BATCH_MAX_FILES})"}), 400
+        limited = _rate_limited(len(files))
+        if limited:
+            return limited
+
+        uploads = [(f.filename, _as_spool(f)) for f in files]
+
+        def score(item):
+            filename, upload = item
+            if filename == '':
+                return {"success": False, "error": "No selected file"}
+            try:
+                body, _ = _analyze_image_upload(upload, filename)
+                return body
+            except Exception as e:
+                return {"success": False, "error": str(e)}
+
+        # map() keeps input order; the shared pool bounds total concurrency
+        results = []
+        for index, ((filename, _), body) in enumerate(zip(uploads, _batch_pool.map(score, uploads))):
+            results.append({"index": index, "filename": filename, **body})
+
+        succeeded = sum(1 for r in results if r["success"])
         return jsonify({
-            "success": True,
-            "data": {
-                "filename":    filename,
-                "ai_score":    ai_score,
-                "human_score": human_score,
-                "verdict":     verdict,
-                "confidence":  confidence,
-                "model_used":  result.get("model", "Multiple")
-            }
+            "success":   True,
+            "total":     len(results),
+            "succeeded": succeeded,
+            "failed":    len(results) - succeeded,
+            "results":   results
         })
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-def analyze_with_sightengine(filepath):
-    try:
-        with open(filepath, 'rb') as f:
-            response = requests.post(
-                "https://api.sightengine.com/1.0/check.json",
-                files={"media": f},
-                data={
-                    "models":     "genai",
-                    "api_user":   Config.SIGHTENGINE_API_USER,
-                    "api_secret": Config.SIGHTENGINE_API_SECRET
-                },
-                timeout=15
-            )
+def _as_spool(file_storage, kind="image"):
+    """The upload's UploadSpool (already hashed while it was received)."""
+    if isinstance(file_storage.stream, UploadSpool):
+        upload = file_storage.stream
+    else:
+        upload = UploadSpool.from_bytes(file_storage.read())
+    metrics.upload_bytes.observe(upload.size, kind)
+    return upload
+
+
+def _analyze_image_upload(upload, filename):
+    """Score one UploadSpool; returns (response body, HTTP status)."""
+    state = prepare_image(upload, filename)
+    if state["result"] is None:
+        # 2️⃣ Sightengine, 3️⃣ HuggingFace — the router skips a provider whose
+        #    circuit is open and hedges to the next one when the first is slow
+        with phase("provider"):
+            state["result"] = router.call([
+                ("sightengine", _limited("sightengine", analyze_with_sightengine)),
+                ("huggingface", _limited("huggingface", analyze_with_huggingface)),
+            ], upload, secure_filename(filename) or "image")
+    return finish_image(state)
+
+
+def prepare_image(upload, filename):
+    """
+    Local tiers for one upload: exact cache, near-duplicate, metadata.
+    Returns the analysis state; state["result"] is None when a provider is needed.
+    """
+    started = time.perf_counter()
+    digest  = upload.digest
+    with phase("blob"):
+        blob = blob_store.put(upload) if Config.UPLOAD_PERSIST else None
+
+    # 0️⃣ Same bytes already scored?
+    with phase("cache"):
+        _, result = result_cache.lookup([SIGHTENGINE_CACHE_NS, HUGGINGFACE_CACHE_NS], digest)
+    cached    = result is not None
+    near_dup  = None
+    phash     = None
+
+    # 0️⃣ Resized / re-compressed copy of an image already scored?
+    if not cached and Config.PHASH_ENABLED:
+        try:
+            with phase("phash"), upload.reader() as reader:
+                phash = dhash_file(reader)
+                near_dup, result = near_duplicates.lookup(phash)
+            cached = result is not None
+        except Exception as ex:
+            print(f"[WARN] pHash failed: {ex}")
+
+    tier = "cache"
+    if not cached:
+        # 1️⃣ Local pre-check: generator metadata decides without a provider call
+        try:
+            with phase("metadata"), upload.reader() as reader:
+                local_score, signal = image_metadata_score(reader)
+        except Exception as ex:
+            print(f"[WARN] Metadata check failed: {ex}")
+            local_score, signal = NEUTRAL_SCORE, None
+
+        if image_cascade.decisive(local_score):
+            tier   = "local"
+            result = {"ai_generated": local_score, "model": f"Metadata ({signal})"}
+        else:
+            tier   = "provider"
+
+    return {"filename": filename, "digest": digest, "blob": blob, "phash": phash, "started": started,
+            "cached": cached, "near_dup": near_dup, "tier": tier, "result": result}
 
-        if response.status_code == 200:
-            data = response.json()
-            # Response shape: {"type": {"ai_generated": 0.98, ...}, ...}
-            ai_val = data.get("type", {}).get("ai_generated")
-            if ai_val is not None:
-                return {"ai_generated": float(ai_val), "model": "Sightengine"}
 
-        return {"error": f"Sightengine HTTP {response.status_code}"}
+def finish_image(state):
+    """Verdict, caching and history for a prepared image; returns (response body, HTTP status)."""
+    result, filename = state["result"], state["filename"]
+    if state["tier"] == "provider":
+        if "retry_after" in result:
+            # Every provider's queue was full: shed the request instead of queueing it longer
+            return {"success": False, "error": result["error"], "retry_after": result["retry_after"]}, 503
+        if "error" in result:
+            return {"success": False, "error": result["error"]}, 502
+        with phase("cache"):
+            result_cache.set(f"{_CACHE_NS[result['provider']]}:{state['digest']}", result)
+            if state["phash"] is not None:
+                near_duplicates.add(state["phash"], result)
+
+    ai_score    = float(result.get("ai_generated", 0.5))
+    human_score = round(1 - ai_score, 4)
+    ai_score    = round(ai_score, 4)
+
+    if ai_score > 0.75:
+        verdict = "AI Generated"
+    elif ai_score < 0.25:
+        verdict = "Human Created"
+    else:
+        verdict = "Uncertain"
+
+    confidence = round(1 - abs(ai_score - 0.5) * 2, 4)   # how far from 50/50
+
+    with phase("history"):
+        _save_history(filename, 'image', ai_score, human_score, verdict, confidence, state["blob"])
+    image_cascade.record(state["tier"], time.perf_counter() - state["started"])
+
+    return {
+        "success": True,
+        "data": {
+            "filename":    filename,
+            "ai_score":    ai_score,
+            "human_score": human_score,
+            "verdict":     verdict,
+            "confidence":  confidence,
+            "model_used":  result.get("model", "Multiple"),
+            "cached":      state["cached"],
+            "tier":        state["tier"],
+            "near_duplicate_distance": state["near_dup"]
+        }
+    }, 200
+
+
+def sightengine_fields():
+    return {
+        "models":     "genai",
+        "api_user":   Config.SIGHTENGINE_API_USER,
+        "api_secret": Config.SIGHTENGINE_API_SECRET
+    }
+
+
+def sightengine_result(status_code, data):
+    """Result dict from a Sightengine response (`data` = parsed JSON body)."""
+    if status_code == 200:
+        # Response shape: {"type": {"ai_generated": 0.98, ...}, ...}
+        ai_val = data.get("type", {}).get("ai_generated")
+        if ai_val is not None:
+            return {"ai_generated": float(ai_val), "model": "Sightengine"}
+    return {"error": f"Sightengine HTTP {status_code}"}
+
+
+def huggingface_result(status_code, data):
+    """Result dict from a HuggingFace inference response (`data` = parsed JSON body)."""
+    if status_code == 200:
+        # data is a list of lists or list of dicts
+        scores = data[0] if isinstance(data, list) and data else []
+        if isinstance(scores, list):
+            for item in scores:
+                label = str(item.get("label", "")).upper()
+                score = float(item.get("score", 0))
+                if "AI" in label or "FAKE" in label or "GENERATED" in label:
+                    return {"ai_generated": score, "model": "HuggingFace"}
+    return {"error": f"HuggingFace HTTP {status_code}"}
+
+
+def analyze_with_sightengine(upload, filename="image"):
+    try:
+        # Streamed multipart body — the upload is never copied into one big bytes object
+        with MultipartBody(sightengine_fields(), "media", filename, upload.reader()) as body:
+            response = clients["sightengine"].post(
+                Config.SIGHTENGINE_API_URL,
+                data=body,
+                headers={"Content-Type": body.content_type}
+            )
+        return sightengine_result(response.status_code, response.json() if response.status_code == 200 else None)
 
     except Exception as e:
         return {"error": f"Sightengine: {e}"}
 
 
-def analyze_with_huggingface(filepath):
+def analyze_with_huggingface(upload, filename=None):
     try:
-        API_URL = "https://api-inference.huggingface.co/models/therealvish/ai-image-detector"
         headers = {"Authorization": f"Bearer {Config.HUGGINGFACE_API_KEY}"}
 
-        with open(filepath, "rb") as f:
-            response = requests.post(API_URL, headers=headers, data=f.read(), timeout=20)
+        with upload.reader() as reader:
+            response = clients["huggingface"].post(Config.HUGGINGFACE_API_URL, headers=headers, data=reader)
+        return huggingface_result(response.status_code, response.json() if response.status_code == 200 else None)
+
+    except Exception as e:
+        return {"error": f"HuggingFace: {e}"}
+
 
-        if response.status_code == 200:
-            data = response.json()
-            # data is a list of lists or list of dicts
-            scores = data[0] if isinstance(data, list) and data else []
-            if isinstance(scores, list):
-                for item in scores:
-                    label = str(item.get("label", "")).upper()
-                    score = float(item.get("score", 0))
-                    if "AI" in label or "FAKE" in label or "GENERATED" in label:
-                        return {"ai_generated": score, "model": "HuggingFace"}
+# ─────────────────────────────────────────────
+# MEDIA ANALYSIS (animated images, video clips)
+# ─────────────────────────────────────────────
+@app.route('/api/analyze/media', methods=['POST'])
+def analyze_media():
+    """
+    Animated GIF / APNG / WebP or a short video clip: frames are sampled as
+    they are decoded (see media.py), scored like still images and combined
+    into one clip verdict plus per-frame scores.  At most
+    `max_provider_calls` frames per clip go to a provider.
+    """
+    try:
+        with phase("upload"):
+            files = request.files
 
-        return {"error": f"HuggingFace HTTP {response.status_code}"}
+        media = files.get('media') or files.get('video') or files.get('image')
+        if media is None:
+            return jsonify({"success": False, "error": "No media provided"}), 400
+        if media.filename == '':
+            return jsonify({"success": False, "error": "No selected file"}), 400
+
+        try:
+            max_calls = int(request.form.get('max_provider_calls', Config.MEDIA_MAX_PROVIDER_CALLS))
+        except ValueError:
+            return jsonify({"success": False, "error": "max_provider_calls must be an integer"}), 400
+        max_calls = max(1, min(max_calls, Config.MEDIA_MAX_PROVIDER_CALLS))
+
+        upload = _as_spool(media, "media")
+
+        if _wants_async(request.form):
+            # The frames are only known once the job decodes them: charge the clip's call budget
+            limited = _rate_limited(max_calls - 1, paid=1)
+            if limited:
+                return limited
+            with upload.reader() as reader:
+                job_id = job_queue.submit("media", {"filename": media.filename, "max_provider_calls": max_calls},
+                                          reader.read())
+            return _job_accepted(job_id)
+
+        body, status = _analyze_media_upload(upload, media.filename, max_calls, charge=_rate_limit_refusal)
+        return _reply(body, status)
 
     except Exception as e:
-        return {"error": f"HuggingFace: {e}"}
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def _analyze_media_upload(upload, filename, max_calls, charge=None):
+    """Sample, score and combine one clip; returns (response body, HTTP status).
+
+    `charge(n, paid)` bills the provider calls beyond the first (None, or a 429 body to return).
+    """
+    sampler = FrameSampler()
+    try:
+        with phase("decode"):
+            for t, duration, image in media_frames(upload):
+                sampler.feed(t, duration, image)
+    except UnsupportedMedia as e:
+        return {"success": False, "error": str(e)}, 415
+    frames = sampler.samples()
+    if not frames:
+        return {"success": False, "error": "No frames could be decoded"}, 415
+
+    # 0️⃣ Frames already scored (same bytes, or a near-duplicate of a scored image) are free
+    with phase("cache"):
+        for frame in frames:
+            frame["upload"] = UploadSpool.from_bytes(frame.pop("data"))
+            _, frame["result"] = result_cache.lookup([SIGHTENGINE_CACHE_NS, HUGGINGFACE_CACHE_NS], frame["upload"].digest)
+            if frame["result"] is None and Config.PHASH_ENABLED:
+                _, frame["result"] = near_duplicates.lookup(frame["phash"])
+            frame["tier"] = "cache" if frame["result"] is not None else None
+
+    # 2️⃣ 3️⃣ The rest, spread evenly over the clip, up to the per-clip call budget
+    chosen = spread([f for f in frames if f["result"] is None], max_calls)
+    refused = charge(len(chosen) - 1, 1) if charge is not None else None
+    if refused:
+        return refused, 429
+
+    chain = [
+        ("sightengine", _limited("sightengine", analyze_with_sightengine)),
+        ("huggingface", _limited("huggingface", analyze_with_huggingface)),
+    ]
+
+    def score(frame):
+        return router.call(chain, frame["upload"], f"frame-{frame['index']}.jpg")
+
+    with phase("provider"):
+        results = list(_batch_pool.map(score, chosen))
+
+    failures = []
+    for frame, result in zip(chosen, results):
+        if "error" in result:
+            failures.append(result)
+            continue
+        frame["result"], frame["tier"] = result, "provider"
+        result_cache.set(f"{_CACHE_NS[result['provider']]}:{frame['upload'].digest}", result)
+        if Config.PHASH_ENABLED:
+            near_duplicates.add(frame["phash"], result)
+
+    scored = [f for f in frames if f["result"] is not None]
+    if not scored:
+        shed = [r["retry_after"] for r in failures if "retry_after" in r]
+        if shed:
+            return {"success": False, "error": failures[0]["error"], "retry_after": max(shed)}, 503
+        return {"success": False, "error": failures[0]["error"] if failures else "No frame could be scored"}, 502
+
+    # A frame left unscored counts towards the nearest scored frame
+    for frame in scored:
+        frame["weight"] = frame["span"]
+    for frame in frames:
+        if frame["result"] is None:
+            min(scored, key=lambda f: abs(f["t"] - frame["t"]))["weight"] += frame["span"]
+
+    for frame in scored:
+        frame["ai_score"] = round(float(frame["result"].get("ai_generated", 0.5)), 4)
+    ai_score, peak = combine_frames(scored)
+    ai_score    = round(ai_score, 4)
+    human_score = round(1 - ai_score, 4)
+
+    if ai_score > 0.75:
+        verdict = "AI Generated"
+    elif ai_score < 0.25:
+        verdict = "Human Created"
+    else:
+        verdict = "Uncertain"
+
+    confidence = round(1 - abs(ai_score - 0.5) * 2, 4)   # same scale as a still image
+
+    with phase("blob"):
+        blob = blob_store.put(upload) if Config.UPLOAD_PERSIST else None
+    with phase("history"):
+        _save_history(filename, 'video', ai_score, human_score, verdict, confidence, blob)
+
+    cached = sum(1 for f in frames if f["tier"] == "cache")
+    metrics.media_frames.inc("decoded", amount=sampler.decoded)
+    metrics.media_frames.inc("deduplicated", amount=sampler.skipped)
+    metrics.media_frames.inc("cached", amount=cached)
+    metrics.media_frames.inc("provider", amount=len(scored) - cached)
+    metrics.media_frames.inc("unscored", amount=len(frames) - len(scored))
+
+    return {
+        "success": True,
+        "data": {
+            "filename":            filename,
+            "ai_score":            ai_score,
+            "human_score":         human_score,
+            "verdict":             verdict,
+            "confidence":          confidence,
+            "peak_ai_score":       peak,
+            "model_used":          f"Frame sampling ({len(scored)} of {sampler.decoded} frames)",
+            "duration_s":          round(sampler.duration, 3),
+            "frames_decoded":      sampler.decoded,
+            "frames_deduplicated": sampler.skipped,
+            "provider_calls":      len(chosen),
+            "frames": [{
+                "index":      f["index"],
+                "t":          f["t"],
+                "span":       f["span"],
+                "reason":     f["reason"],
+                "ai_score":   f.get("ai_score"),
+                "model_used": f["result"].get("model") if f["result"] else None,
+                "tier":       f["tier"]
+            } for f in frames]
+        }
+    }, 200
 
 
 # ─────────────────────────────────────────────
@@ -220,160 +725,598 @@ def analyze_text():
         if len(text) < 10:
             return jsonify({"success": False, "error": "Text too short (min 10 chars)"}), 400
 
-        model_used = "OpenRouter GPT-3.5"
-        ai_score   = None
-
-        # ── OpenRouter ──────────────────────────────────────────────────────
-        headers = {
-            "Authorization": f"Bearer {Config.OPENROUTER_API_KEY}",
-            "Content-Type":  "application/json",
-            "HTTP-Referer":  "http://localhost:5000",   # required by OpenRouter
-            "X-Title":       "OmniDetect AI"
-        }
+        if _wants_async(body):
+            return _job_accepted(job_queue.submit("text", {"text": text}))
 
-        prompt = (
-            "Analyze whether the following text was written by an AI or a human. "
-            "Reply ONLY with a valid JSON object, no markdown, no extra text:\n"
-            '{"ai_probability": <float 0.0-1.0>, "confidence": <float 0.0-1.0>, "reason": "<brief reason>"}\n\n'
-            f"Text:\n\"\"\"\n{text[:800]}\n\"\"\""
-        )
+        body, status = _analyze_text_content(text)
+        return jsonify(body), status
 
-        payload = {
-            "model": "openai/gpt-3.5-turbo",
-            "messages": [
-                {"role": "system", "content": "You are an expert AI-content detection system. Always respond with pure JSON only."},
-                {"role": "user",   "content": prompt}
-            ],
-            "temperature": 0.1,
-            "max_tokens":  120
-        }
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
-        try:
-            r = requests.post(Config.OPENROUTER_API_URL, headers=headers, json=payload, timeout=15)
-            if r.status_code == 200:
-                content = r.json()['choices'][0]['message']['content'].strip()
-                # Strip possible markdown fences
-                content = content.replace("```json", "").replace("```", "").strip()
-                parsed  = json.loads(content)
-                ai_score   = float(parsed.get("ai_probability", 0.5))
-                confidence = float(parsed.get("confidence", 0.6))
-            else:
-                print(f"[WARN] OpenRouter HTTP {r.status_code}: {r.text[:200]}")
-        except Exception as ex:
-            print(f"[WARN] OpenRouter failed: {ex}")
-
-        # ── Heuristic fallback ──────────────────────────────────────────────
-        if ai_score is None:
-            ai_score   = analyze_text_heuristic(text)
-            confidence = 0.45
-            model_used = "Heuristic"
-
-        ai_score    = round(max(0.0, min(1.0, ai_score)), 4)
-        human_score = round(1 - ai_score, 4)
-        confidence  = round(max(0.0, min(1.0, confidence)), 4)
-
-        if ai_score > 0.75:
-            verdict = "AI Generated"
-        elif ai_score < 0.25:
-            verdict = "Human Written"
-        else:
-            verdict = "Uncertain"
 
-        _save_history("text_analysis", "text", ai_score, human_score, verdict, confidence)
+@app.route('/api/analyze/text/batch', methods=['POST'])
+def analyze_text_batch():
+    """Score a list of texts; identical inputs are only sent to OpenRouter once."""
+    try:
+        body  = request.get_json(silent=True) or {}
+        texts = body.get('texts')
+
+        if not isinstance(texts, list) or not texts:
+            return jsonify({"success": False, "error": "Provide a non-empty 'texts' list"}), 400
+        if len(texts) > Config.TEXT_BATCH_MAX_ITEMS:
+            return jsonify({"success": False, "error": f"Too many texts (max {Config.TEXT_BATCH_MAX_ITEMS})"}), 400
+        limited = _rate_limited(len(texts))
+        if limited:
+            return limited
+
+        texts   = [t.strip() if isinstance(t, str) else '' for t in texts]
+        digests = [hash_text(t) if len(t) >= 10 else None for t in texts]
+
+        unique = {}
+        for text, digest in zip(texts, digests):
+            if digest is not None and digest not in unique:
+                unique[digest] = text
+
+        # Local tier for every unique text in one vectorised pass
+        with phase("local"):
+            local = dict(zip(unique, engine.score_batch(list(unique.values())).tolist()))
+
+        def score(digest):
+            try:
+                return _score_text(unique[digest], local_score=local[digest])
+            except Exception as e:
+                return {"error": str(e)}
+
+        with phase("provider"):
+            scored = dict(zip(unique, _batch_pool.map(score, unique)))
+
+        results, rows = [], []
+        for index, digest in enumerate(digests):
+            if digest is None:
+                results.append({"index": index, "success": False, "error": "Text too short (min 10 chars)"})
+                continue
+            data = scored[digest]
+            if "error" in data:
+                results.append({"index": index, "success": False, "error": data["error"]})
+                continue
+            results.append({"index": index, "success": True, "data": data})
+            rows.append(("text_analysis", "text", data["ai_score"], data["human_score"], data["verdict"], data["confidence"], None))
+
+        with phase("history"):
+            _save_history_many(rows)
 
         return jsonify({
-            "success": True,
-            "data": {
-                "ai_score":    ai_score,
-                "human_score": human_score,
-                "verdict":     verdict,
-                "confidence":  confidence,
-                "model_used":  model_used
-            }
+            "success":   True,
+            "total":     len(results),
+            "unique":    len(unique),
+            "succeeded": len(rows),
+            "failed":    len(results) - len(rows),
+            "results":   results
         })
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-def analyze_text_heuristic(text):
-    """Lightweight rule-based fallback."""
-    ai_score = 0.30
-    words    = text.split()
-
-    ai_phrases = [
-        "as an ai", "language model", "i cannot", "i'm unable",
-        "based on my training", "as an artificial intelligence",
-        "i don't have the ability", "i must clarify", "certainly",
-        "absolutely", "of course", "i understand your", "it's worth noting"
-    ]
-    for phrase in ai_phrases:
-        if phrase in text.lower():
-            ai_score = min(ai_score + 0.18, 0.95)
+@app.route('/api/analyze/text/document', methods=['POST'])
+def analyze_document():
+    """
+    Long-document mode: overlapping sentence-aligned windows scored in
+    parallel, combined into a document score plus per-section scores.
+    With `"stream": true` the response is NDJSON — one `section` line per
+    window as it finishes, then a final `document` line.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        text = body.get('text', '').strip()
+
+        if len(text) < 10:
+            return jsonify({"success": False, "error": "Text too short (min 10 chars)"}), 400
+
+        windows = split_windows(text)
+        if len(windows) > Config.DOCUMENT_MAX_WINDOWS:
+            return jsonify({"success": False, "error": f"Document too long (max {Config.DOCUMENT_MAX_WINDOWS} windows)"}), 400
+
+        try:
+            token_budget = int(body.get('token_budget', Config.DOCUMENT_TOKEN_BUDGET))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "token_budget must be an integer"}), 400
+
+        # Identical windows (repeated boilerplate, a passage quoted twice) are
+        # scored once; the copies get the first one's result
+        copies = {}                                 # index of the first occurrence → windows with its text
+        for w in windows:
+            copies.setdefault(hash_text(w["text"]), []).append(w)
+        copies = {group[0]["index"]: group for group in copies.values()}
+        unique = [w for w in windows if w["index"] in copies]
+
+        # Cached windows and windows the local tier decides are free; only
+        # the rest compete for the token budget
+        local     = dict(zip((w["index"] for w in unique), engine.score_batch([w["text"] for w in unique]).tolist()))
+        escalated = [w for w in unique
+                     if not text_cascade.decisive(local[w["index"]])
+                     and result_cache.get(f"{OPENROUTER_CACHE_NS}:{hash_text(w['text'])}") is None]
+        use_provider = select_for_provider(escalated, token_budget)
+        limited = _rate_limited(len(use_provider) - 1, paid=1)      # _admit charged the first call
+        if limited:
+            return limited
+        sent = []                                   # indexes of the windows actually sent to OpenRouter
+        ask  = _limited("openrouter", analyze_with_openrouter)     # built here to carry the request's profile
+
+        def score(window):
+            state = prepare_text(window["text"], window["index"] in use_provider, local[window["index"]])
+            if state["tier"] == "provider":
+                sent.append(window["index"])
+                state["result"] = router.call([("openrouter", ask)], window["text"])
+            data = finish_text(state)
+            return [{"index": w["index"], "start": w["start"], "end": w["end"], **data,
+                     **({"duplicate_of": window["index"]} if w is not window else {})}
+                    for w in copies[window["index"]]]
+
+        futures = [_batch_pool.submit(score, w) for w in unique]
+
+        def summary(sections):
+            sections.sort(key=lambda s: s["index"])
+            ai_score, confidence = combine(sections)
+            ai_score    = round(ai_score, 4)
+            human_score = round(1 - ai_score, 4)
+            confidence  = round(confidence, 4)
+
+            if ai_score > 0.75:
+                verdict = "AI Generated"
+            elif ai_score < 0.25:
+                verdict = "Human Written"
+            else:
+                verdict = "Uncertain"
+
+            _save_history("document_analysis", "text", ai_score, human_score, verdict, confidence)
+            return {
+                "ai_score":         ai_score,
+                "human_score":      human_score,
+                "verdict":          verdict,
+                "confidence":       confidence,
+                "windows":          len(sections),
+                "unique_windows":   len(unique),
+                "provider_windows": len(sent),
+                "sections":         sections
+            }
 
-    sentences = max(1, text.count('.') + text.count('!') + text.count('?'))
-    avg_len   = len(words) / sentences
-    if 13 <= avg_len <= 22:
-        ai_score = min(ai_score + 0.08, 0.95)
+        if not body.get('stream'):
+            return jsonify({"success": True, "data": summary([s for f in futures for s in f.result()])})
 
-    # Unusual punctuation uniformity typical of LLMs
-    if text.count(',') > len(words) * 0.07:
-        ai_score = min(ai_score + 0.05, 0.95)
+        def stream():
+            sections = []
+            for future in as_completed(futures):
+                for section in future.result():
+                    sections.append(section)
+                    yield json.dumps({"type": "section", **section}) + "\n"
+            yield json.dumps({"type": "document", "success": True, "data": summary(sections)}) + "\n"
 
-    return round(ai_score, 4)
+        return Response(stream(), mimetype='application/x-ndjson', headers={"X-Accel-Buffering": "no"})
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def _analyze_text_content(text):
+    """Score one text and record it; returns (response body, HTTP status)."""
+    data = _score_text(text)
+    with phase("history"):
+        _save_history("text_analysis", "text", data["ai_score"], data["human_score"], data["verdict"], data["confidence"])
+    return {"success": True, "data": data}, 200
+
+
+def _score_text(text, use_provider=True, local_score=None):
+    """
+    Cascade: cached OpenRouter verdict → local score if it is outside the
+    uncertainty band → OpenRouter → local score as a fallback.
+    """
+    state = prepare_text(text, use_provider, local_score)
+    if state["tier"] == "provider":
+        # Breaker open → straight to the fallback instead of waiting on a timeout
+        with phase("provider"):
+            state["result"] = router.call([("openrouter", _limited("openrouter", analyze_with_openrouter))], text)
+    return finish_text(state)
+
+
+def prepare_text(text, use_provider=True, local_score=None):
+    """Cache and local tiers; state["tier"] == "provider" when OpenRouter must be asked."""
+    started = time.perf_counter()
+    digest  = hash_text(text)
+
+    with phase("cache"):
+        result = result_cache.get(f"{OPENROUTER_CACHE_NS}:{digest}")
+    cached = result is not None
+
+    if cached:
+        tier = "cache"
+    else:
+        if local_score is None:
+            with phase("local"):
+                local_score = analyze_text_heuristic(text)
+        if text_cascade.decisive(local_score):
+            tier = "local"
+        elif not use_provider:
+            tier = "fallback"                   # over the document's token budget
+        else:
+            tier = "provider"
+
+    return {"digest": digest, "started": started, "cached": cached, "tier": tier,
+            "result": result, "local_score": local_score}
+
+
+def finish_text(state):
+    """Verdict for a prepared text (after the provider call, if any); returns the data dict."""
+    tier, result, local_score = state["tier"], state["result"], state["local_score"]
+    if tier == "provider":
+        if "error" in result:
+            print(f"[WARN] {result['error']}")
+            metrics.provider_fallbacks.inc("openrouter", "heuristic")
+            tier = "fallback"
+        else:
+            result_cache.set(f"{OPENROUTER_CACHE_NS}:{state['digest']}", result)
+
+    if tier in ("cache", "provider"):
+        ai_score   = result["ai_generated"]
+        confidence = result["confidence"]
+        model_used = "OpenRouter GPT-3.5"
+    elif tier == "local":
+        ai_score   = local_score
+        confidence = abs(local_score - 0.5) * 2          # outside the band → far from 50/50
+        model_used = "Heuristic"
+    else:
+        ai_score   = local_score
+        confidence = 0.45
+        model_used = "Heuristic"
+
+    ai_score    = round(max(0.0, min(1.0, ai_score)), 4)
+    human_score = round(1 - ai_score, 4)
+    confidence  = round(max(0.0, min(1.0, confidence)), 4)
+
+    if ai_score > 0.75:
+        verdict = "AI Generated"
+    elif ai_score < 0.25:
+        verdict = "Human Written"
+    else:
+        verdict = "Uncertain"
+
+    text_cascade.record(tier, time.perf_counter() - state["started"])
+
+    return {
+        "ai_score":    ai_score,
+        "human_score": human_score,
+        "verdict":     verdict,
+        "confidence":  confidence,
+        "model_used":  model_used,
+        "cached":      state["cached"],
+        "tier":        tier
+    }
+
+
+def openrouter_request(text):
+    """(headers, JSON payload) for one OpenRouter verdict request."""
+    headers = {
+        "Authorization": f"Bearer {Config.OPENROUTER_API_KEY}",
+        "Content-Type":  "application/json",
+        "HTTP-Referer":  "http://localhost:5000",   # required by OpenRouter
+        "X-Title":       "OmniDetect AI"
+    }
+
+    prompt = (
+        "Analyze whether the following text was written by an AI or a human. "
+        "Reply ONLY with a valid JSON object, no markdown, no extra text:\n"
+        '{"ai_probability": <float 0.0-1.0>, "confidence": <float 0.0-1.0>, "reason": "<brief reason>"}\n\n'
+        f"Text:\n\"\"\"\n{text[:800]}\n\"\"\""
+    )
+
+    payload = {
+        "model": "openai/gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": "You are an expert AI-content detection system. Always respond with pure JSON only."},
+            {"role": "user",   "content": prompt}
+        ],
+        "temperature": 0.1,
+        "max_tokens":  120
+    }
+    return headers, payload
+
+
+def openrouter_result(status_code, body):
+    """Result dict from an OpenRouter response (`body` = response text); raises on a malformed reply."""
+    if status_code != 200:
+        return {"error": f"OpenRouter HTTP {status_code}: {body[:200]}"}
+
+    content = json.loads(body)['choices'][0]['message']['content'].strip()
+    # Strip possible markdown fences
+    content = content.replace("```json", "").replace("```", "").strip()
+    parsed  = json.loads(content)
+    return {
+        "ai_generated": float(parsed.get("ai_probability", 0.5)),
+        "confidence":   float(parsed.get("confidence", 0.6)),
+        "model":        "OpenRouter GPT-3.5"
+    }
+
+
+def analyze_with_openrouter(text):
+    try:
+        headers, payload = openrouter_request(text)
+        r = clients["openrouter"].post(Config.OPENROUTER_API_URL, headers=headers, json=payload)
+        return openrouter_result(r.status_code, r.text)
+
+    except Exception as e:
+        return {"error": f"OpenRouter failed: {e}"}
+
+
+def analyze_text_heuristic(text):
+    """Local rule-based scorer — see text_engine.py (use engine.score_batch for bulk)."""
+    return engine.score(text)
 
 
 # ─────────────────────────────────────────────
 # HISTORY & STATS
 # ─────────────────────────────────────────────
-def _save_history(filename, file_type, ai_score, human_score, verdict, confidence):
-    conn = get_db()
-    conn.execute(
-        "INSERT INTO history (filename, file_type, ai_score, human_score, verdict, confidence) VALUES (?,?,?,?,?,?)",
-        (filename, file_type, ai_score, human_score, verdict, confidence)
-    )
-    conn.commit()
-    conn.close()
+# History rows are queued and written by a background thread in grouped
+# transactions, so analyses never wait on an INSERT + commit.
+history_writer = BatchWriter(
+    Config.DATABASE,
+    "INSERT INTO history (filename, file_type, ai_score, human_score, verdict, confidence, blob) VALUES (?,?,?,?,?,?,?)",
+    batch_size = Config.HISTORY_BATCH_SIZE,
+    interval   = Config.HISTORY_FLUSH_INTERVAL
+)
+
+
+
+def _save_history(filename, file_type, ai_score, human_score, verdict, confidence, blob=None):
+    history_writer.write((filename, file_type, ai_score, human_score, verdict, confidence, blob))
+
+
+def _save_history_many(rows):
+    """Bulk variant of _save_history; rows carry all seven columns."""
+    history_writer.write_many(rows)
+
+
+HISTORY_FIELDS    = ("id", "filename", "file_type", "ai_score", "human_score", "verdict", "confidence", "timestamp")
+HISTORY_MAX_LIMIT = 500
+
+
+def _encode_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([row["timestamp"], row["id"]]).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    timestamp, record_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    return str(timestamp), int(record_id)
+
+
+def _utc(value):
+    """ISO 8601 → naive UTC datetime; an offset (+05:30, Z) is converted, no offset means UTC."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _db_timestamp(value):
+    """ISO 8601 → the UTC 'YYYY-MM-DD HH:MM:SS' text stored in history.timestamp."""
+    return _utc(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _history_fields(args):
+    fields  = [f for f in args.get('fields', '').split(',') if f] or list(HISTORY_FIELDS)
+    unknown = set(fields) - set(HISTORY_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def _history_filters(args):
+    """WHERE clauses + parameters for file_type, verdict, min/max_score, since/until."""
+    where, params = [], []
+    for column in ('file_type', 'verdict'):
+        if args.get(column):
+            where.append(f"{column} = ?")
+            params.append(args[column])
+    if args.get('min_score'):
+        where.append("ai_score >= ?")
+        params.append(float(args['min_score']))
+    if args.get('max_score'):
+        where.append("ai_score <= ?")
+        params.append(float(args['max_score']))
+    if args.get('since'):
+        where.append("timestamp >= ?")
+        params.append(_db_timestamp(args['since']))
+    if args.get('until'):
+        where.append("timestamp <= ?")
+        params.append(_db_timestamp(args['until']))
+    return where, params
 
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    conn    = get_db()
-    rows    = conn.execute('SELECT * FROM history ORDER BY timestamp DESC LIMIT 50').fetchall()
-    conn.close()
-    return jsonify({
-        "success": True,
-        "history": [dict(r) for r in rows]
+    """
+    Newest first, keyset-paginated on (timestamp, id).
+    Query: limit, cursor (next_cursor of the previous page), file_type, verdict,
+    min_score / max_score (ai_score), since / until (UTC, ISO 8601), fields.
+    Responses carry a weak ETag built from the history version counter; a
+    matching If-None-Match gets 304 without querying the history table.
+    """
+    history_writer.flush()                  # include analyses that are still queued
+    conn = get_db()
+
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    etag  = f"h{history_version(conn)}-{zlib.crc32(query.encode()):08x}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    args = request.args
+    try:
+        limit  = min(max(int(args.get('limit', 50)), 1), HISTORY_MAX_LIMIT)
+        fields = _history_fields(args)
+        where, params = _history_filters(args)
+        if args.get('cursor'):
+            where.append("(timestamp, id) < (?, ?)")
+            params.extend(_decode_cursor(args['cursor']))
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": f"Invalid query: {e}"}), 400
+
+    # id + timestamp are always read: the cursor is built from them
+    columns = list(dict.fromkeys(fields + ["timestamp", "id"]))
+    rows = conn.execute(
+        f"SELECT {', '.join(columns)} FROM history"
+        + (f" WHERE {' AND '.join(where)}" if where else "")
+        + " ORDER BY timestamp DESC, id DESC LIMIT ?",
+        (*params, limit + 1)
+    ).fetchall()
+
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    response = jsonify({
+        "success":     True,
+        "history":     [{f: r[f] for f in fields} for r in rows[:limit]],
+        "next_cursor": next_cursor
+    })
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"       # always revalidate
+    return response
+
+
+EXPORT_FORMATS = {
+    "csv":    (csv_chunks,    "text/csv"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+}
+
+
+@app.route('/api/history/export', methods=['GET'])
+def export_history():
+    """
+    The whole (filtered) history, oldest first, streamed as CSV or NDJSON.
+    Query: format=csv|ndjson, fields, and the /api/history filters.
+    """
+    args = request.args
+    fmt  = args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"success": False, "error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        fields = _history_fields(args)
+        where, params = _history_filters(args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": f"Invalid query: {e}"}), 400
+
+    history_writer.flush()
+    chunks, mimetype = EXPORT_FORMATS[fmt]
+    rows     = export_rows(Config.DATABASE, fields, where, params)
+    filename = f"history-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+    return Response(chunks(rows, fields), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control":       "no-store",
+        "X-Accel-Buffering":   "no"
     })
 
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    conn  = get_db()
-    total  = conn.execute('SELECT COUNT(*) FROM history').fetchone()[0]
-    images = conn.execute('SELECT COUNT(*) FROM history WHERE file_type="image"').fetchone()[0]
-    texts  = conn.execute('SELECT COUNT(*) FROM history WHERE file_type="text"').fetchone()[0]
-    ai_det = conn.execute('SELECT COUNT(*) FROM history WHERE verdict="AI Generated"').fetchone()[0]
-    conn.close()
+    """Constant-time: reads the trigger-maintained history_totals rows."""
+    history_writer.flush()
+    t      = totals(get_db())
+    total  = t["total"]
+    ai_det = t["by_verdict"].get("AI Generated", 0)
     return jsonify({
         "success": True,
         "stats": {
             "total_analyses": total,
-            "image_analyses": images,
-            "text_analyses":  texts,
+            "image_analyses": t["by_type"].get("image", 0),
+            "text_analyses":  t["by_type"].get("text", 0),
+            "video_analyses": t["by_type"].get("video", 0),     # clips from /api/analyze/media
             "ai_detected":    ai_det,
             "human_detected": total - ai_det
         }
     })
 
 
+@app.route('/api/stats/timeseries', methods=['GET'])
+def get_stats_timeseries():
+    """
+    Per-bucket counts by type and verdict plus average ai_score, from the
+    rollup tables.  Query: granularity=minute|hour|day (default hour),
+    limit=<buckets back from now> or since/until (UTC, ISO 8601), file_type.
+    """
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
+        return jsonify({"success": False, "error": f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+
+    try:
+        limit = min(max(int(request.args.get('limit', 48)), 1), 1000)
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = _utc(since) if since else default_since(granularity, limit)
+        until = _utc(until) if until else None
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid query: {e}"}), 400
+
+    history_writer.flush()
+    buckets = timeseries(get_db(), granularity, since, until, request.args.get('file_type'))
+    return jsonify({
+        "success":     True,
+        "granularity": granularity,
+        "since":       since.isoformat(),
+        "until":       until.isoformat() if until else None,
+        "buckets":     buckets
+    })
+
+
+# ── Reports: aggregated over any date range by a background job (see reports.py) ──
+
+
+@app.route('/api/reports', methods=['POST'])
+def create_report():
+    """
+    Queue a report.  JSON body: since, until (UTC, ISO 8601), file_type,
+    verdict, granularity=minute|hour|day.  The job's result lists the files.
+    """
+    body = request.get_json(silent=True) or {}
+    granularity = body.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({"success": False, "error": f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+    try:
+        filters = {k: str(body[k]) for k in ('since', 'until', 'file_type', 'verdict') if body.get(k)}
+        _history_filters(filters)                   # validate now, not in the worker
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": f"Invalid query: {e}"}), 400
+
+    job_id = job_queue.submit("report", {"report_id": uuid.uuid4().hex, "granularity": granularity, **filters})
+    return _job_accepted(job_id)
+
+
+def _run_report(payload, params):
+    history_writer.flush()
+    prune_reports(Config.REPORT_FOLDER, Config.REPORT_RETENTION_SECONDS)
+    where, values = _history_filters(params)
+    report_id     = params["report_id"]
+    summary = build_report(Config.DATABASE, Config.REPORT_FOLDER, report_id, where, values, params["granularity"])
+    return {"success": True, "data": {**summary, "files": {
+        "json": f"/api/reports/{report_id}.json",
+        "csv":  f"/api/reports/{report_id}.csv"
+    }}}, 200
+
+
+@app.route('/api/reports/<name>', methods=['GET'])
+def get_report(name):
+    if not REPORT_NAME.fullmatch(name):
+        return jsonify({"success": False, "error": "Report not found"}), 404
+    path = os.path.abspath(Config.REPORT_FOLDER)
+    if not os.path.exists(os.path.join(path, name)):
+        return jsonify({"success": False, "error": "Report not found"}), 404
+    return send_from_directory(path, name, as_attachment=name.endswith(".csv"))
+
+
 @app.route('/api/history/<int:record_id>', methods=['DELETE'])
 def delete_history(record_id):
     try:
-        conn = get_db()
-        conn.execute('DELETE FROM history WHERE id = ?', (record_id,))
-        conn.commit()
-        conn.close()
+        history_writer.flush()
+        with get_db() as conn:
+            conn.execute('DELETE FROM history WHERE id = ?', (record_id,))
         return jsonify({"success": True, "message": "Record deleted"})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
@@ -382,6 +1325,10 @@ def delete_history(record_id):
 # ─────────────────────────────────────────────
 # EMAIL / CONTACT FORM
 # ─────────────────────────────────────────────
+# Emails go through the outbox (see outbox.py): the request only inserts a
+# row, a background dispatcher talks to Resend (started by start_worker).
+
+
 @app.route('/api/send-email', methods=['POST'])
 def send_email():
     try:
@@ -398,13 +1345,9 @@ def send_email():
         if not user_message or len(user_message) < 5:
             return jsonify({"success": False, "error": "Message too short"}), 400
 
-        response = requests.post(
-            "https://api.resend.com/emails",
-            headers={
-                "Authorization": f"Bearer {Config.RESEND_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
+        message_id = outbox.enqueue(
+            "contact",
+            {
                 "from":     "OmniDetect AI <onboarding@resend.dev>",
                 "to":       ["rggupta01rg@gmail.com"],
                 "subject":  f"New Contact Message from {user_name}",
@@ -418,15 +1361,16 @@ def send_email():
                 """,
                 "reply_to": user_email
             },
-            timeout=10
+            # A re-submitted identical message (double click, retry) is sent once
+            dedupe_key=hashlib.sha256(f"{user_email}\n{user_message}".encode()).hexdigest()
         )
 
-        print(f"[Resend] status={response.status_code} body={response.text}")
-
-        if response.status_code in (200, 201):
-            return jsonify({"success": True, "message": "Message sent successfully!"})
-        else:
-            return jsonify({"success": False, "error": response.text}), 500
+        return jsonify({
+            "success":   True,
+            "message":   "Message received — it will be delivered shortly.",
+            "queued":    True,
+            "duplicate": message_id is None
+        }), 202
 
     except Exception as e:
         print(f"[send-email ERROR] {e}")
@@ -445,37 +1389,30 @@ def subscribe_newsletter():
         if not email or '@' not in email:
             return jsonify({"success": False, "error": "Please provide a valid email"}), 400
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute(
-                "INSERT INTO newsletter_subscribers (email) VALUES (?)",
-                (email,)
-            )
-            conn.commit()
-            conn.close()
-
-            # ── Send confirmation email ──
-            requests.post(
-                "https://api.resend.com/emails",
-                headers={
-                    "Authorization": f"Bearer {Config.RESEND_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "from":    "OmniDetect AI <onboarding@resend.dev>",
-                    "to":      [email],
-                    "subject": "✅ Newsletter Subscription Confirmed!",
-                    "html":    f"""
-                        <h2>Welcome to OmniDetect AI! 🎉</h2>
-                        <p>You've successfully subscribed to our newsletter.</p>
-                        <p>You'll receive AI detection tips at <b>{email}</b></p>
-                        <hr><small>OmniDetect AI • omni-detect-ai.vercel.app</small>
-                    """
-                },
-                timeout=10
-            )
+            # Subscriber row and confirmation email commit together
+            with get_db() as conn:
+                conn.execute(
+                    "INSERT INTO newsletter_subscribers (email) VALUES (?)",
+                    (email,)
+                )
+                outbox.enqueue(
+                    "newsletter",
+                    {
+                        "from":    "OmniDetect AI <onboarding@resend.dev>",
+                        "to":      [email],
+                        "subject": "✅ Newsletter Subscription Confirmed!",
+                        "html":    f"""
+                            <h2>Welcome to OmniDetect AI! 🎉</h2>
+                            <p>You've successfully subscribed to our newsletter.</p>
+                            <p>You'll receive AI detection tips at <b>{email}</b></p>
+                            <hr><small>OmniDetect AI • omni-detect-ai.vercel.app</small>
+                        """
+                    },
+                    dedupe_key=f"newsletter:{email}",
+                    dedupe_window=0,
+                    conn=conn
+                )
 
             return jsonify({
                 "success": True,
@@ -483,7 +1420,6 @@ def subscribe_newsletter():
             }), 200
             
         except sqlite3.IntegrityError:
-            conn.close()
             return jsonify({
                 "success": False,
                 "error": "This email is already subscribed"
@@ -493,6 +1429,75 @@ def subscribe_newsletter():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+# ─────────────────────────────────────────────
+# ASYNC JOBS
+# ─────────────────────────────────────────────
+job_queue.register("image", lambda payload, params: _analyze_image_upload(UploadSpool.from_bytes(payload), params["filename"]))
+job_queue.register("text",  lambda payload, params: _analyze_text_content(params["text"]))
+job_queue.register("media", lambda payload, params: _analyze_media_upload(
+    UploadSpool.from_bytes(payload), params["filename"], params["max_provider_calls"]))
+job_queue.register("report", _run_report)
+
+
+def _wants_async(fields):
+    """`?async=1` on the URL, or an `async` form/JSON field."""
+    value = request.args.get('async', fields.get('async', False))
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def _job_accepted(job_id):
+    return jsonify({
+        "success":    True,
+        "job_id":     job_id,
+        "status":     "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events"
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events: one `status` event per state change, closed on completion."""
+    if job_queue.get(job_id) is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+
+    def stream():
+        last, last_sent = None, time.monotonic()
+        while True:
+            job = job_queue.get(job_id)
+            if job is None:
+                yield "event: error\ndata: {\"error\": \"Job expired\"}\n\n"
+                return
+            state = (job["status"], job["attempts"])
+            if state != last:
+                last, last_sent = state, time.monotonic()
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+                if job["status"] in TERMINAL:
+                    return
+            elif time.monotonic() - last_sent > 15:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            job_queue.wait_for_change(0.5)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        "Cache-Control":     "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+@app.route('/api/jobs', methods=['GET'])
+def job_stats():
+    return jsonify({"success": True, "jobs": job_queue.stats()})
+
+
 # ─────────────────────────────────────────────
 # ADMIN
 # ─────────────────────────────────────────────
@@ -509,8 +1514,117 @@ def admin_login():
     return jsonify({"success": False, "error": "Invalid credentials"}), 401
 
 
+def _is_admin():
+    """X-Admin-Token matches ADMIN_TOKEN (the admin API is off while ADMIN_TOKEN is unset)."""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(Config.ADMIN_TOKEN) and hmac.compare_digest(token, Config.ADMIN_TOKEN)
+
+
+PROFILE_NAME = re.compile(r"[0-9a-f]{32}\.(folded|json)")
+
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+def profiling_settings():
+    """Read or set the fraction of API requests profiled, for every worker."""
+    if not _is_admin():
+        return jsonify({"success": False, "error": "Forbidden"}), 403
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        try:
+            rate = float(body.get('sample_rate'))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "sample_rate must be a number"}), 400
+        if not 0 <= rate <= 1:
+            return jsonify({"success": False, "error": "sample_rate must be between 0 and 1"}), 400
+        profiler.set_sample_rate(rate)
+    profiler.wanted()                           # picks up a change made by another worker
+    return jsonify({"success": True, "sample_rate": profiler.sample_rate, "interval_ms": profiler.interval * 1000})
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Newest profiles first, each with links to its flamegraph stacks."""
+    if not _is_admin():
+        return jsonify({"success": False, "error": "Forbidden"}), 403
+    limit    = min(request.args.get('limit', 100, type=int), Config.PROFILE_KEEP)
+    profiles = profiler.list(limit)
+    for p in profiles:
+        p["folded_url"] = f"/api/admin/profiles/{p['id']}.folded"
+    return jsonify({"success": True, "profiles": profiles})
+
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """<id>.folded (collapsed stacks for flamegraph.pl / speedscope) or <id>.json."""
+    if not _is_admin():
+        return jsonify({"success": False, "error": "Forbidden"}), 403
+    if not PROFILE_NAME.fullmatch(name):
+        return jsonify({"success": False, "error": "Profile not found"}), 404
+    return send_from_directory(os.path.abspath(Config.PROFILE_FOLDER), name,
+                               mimetype="text/plain" if name.endswith(".folded") else None)
+
+
+# ─────────────────────────────────────────────
+# STARTUP
+# ─────────────────────────────────────────────
+# Importing this module starts no threads, but it is not free of side
+# effects: the module-level singletons it imports (result cache, pHash index,
+# job queue, limits, outbox) create their SQLite files and tables with
+# CREATE ... IF NOT EXISTS — cache.db, jobs.db, limits.db, the outbox table
+# in database.db — and the profile, upload and report folders are created.
+# All of it is idempotent and cheap.  create_app() readies the process: the
+# history schema (once per deployment, see ensure_schema), the result cache
+# and near-duplicate index loaded into memory, then the background threads.
+# Under gunicorn's preload_app the master runs create_app(preload=True) and
+# every worker calls start_worker() after the fork (see gunicorn.conf.py):
+# the warm caches and the text lexicon are inherited copy-on-write, while
+# threads, SQLite connections and sockets are made fresh in each worker.
+_prepared    = False
+_started_pid = None
+_start_lock  = threading.Lock()
+
+
+def start_worker():
+    """Start this process's background threads and open provider connections (once per pid)."""
+    global _started_pid
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+    job_queue.start()
+    outbox.start()
+    # Uploads kept by prepare_image (UPLOAD_PERSIST) are collected by this thread
+    # once no history row references them, or when over the age / size budget.
+    blob_store.start()
+    metrics.shared.start()
+    threading.Thread(target=preconnect, args=(Config.PRECONNECT_PER_PROVIDER,),
+                     name="preconnect", daemon=True).start()
+
+
+def create_app(preload=False):
+    """The Flask app, ready to serve; preload=True skips start_worker() (the gunicorn master)."""
+    global _prepared
+    with _start_lock:
+        if not _prepared:
+            ensure_schema()
+            result_cache.warm()
+            near_duplicates.warm()
+            _prepared = True
+    if not preload:
+        start_worker()
+    return app
+
+
+@app.before_request
+def _ensure_started():
+    # `gunicorn app:app`, `flask run` and test clients never call create_app()
+    if _started_pid != os.getpid():
+        create_app()
+
+
 # ─────────────────────────────────────────────
 if __name__ == '__main__':
+    create_app()
     print("=" * 55)
     print("  OmniDetect AI — Backend Starting")
     print(f"  Sightengine : {bool(Config.SIGHTENGINE_API_USER)}")
@@ -0,0 +1,367 @@
+"""
+Static asset build and serving.
+
+    python assets.py build              # index.html + css/ + js/ → dist/
+
+The build follows index.html: the local stylesheets it links become one
+minified CSS bundle, its local scripts one JS bundle, and every other local
+file it references (favicon, images) is copied.  Each output gets a content
+hash in its name under dist/assets/, index.html is rewritten to point at
+them, and .gz / .br (brotli, if the package is installed) variants are
+written next to every file that compresses.  dist/manifest.json lists the
+ETag and encodings of each file.
+
+StaticAssets serves dist/: fingerprinted files are `immutable` for a year,
+index.html is revalidated against its ETag, and each response is the
+smallest precompressed variant the client's Accept-Encoding allows.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import threading
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:                     # optional: gzip only
+    brotli = None
+
+
+MANIFEST       = "manifest.json"
+IMMUTABLE      = "public, max-age=31536000, immutable"
+REVALIDATE     = "no-cache"
+ENCODINGS      = (("br", ".br"), ("gzip", ".gz"))       # preference order on equal q
+MIN_SAVING     = 0.9                                     # keep a variant only if ≤ 90 % of the original
+
+
+# ─── Minifiers (conservative: strings, templates and regexes are never touched) ───
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/)', re.S)
+
+
+def minify_css(text):
+    out = []
+    for token in _CSS_TOKENS.split(text):
+        if token.startswith("/*"):
+            continue
+        if token[:1] in ("'", '"'):
+            out.append(token)
+            continue
+        token = re.sub(r"\s+", " ", token)
+        token = re.sub(r"\s*([{};,>])\s*", r"\1", token)
+        token = re.sub(r":\s+", ":", token)
+        out.append(token)
+    return "".join(out).replace(";}", "}").strip()
+
+
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_WORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "yield", "await"}
+
+
+def _string_end(text, i):
+    """Index just past the string / template literal starting at text[i]."""
+    quote, j, n = text[i], i + 1, len(text)
+    while j < n:
+        c = text[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == quote:
+            return j + 1
+        if quote == "`" and text.startswith("${", j):
+            j = _code_end(text, j + 2)          # past the matching "}"
+            continue
+        j += 1
+    return n
+
+
+def _code_end(text, i):
+    """Index just past the "}" closing a template substitution that starts at i."""
+    depth, n = 1, len(text)
+    while i < n:
+        c = text[i]
+        if c in ("'", '"', "`"):
+            i = _string_end(text, i)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return n
+
+
+def _regex_end(text, i):
+    j, n, in_class = i + 1, len(text), False
+    while j < n and text[j] != "\n":
+        c = text[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            j += 1
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1                          # flags
+            return j
+        j += 1
+    return j
+
+
+def _squeeze(code):
+    code = re.sub(r"[ \t]*\n\s*", "\n", code)
+    return re.sub(r"[ \t]+", " ", code)
+
+
+def minify_js(text):
+    """Drop comments, indentation and blank lines.  Line breaks stay (no ASI surprises)."""
+    out, code, i, n = [], [], 0, len(text)
+
+    def previous():
+        tail = "".join(code).rstrip() or "".join(out[-1:]).rstrip()
+        return tail
+
+    while i < n:
+        c = text[i]
+        if c in ("'", '"', "`"):
+            end = _string_end(text, i)
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i   = n if end == -1 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+            code.append("\n" if "\n" in text[i:end] else " ")
+            i = end
+            continue
+        elif c == "/":
+            tail = previous()
+            word = re.search(r"[A-Za-z_$][\w$]*$", tail)
+            if not tail or tail[-1] in _REGEX_AFTER or (word and word.group() in _REGEX_WORDS):
+                end = _regex_end(text, i)
+            else:
+                code.append(c)
+                i += 1
+                continue
+        else:
+            code.append(c)
+            i += 1
+            continue
+        out.append(_squeeze("".join(code)))
+        out.append(text[i:end])
+        code, i = [], end
+    out.append(_squeeze("".join(code)))
+    return "".join(out).strip() + "\n"
+
+
+_HTML_RAW = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>.*?</\2\s*>)", re.S | re.I)
+
+
+def minify_html(text):
+    parts = _HTML_RAW.split(text)
+    out   = []
+    # split() yields: text, whole raw element, tag name, text, ...
+    for index in range(0, len(parts), 3):
+        chunk = re.sub(r"<!--(?!\[).*?-->", "", parts[index], flags=re.S)
+        out.append(re.sub(r"\s*\n\s*", "\n", chunk))
+        if index + 1 < len(parts):
+            element, tag = parts[index + 1], parts[index + 2].lower()
+            if tag in ("script", "style"):
+                open_tag, body, close_tag = re.match(r"(<[^>]*>)(.*)(</[^>]*>)$", element, re.S).groups()
+                if body.strip():
+                    body = minify_js(body) if tag == "script" else minify_css(body)
+                element = open_tag + body + close_tag
+            out.append(element)
+    return "".join(out).strip() + "\n"
+
+
+# ─── Build ────────────────────────────────────────────────────────────────
+def _fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _is_local(ref):
+    return not re.match(r"^(?:[a-z]+:|//|#|data:)", ref, re.I)
+
+
+class _Build:
+    def __init__(self, src, out):
+        self.src   = src
+        self.out   = out
+        self.files = {}
+
+    def emit(self, name, data, immutable):
+        path = os.path.join(self.out, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+        encodings = []
+        for encoding, suffix in ENCODINGS:
+            if encoding == "br":
+                if brotli is None:
+                    continue
+                packed = brotli.compress(data, quality=11)
+            else:
+                packed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(packed) <= len(data) * MIN_SAVING:
+                with open(path + suffix, "wb") as f:
+                    f.write(packed)
+                encodings.append(encoding)
+
+        self.files[name] = {
+            "etag":      _fingerprint(data),
+            "type":      mimetypes.guess_type(name)[0] or "application/octet-stream",
+            "size":      len(data),
+            "encodings": encodings,
+            "immutable": immutable,
+        }
+
+    def asset(self, stem, ext, data):
+        """Write a fingerprinted asset; returns its URL relative to index.html."""
+        name = f"assets/{stem}.{_fingerprint(data)}{ext}"
+        self.emit(name, data, immutable=True)
+        return name
+
+    def read(self, ref):
+        with open(os.path.join(self.src, ref.split("?")[0]), "rb") as f:
+            return f.read()
+
+
+def build(src=".", out="dist"):
+    """Build the site into `out`; returns the manifest."""
+    shutil.rmtree(out, ignore_errors=True)
+    job = _Build(src, out)
+    with open(os.path.join(src, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+
+    stylesheets = re.compile(r'<link\b[^>]*rel="stylesheet"[^>]*href="([^"]+)"[^>]*>\s*', re.I)
+    scripts     = re.compile(r'<script\b[^>]*src="([^"]+)"[^>]*>\s*</script>\s*', re.I)
+
+    css = [ref for ref in stylesheets.findall(html) if _is_local(ref)]
+    js  = [ref for ref in scripts.findall(html) if _is_local(ref)]
+    if css:
+        bundle = "\n".join(minify_css(job.read(ref).decode("utf-8")) for ref in css)
+        url    = job.asset("bundle", ".css", bundle.encode("utf-8"))
+        html   = _replace_group(html, stylesheets, css, f'<link rel="stylesheet" href="{url}" />\n')
+    if js:
+        bundle = "".join(minify_js(job.read(ref).decode("utf-8")) for ref in js)
+        url    = job.asset("bundle", ".js", bundle.encode("utf-8"))
+        html   = _replace_group(html, scripts, js, f'<script src="{url}"></script>\n')
+
+    # Every other local file referenced by the page (favicon, images)
+    copied = {}
+
+    def rewrite(match):
+        attr, ref = match.groups()
+        path = os.path.join(src, ref)
+        if not _is_local(ref) or ref.startswith("assets/") or not os.path.isfile(path):
+            return match.group(0)
+        if ref not in copied:
+            stem, ext   = os.path.splitext(os.path.basename(ref))
+            copied[ref] = job.asset(stem, ext, job.read(ref))
+        return f'{attr}="{copied[ref]}"'
+
+    html = re.sub(r'\b(href|src)="([^"]+)"', rewrite, html)
+    job.emit("index.html", minify_html(html).encode("utf-8"), immutable=False)
+
+    manifest = {"files": job.files}
+    with open(os.path.join(out, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _replace_group(html, pattern, refs, replacement):
+    """Swap the first tag referencing one of `refs` for `replacement`, drop the rest."""
+    placed = False
+
+    def swap(match):
+        nonlocal placed
+        if match.group(1) not in refs:
+            return match.group(0)
+        if placed:
+            return ""
+        placed = True
+        return replacement
+    return pattern.sub(swap, html)
+
+
+# ─── Serving ──────────────────────────────────────────────────────────────
+class StaticAssets:
+    """Serves a build directory; response(name) is None when `name` is not in the build."""
+
+    def __init__(self, root):
+        self.root   = root
+        self._lock  = threading.Lock()
+        self._mtime = None
+        self._files = {}
+        self._bytes = {}
+
+    def _manifest(self):
+        try:
+            mtime = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns
+        except OSError:
+            return {}
+        if mtime != self._mtime:                # first use, or rebuilt while running
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(os.path.join(self.root, MANIFEST)) as f:
+                        self._files = json.load(f)["files"]
+                    self._bytes = {}
+                    self._mtime = mtime
+        return self._files
+
+    @property
+    def built(self):
+        return bool(self._manifest())
+
+    def _read(self, name):
+        data = self._bytes.get(name)
+        if data is None:
+            with open(os.path.join(self.root, name), "rb") as f:
+                data = self._bytes[name] = f.read()
+        return data
+
+    def response(self, name):
+        entry = self._manifest().get(name)
+        if entry is None:
+            return None
+
+        encoding, best = None, 0.0
+        for candidate, _ in ENCODINGS:
+            q = request.accept_encodings[candidate]
+            if candidate in entry["encodings"] and q > best:
+                encoding, best = candidate, q
+        suffix = dict(ENCODINGS)[encoding] if encoding else ""
+
+        response = Response(self._read(name + suffix), mimetype=entry["type"])
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"]          = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE if entry["immutable"] else REVALIDATE
+        response.set_etag(entry["etag"] + (f"-{encoding}" if encoding else ""))
+        return response.make_conditional(request)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["build"]:
+        sys.exit("usage: python assets.py build [src] [out]")
+    here     = os.path.dirname(os.path.abspath(__file__))
+    src      = sys.argv[2] if len(sys.argv) > 2 else here
+    out      = sys.argv[3] if len(sys.argv) > 3 else os.path.join(here, "dist")
+    manifest = build(src, out)
+    if brotli is None:
+        print("[WARN] brotli not installed — gzip variants only (pip install brotli)")
+    for name, entry in sorted(manifest["files"].items()):
+        print(f"  {name:<36} {entry['size']:>8,} B  {' '.join(entry['encodings']) or '-'}")
@@ -0,0 +1,502 @@
+"""
+asyncio serving mode (aiohttp).
+
+    python async_app.py [--port 5000]
+    gunicorn async_app:create_app --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:$PORT
+
+/api/analyze/image, /api/analyze/images and /api/analyze/text run on the
+event loop and call the providers through one aiohttp ClientSession, so a
+single process can hold hundreds of provider calls in flight where a sync
+worker holds one per thread.  They share app.py's cache tiers, cascade,
+router breakers, history writer and response shapes; the local steps
+(pHash, metadata, SQLite, spool writes) run in a small thread pool.  Uploads
+are streamed to the providers from the spool, never read into one bytes
+object.
+
+Every other route is answered by the Flask app through a WSGI bridge on the
+same thread pool, so the process serves the whole API.
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from aiohttp import web
+from werkzeug.utils import secure_filename
+
+import metrics
+from app import (app as flask_app, create_app as create_flask_app, prepare_image, finish_image,
+                 prepare_text, finish_text, sightengine_fields, sightengine_result, huggingface_result,
+                 openrouter_request, openrouter_result, _save_history)
+from config import Config
+from http_client import RETRY_STATUSES
+from jobs import job_queue
+from limits import limits
+from router import router
+from spool import UploadSpool, MultipartBody
+
+CHUNK = 64 * 1024
+
+
+# ─── Outbound HTTP ────────────────────────────────────────────────────────
+class AsyncProviderClient:
+    """aiohttp counterpart of http_client.ProviderClient: timeouts, retries, metrics."""
+
+    def __init__(self, name, read_timeout):
+        self.name         = name
+        self.timeout      = aiohttp.ClientTimeout(sock_connect=Config.HTTP_CONNECT_TIMEOUT, sock_read=read_timeout)
+        self.in_flight    = 0
+        self.calls        = 0
+        self.retried      = 0
+
+    async def request(self, session, method, url, stream=None, **kwargs):
+        """Returns (status, body bytes).  Retries like the sync client.
+
+        `stream` is a callable returning a fresh request body (an async
+        generator) for each attempt, so a streamed upload can be re-sent.
+        """
+        self.calls     += 1
+        self.in_flight += 1
+        try:
+            attempt = 0
+            while True:
+                started = time.perf_counter()
+                if stream is not None:
+                    kwargs["data"] = stream()
+                try:
+                    async with session.request(method, url, timeout=self.timeout, **kwargs) as response:
+                        body = await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    metrics.provider_latency.observe(time.perf_counter() - started, self.name)
+                    metrics.provider_requests.inc(self.name, "error")
+                    if attempt >= Config.HTTP_RETRIES:
+                        raise
+                    retry_after = None
+                else:
+                    metrics.provider_latency.observe(time.perf_counter() - started, self.name)
+                    metrics.provider_requests.inc(self.name, str(response.status))
+                    if response.status not in RETRY_STATUSES or attempt >= Config.HTTP_RETRIES:
+                        return response.status, body
+                    retry_after = response.headers.get("Retry-After", "")
+
+                delay = min(Config.HTTP_BACKOFF_MAX, Config.HTTP_BACKOFF * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, min(Config.HTTP_BACKOFF_MAX, int(retry_after)))
+                await asyncio.sleep(delay)
+                attempt      += 1
+                self.retried += 1
+        finally:
+            self.in_flight -= 1
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "calls": self.calls, "retried": self.retried}
+
+
+aio_clients = {
+    "sightengine": AsyncProviderClient("sightengine", Config.SIGHTENGINE_READ_TIMEOUT),
+    "huggingface": AsyncProviderClient("huggingface", Config.HUGGINGFACE_READ_TIMEOUT),
+    "openrouter":  AsyncProviderClient("openrouter",  Config.OPENROUTER_READ_TIMEOUT),
+}
+
+
+def _limited(name, fn):
+    """Each call holds one of the provider's slots, shared with the sync workers (see limits.py)."""
+    async def call(*args):
+        async with limits.slot_async(name):
+            return await fn(*args)
+    return call
+
+
+def _streamed(pool, source):
+    """Body factory for AsyncProviderClient.request: `source` from the start, CHUNK bytes
+    at a time read in `pool` — the upload is never held in memory a second time."""
+    async def chunks():
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(pool, source.seek, 0)
+        while chunk := await loop.run_in_executor(pool, source.read, CHUNK):
+            yield chunk
+    return chunks
+
+
+async def sightengine(session, pool, upload, filename="image"):
+    try:
+        with MultipartBody(sightengine_fields(), "media", filename, upload.reader()) as body:
+            status, raw = await aio_clients["sightengine"].request(
+                session, "POST", Config.SIGHTENGINE_API_URL, stream=_streamed(pool, body),
+                headers={"Content-Type": body.content_type, "Content-Length": str(len(body))})
+        return sightengine_result(status, json.loads(raw) if status == 200 else None)
+    except Exception as e:
+        return {"error": f"Sightengine: {e}"}
+
+
+async def huggingface(session, pool, upload, filename=None):
+    try:
+        with upload.reader() as reader:
+            status, raw = await aio_clients["huggingface"].request(
+                session, "POST", Config.HUGGINGFACE_API_URL, stream=_streamed(pool, reader),
+                headers={"Authorization":  f"Bearer {Config.HUGGINGFACE_API_KEY}",
+                         "Content-Type":   "application/octet-stream",
+                         "Content-Length": str(len(reader))})
+        return huggingface_result(status, json.loads(raw) if status == 200 else None)
+    except Exception as e:
+        return {"error": f"HuggingFace: {e}"}
+
+
+async def openrouter(session, text):
+    try:
+        headers, payload = openrouter_request(text)
+        status, raw = await aio_clients["openrouter"].request(
+            session, "POST", Config.OPENROUTER_API_URL, json=payload, headers=headers)
+        return openrouter_result(status, raw.decode("utf-8", "replace"))
+    except Exception as e:
+        return {"error": f"OpenRouter failed: {e}"}
+
+
+# ─── Analyses ─────────────────────────────────────────────────────────────
+async def analyze_image_upload(request, upload, filename):
+    loop  = asyncio.get_running_loop()
+    pool  = request.app["pool"]
+    state = await loop.run_in_executor(pool, prepare_image, upload, filename)
+    if state["result"] is None:
+        session = request.app["session"]
+        state["result"] = await router.call_async([
+            ("sightengine", _limited("sightengine", lambda *args: sightengine(session, pool, *args))),
+            ("huggingface", _limited("huggingface", lambda *args: huggingface(session, pool, *args))),
+        ], upload, secure_filename(filename) or "image")
+    return await loop.run_in_executor(pool, finish_image, state)
+
+
+async def score_text(request, text):
+    loop  = asyncio.get_running_loop()
+    pool  = request.app["pool"]
+    state = await loop.run_in_executor(pool, prepare_text, text)
+    if state["tier"] == "provider":
+        session = request.app["session"]
+        state["result"] = await router.call_async([("openrouter", _limited("openrouter", lambda t: openrouter(session, t)))], text)
+    return await loop.run_in_executor(pool, finish_text, state)
+
+
+class UploadTooLarge(Exception):
+    """The multipart body went past Config.MAX_CONTENT_LENGTH (Flask answers 413 too)."""
+
+
+def _too_large():
+    limit = Config.MAX_CONTENT_LENGTH // (1024 * 1024)
+    return web.json_response({"success": False, "error": f"Upload too large (max {limit} MB)"}, status=413)
+
+
+async def _read_uploads(request, field_names):
+    """Multipart files under `field_names` as [(filename, UploadSpool)], hashed while received.
+
+    `client_max_size` does not cover request.multipart(), so the bytes are
+    counted here; past MAX_CONTENT_LENGTH the spools are closed and
+    UploadTooLarge is raised.  Spool writes (hashing, the roll-over to a temp
+    file) run in the pool, off the event loop.
+    """
+    uploads, fields = [], {}
+    if not request.content_type.startswith("multipart/"):
+        return uploads, fields
+    if (request.content_length or 0) > Config.MAX_CONTENT_LENGTH:
+        raise UploadTooLarge()
+    loop, pool = asyncio.get_running_loop(), request.app["pool"]
+    received   = 0
+
+    async def chunks(part):
+        nonlocal received
+        while chunk := await part.read_chunk(CHUNK):
+            received += len(chunk)
+            if received > Config.MAX_CONTENT_LENGTH:
+                raise UploadTooLarge()
+            yield chunk
+
+    spool = None
+    try:
+        reader = await request.multipart()
+        async for part in reader:
+            if part.filename is None:
+                value = bytearray()
+                async for chunk in chunks(part):
+                    value += chunk
+                fields[part.name] = value.decode(part.get_charset("utf-8"), "replace")
+                continue
+            if part.name not in field_names:
+                await part.release()
+                continue
+            spool = UploadSpool()
+            async for chunk in chunks(part):
+                await loop.run_in_executor(pool, spool.write, chunk)
+            spool.seek(0)
+            metrics.upload_bytes.observe(spool.size, "image")
+            uploads.append((part.filename, spool))
+            spool = None
+    except BaseException:
+        for unused in [spool] + [upload for _, upload in uploads]:
+            if unused is not None:
+                unused.close()
+        raise
+    return uploads, fields
+
+
+def _wants_async(request, fields):
+    value = request.query.get("async", fields.get("async", False))
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _reply(body, status=200):
+    """json_response with Retry-After when the body carries one (429/503)."""
+    headers = {"Retry-After": str(body["retry_after"])} if "retry_after" in body else None
+    return web.json_response(body, status=status, headers=headers)
+
+
+def _client(request):
+    """Client address for the rate limit — X-Forwarded-For like ProxyFix when PROXY_HOPS is set."""
+    if Config.PROXY_HOPS:
+        forwarded = [h.strip() for h in request.headers.get("X-Forwarded-For", "").split(",") if h.strip()]
+        if len(forwarded) >= Config.PROXY_HOPS:
+            return forwarded[-Config.PROXY_HOPS]
+    return request.remote or "unknown"
+
+
+async def _rate_limited(request, cost=1):
+    """None when the client may run `cost` more analyses now, else a 429 response."""
+    loop = asyncio.get_running_loop()
+    wait = await loop.run_in_executor(request.app["pool"], limits.take, _client(request), cost)
+    if not wait:
+        return None
+    metrics.rate_limited.inc(request.match_info.route.resource.canonical)
+    retry_after = max(1, math.ceil(wait))
+    return _reply({"success": False, "error": f"Rate limit exceeded — retry in {retry_after}s",
+                   "retry_after": retry_after}, 429)
+
+
+def _job_accepted(job_id):
+    return web.json_response({
+        "success":    True,
+        "job_id":     job_id,
+        "status":     "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events"
+    }, status=202)
+
+
+# ─── Routes ───────────────────────────────────────────────────────────────
+async def analyze_image(request):
+    try:
+        uploads, fields = await _read_uploads(request, ("image",))
+        if not uploads:
+            return web.json_response({"success": False, "error": "No image provided"}, status=400)
+        filename, upload = uploads[0]
+        if filename == "":
+            return web.json_response({"success": False, "error": "No selected file"}, status=400)
+
+        if _wants_async(request, fields):
+            def submit():
+                with upload.reader() as reader:
+                    return job_queue.submit("image", {"filename": filename}, reader.read())
+            return _job_accepted(await asyncio.get_running_loop().run_in_executor(request.app["pool"], submit))
+
+        body, status = await analyze_image_upload(request, upload, filename)
+        return _reply(body, status)
+
+    except UploadTooLarge:
+        return _too_large()
+    except Exception as e:
+        return web.json_response({"success": False, "error": str(e)}, status=500)
+
+
+async def analyze_images(request):
+    try:
+        uploads, _ = await _read_uploads(request, ("images", "image"))
+        if not uploads:
+            return web.json_response({"success": False, "error": "No images provided"}, status=400)
+        if len(uploads) > Config.BATCH_MAX_FILES:
+            return web.json_response(
+                {"success": False, "error": f"Too many files (max {Config.BATCH_MAX_FILES})"}, status=400)
+        limited = await _rate_limited(request, len(uploads))
+        if limited:
+            return limited
+
+        async def score(filename, upload):
+            if filename == "":
+                return {"success": False, "error": "No selected file"}
+            try:
+                body, _ = await analyze_image_upload(request, upload, filename)
+                return body
+            except Exception as e:
+                return {"success": False, "error": str(e)}
+
+        bodies  = await asyncio.gather(*(score(filename, upload) for filename, upload in uploads))
+        results = [{"index": index, "filename": filename, **body}
+                   for index, ((filename, _), body) in enumerate(zip(uploads, bodies))]
+
+        succeeded = sum(1 for r in results if r["success"])
+        return web.json_response({
+            "success":   True,
+            "total":     len(results),
+            "succeeded": succeeded,
+            "failed":    len(results) - succeeded,
+            "results":   results
+        })
+
+    except UploadTooLarge:
+        return _too_large()
+    except Exception as e:
+        return web.json_response({"success": False, "error": str(e)}, status=500)
+
+
+async def analyze_text(request):
+    try:
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        body = body if isinstance(body, dict) else {}
+        text = str(body.get("text", "")).strip()
+
+        if len(text) < 10:
+            return web.json_response({"success": False, "error": "Text too short (min 10 chars)"}, status=400)
+
+        if _wants_async(request, body):
+            return _job_accepted(await asyncio.get_running_loop().run_in_executor(
+                request.app["pool"], job_queue.submit, "text", {"text": text}))
+
+        data = await score_text(request, text)
+        _save_history("text_analysis", "text", data["ai_score"], data["human_score"], data["verdict"], data["confidence"])
+        return web.json_response({"success": True, "data": data})
+
+    except Exception as e:
+        return web.json_response({"success": False, "error": str(e)}, status=500)
+
+
+async def async_stats(request):
+    return web.json_response({"clients": {name: c.stats() for name, c in aio_clients.items()},
+                              "tasks": len(asyncio.all_tasks())})
+
+
+# ─── Everything else: the Flask app over WSGI ─────────────────────────────
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "upgrade"}
+
+
+def _environ(request, body):
+    host, _, port = request.host.partition(":")
+    environ = {
+        "REQUEST_METHOD":    request.method,
+        "SCRIPT_NAME":       "",
+        "PATH_INFO":         request.path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING":      request.query_string,
+        "SERVER_NAME":       host,
+        "SERVER_PORT":       port or ("443" if request.scheme == "https" else "80"),
+        "SERVER_PROTOCOL":   f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR":       request.remote or "",
+        "CONTENT_TYPE":      request.headers.get("Content-Type", ""),
+        "CONTENT_LENGTH":    str(len(body)),
+        "wsgi.version":      (1, 0),
+        "wsgi.url_scheme":   request.scheme,
+        "wsgi.input":        io.BytesIO(body),
+        "wsgi.errors":       sys.stderr,
+        "wsgi.multithread":  True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once":     False,
+    }
+    for name, value in request.headers.items():
+        key = "HTTP_" + name.upper().replace("-", "_")
+        if key not in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def wsgi_bridge(request):
+    loop    = asyncio.get_running_loop()
+    pool    = request.app["pool"]
+    body    = await request.read()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+
+    def call():
+        result = flask_app(_environ(request, body), start_response)
+        return result, iter(result)
+
+    result, chunks = await loop.run_in_executor(pool, call)
+    try:
+        first    = await loop.run_in_executor(pool, next, chunks, None)
+        response = web.StreamResponse(status=int(started["status"].split(" ", 1)[0]))
+        for name, value in started["headers"]:
+            if name.lower() not in HOP_BY_HOP:
+                response.headers.add(name, value)
+        await response.prepare(request)
+        chunk = first
+        while chunk is not None:            # streamed bodies (SSE, NDJSON) are relayed as they come
+            if chunk:
+                await response.write(chunk)
+            chunk = await loop.run_in_executor(pool, next, chunks, None)
+        await response.write_eof()
+        return response
+    finally:
+        if hasattr(result, "close"):
+            await loop.run_in_executor(pool, result.close)
+
+
+# ─── Application ──────────────────────────────────────────────────────────
+@web.middleware
+async def admit(request, handler):
+    """Per-client rate limit for the native analyze routes (bridged ones pass Flask's hook)."""
+    if request.method == "POST" and request.match_info.handler not in (wsgi_bridge, analyze_images):
+        limited = await _rate_limited(request)
+        if limited:
+            return limited
+    return await handler(request)
+
+
+@web.middleware
+async def observe(request, handler):
+    """Request metrics and CORS for the native routes (the Flask app does its own)."""
+    if request.match_info.handler is wsgi_bridge:
+        return await handler(request)
+    started = time.perf_counter()
+    status  = 500
+    try:
+        response = await handler(request)
+        status   = response.status
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        return response
+    finally:
+        route = request.match_info.route.resource.canonical
+        metrics.http_latency.observe(time.perf_counter() - started, route, request.method)
+        metrics.http_requests.inc(route, request.method, str(status))
+
+
+async def _lifecycle(application):
+    application["pool"]    = ThreadPoolExecutor(max_workers=Config.ASYNC_THREADS, thread_name_prefix="async-local")
+    application["session"] = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=Config.ASYNC_HTTP_CONNECTIONS, limit_per_host=0))
+    yield
+    await application["session"].close()
+    application["pool"].shutdown(wait=False)
+
+
+async def create_app():
+    create_flask_app()                          # schema, warm caches, background threads
+    application = web.Application(middlewares=[observe, admit], client_max_size=Config.MAX_CONTENT_LENGTH)
+    application.cleanup_ctx.append(_lifecycle)
+    application.router.add_post("/api/analyze/image",  analyze_image)
+    application.router.add_post("/api/analyze/images", analyze_images)
+    application.router.add_post("/api/analyze/text",   analyze_text)
+    application.router.add_get("/api/async/stats",     async_stats)
+    application.router.add_route("*", "/{tail:.*}",    wsgi_bridge)
+    return application
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OmniDetect AI — asyncio server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""
+Sync vs asyncio serving: throughput and memory per in-flight request.
+
+    python benchmarks/bench_async.py --concurrency 16 64 256 --latency 0.5
+
+sync     gunicorn app:app, 1 sync worker (the Procfile)
+threads  gunicorn app:app, 1 gthread worker with --threads = concurrency
+async    gunicorn async_app:create_app, 1 aiohttp worker
+
+Each server runs against the local fake providers (fake_providers.py) with
+--latency seconds per call, the cascade disabled (every request reaches a
+provider) and the provider concurrency caps raised so they do not limit
+either mode.  An aiohttp client keeps --concurrency requests in flight for
+--duration seconds.  "MB/in-flight" is the server's peak RSS during the run
+minus its idle RSS, divided by the requests it had in flight.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import aiohttp
+
+import fake_providers
+from bench_load import random_png, random_text
+
+MODES = {
+    "sync":    lambda c: ["app:app", "--workers", "1"],
+    "threads": lambda c: ["app:app", "--workers", "1", "--worker-class", "gthread", "--threads", str(c)],
+    "async":   lambda c: ["async_app:create_app", "--workers", "1", "--worker-class", "aiohttp.GunicornWebWorker"],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Resident memory of `pid` and its children (gunicorn master + worker)."""
+    pids, total = {pid}, 0
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        pids.add(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def start_server(mode, concurrency, env, workdir):
+    port = free_port()
+    cmd  = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+            "--timeout", "300", "--log-level", "warning", *MODES[mode](concurrency)]
+    # Fresh working directory per run: databases, caches and uploads start empty
+    env  = {**env, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))}
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(base, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{base}/api/health") as r:
+                    if r.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base} did not start")
+
+
+async def drive(base, endpoint, concurrency, duration, image_size, seed):
+    latencies, errors = [], 0
+    stop = time.perf_counter() + duration
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout   = aiohttp.ClientTimeout(total=300)
+
+    async def worker(i):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + i)
+        while time.perf_counter() < stop:
+            if endpoint == "text":
+                kwargs = {"json": {"text": random_text(rng)}}
+            else:
+                form = aiohttp.FormData()
+                form.add_field("image", random_png(rng, image_size), filename="bench.png", content_type="image/png")
+                kwargs = {"data": form}
+            t = time.perf_counter()
+            try:
+                async with session.post(f"{base}/api/analyze/{endpoint}", **kwargs) as r:
+                    await r.read()
+                    ok = r.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            latencies.append(time.perf_counter() - t)
+            errors += not ok
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def sample_peak(pid, stop, peak):
+    while not stop.is_set():
+        peak[0] = max(peak[0], rss_mb(pid))
+        stop.wait(0.1)
+
+
+def run(mode, args, concurrency, env):
+    workdir = tempfile.mkdtemp(prefix=f"bench-async-{mode}-")
+    proc, base = start_server(mode, concurrency, env, workdir)
+    try:
+        asyncio.run(wait_ready(base))
+        asyncio.run(drive(base, args.endpoint, min(concurrency, 4), 1.0, args.image_size, 99))   # warm up
+        time.sleep(0.5)
+        idle = rss_mb(proc.pid)
+
+        stop, peak = threading.Event(), [idle]
+        sampler = threading.Thread(target=sample_peak, args=(proc.pid, stop, peak), daemon=True)
+        sampler.start()
+        latencies, errors, elapsed = asyncio.run(
+            drive(base, args.endpoint, concurrency, args.duration, args.image_size, args.seed))
+        stop.set()
+        sampler.join()
+
+        latencies.sort()
+        # A sync worker only ever has one request in flight, whatever the client does
+        in_flight = 1 if mode == "sync" else concurrency
+        return {
+            "rps":      len(latencies) / elapsed,
+            "p50":      statistics.median(latencies),
+            "p99":      latencies[max(0, int(len(latencies) * 0.99) - 1)],
+            "errors":   errors / len(latencies) if latencies else 1.0,
+            "idle_mb":  idle,
+            "per_req":  (peak[0] - idle) / in_flight,
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes",       nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--endpoint",    choices=["text", "image"], default="text")
+    parser.add_argument("--latency",     type=float, default=0.5, help="fake provider latency, seconds")
+    parser.add_argument("--duration",    type=float, default=10)
+    parser.add_argument("--image-size",  type=int,   default=64)
+    parser.add_argument("--seed",        type=int,   default=1)
+    args = parser.parse_args()
+
+    specs = [(name, {"latency": args.latency, "jitter": args.latency / 10}) for name in fake_providers.PROVIDERS]
+    fakes = fake_providers.start_all(specs)
+    env   = {**os.environ, **fake_providers.environment(fakes),
+             "CASCADE_ENABLED": "0", "PHASH_ENABLED": "0", "RATE_LIMIT_PER_MINUTE": "0",
+             "SIGHTENGINE_CONCURRENCY": "4096", "HUGGINGFACE_CONCURRENCY": "4096", "OPENROUTER_CONCURRENCY": "4096"}
+    try:
+        print(f"endpoint={args.endpoint}  provider latency={args.latency:g}s  duration={args.duration:g}s")
+        print(f"{'mode':<8} {'conc':>5} {'req/s':>8} {'p50':>9} {'p99':>9} {'errors':>7} {'idle RSS':>9} {'MB/in-flight':>13}")
+        for concurrency in args.concurrency:
+            for mode in args.modes:
+                r = run(mode, args, concurrency, env)
+                print(f"{mode:<8} {concurrency:>5} {r['rps']:>8.1f} {r['p50'] * 1000:>7.0f}ms {r['p99'] * 1000:>7.0f}ms "
+                      f"{r['errors']:>6.1%} {r['idle_mb']:>7.1f}MB {r['per_req']:>13.3f}", flush=True)
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
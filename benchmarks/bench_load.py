@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+"""
+Offline load test: the Flask app against local fake providers.
+
+    python benchmarks/bench_load.py --concurrency 16 --duration 30
+    python benchmarks/bench_load.py --fake openrouter:latency=2,errors=0.2 --mix text=1
+    python benchmarks/bench_load.py --json base.json            # save a baseline
+    python benchmarks/bench_load.py --compare base.json          # exit 1 on regression
+
+Starts the fakes from fake_providers.py, points Config at them through the
+environment, runs app.py in-process (werkzeug, threaded) with its databases
+in a temp directory, and drives it with --concurrency client threads picking
+endpoints by --mix weight.  No real API quota or mail is used.
+
+With --target the app is not started: run it yourself with the `export`
+lines from `python benchmarks/fake_providers.py` (gunicorn, another host…).
+
+Every request carries a fresh random text / noise image, so the result cache
+and near-duplicate index only help with --repeat > 0 (fraction of requests
+that reuse an earlier payload).
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import numpy as np
+import requests
+from PIL import Image
+
+import fake_providers
+
+WORDS = ("the a model system data people city river report study time results team "
+         "quickly often never really maybe however furthermore overall moreover "
+         "built wrote found walked considered noticed measured delivered said was").split()
+PHRASES = ("it is important to note", "in conclusion", "delve into", "furthermore",
+           "a testament to", "plays a crucial role", "in today's fast-paced world")
+
+
+def random_text(rng):
+    sentences = []
+    for _ in range(rng.randint(3, 8)):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 24))]
+        if rng.random() < 0.3:
+            words.insert(0, rng.choice(PHRASES))
+        sentences.append(" ".join(words).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def random_png(rng, size):
+    pixels = np.random.default_rng(rng.getrandbits(32)).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# ── Endpoints: name → fn(session, base url, payload source) → response ──
+def _text(session, base, src):
+    return session.post(f"{base}/api/analyze/text", json={"text": src.text()})
+
+
+def _text_batch(session, base, src):
+    return session.post(f"{base}/api/analyze/text/batch", json={"texts": [src.text() for _ in range(8)]})
+
+
+def _image(session, base, src):
+    return session.post(f"{base}/api/analyze/image", files={"image": ("bench.png", src.image(), "image/png")})
+
+
+def _history(session, base, src):
+    return session.get(f"{base}/api/history", params={"limit": 20})
+
+
+def _stats(session, base, src):
+    return session.get(f"{base}/api/stats")
+
+
+def _health(session, base, src):
+    return session.get(f"{base}/api/health")
+
+
+def _email(session, base, src):
+    return session.post(f"{base}/api/send-email", json={
+        "name": "Load Test", "email": "load@example.com", "message": src.text()[:200]})
+
+
+ENDPOINTS = {
+    "text":       _text,
+    "text_batch": _text_batch,
+    "image":      _image,
+    "history":    _history,
+    "stats":      _stats,
+    "health":     _health,
+    "email":      _email,
+}
+
+
+class Payloads:
+    """Fresh payloads, or with probability `repeat` one already sent."""
+
+    def __init__(self, seed, repeat, image_size):
+        self.rng        = random.Random(seed)
+        self.repeat     = repeat
+        self.image_size = image_size
+        self._texts, self._images = [], []
+
+    def _pick(self, seen, make):
+        if seen and self.rng.random() < self.repeat:
+            return self.rng.choice(seen)
+        value = make()
+        if len(seen) < 256:
+            seen.append(value)
+        return value
+
+    def text(self):
+        return self._pick(self._texts, lambda: random_text(self.rng))
+
+    def image(self):
+        return self._pick(self._images, lambda: random_png(self.rng, self.image_size))
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r} (one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def start_app(fakes):
+    """Import app.py with Config pointed at the fakes and serve it on a free port."""
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    os.environ.update(fake_providers.environment(fakes))
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")   # one client address — set it to load-test the limiter
+    os.chdir(workdir)                               # database.db, cache.db, jobs.db, uploads/
+    from werkzeug.serving import make_server
+    import app as omnidetect
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)     # no access log per request
+
+    server = make_server("127.0.0.1", 0, omnidetect.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server, workdir
+
+
+def run(base, mix, concurrency, duration, warmup, seed, repeat, image_size):
+    names, weights = list(mix), list(mix.values())
+    samples = []                                    # (endpoint, seconds, ok)
+    lock    = threading.Lock()
+    start   = time.perf_counter() + warmup
+    stop    = start + duration
+
+    def worker(i):
+        rng, src = random.Random(seed + i), Payloads(seed * 1000 + i, repeat, image_size)
+        session  = requests.Session()
+        local    = []
+        while True:
+            t = time.perf_counter()
+            if t >= stop:
+                break
+            name = rng.choices(names, weights)[0]
+            try:
+                ok = ENDPOINTS[name](session, base, src).status_code < 400
+            except requests.RequestException:
+                ok = False
+            if t >= start:
+                local.append((name, time.perf_counter() - t, ok))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarise(samples, duration):
+    by_endpoint = {}
+    for name, seconds, ok in samples:
+        by_endpoint.setdefault(name, []).append((seconds, ok))
+    by_endpoint["all"] = [(seconds, ok) for _, seconds, ok in samples]
+
+    report = {}
+    for name, rows in by_endpoint.items():
+        if not rows:
+            continue
+        latencies = sorted(seconds for seconds, _ in rows)
+        errors    = sum(1 for _, ok in rows if not ok)
+        report[name] = {
+            "requests":   len(rows),
+            "rps":        round(len(rows) / duration, 2),
+            "p50_ms":     round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms":     round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms":     round(percentile(latencies, 0.99) * 1000, 2),
+            "error_rate": round(errors / len(rows), 4),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{'endpoint':<11} {'requests':>8} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    for name, r in report.items():
+        print(f"{name:<11} {r['requests']:>8} {r['rps']:>8.1f} {r['p50_ms']:>7.1f}ms "
+              f"{r['p95_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['error_rate']:>6.1%}")
+
+
+def compare(report, baseline, tolerance):
+    """Regressions vs a saved report: p95 up or throughput down by > tolerance, more errors."""
+    problems = []
+    for name, old in baseline.items():
+        new = report.get(name)
+        if new is None:
+            continue
+        if new["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {old['p95_ms']}ms → {new['p95_ms']}ms")
+        if new["rps"] < old["rps"] * (1 - tolerance):
+            problems.append(f"{name}: req/s {old['rps']} → {new['rps']}")
+        if new["error_rate"] > old["error_rate"] + 0.01:
+            problems.append(f"{name}: errors {old['error_rate']:.1%} → {new['error_rate']:.1%}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target",      help="base URL of an already running app (fakes not started)")
+    parser.add_argument("--concurrency", type=int,   default=8)
+    parser.add_argument("--duration",    type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup",      type=float, default=2,  help="seconds excluded from the results")
+    parser.add_argument("--mix",         type=parse_mix, default=parse_mix("text=4,image=3,history=1,stats=1,email=1"))
+    parser.add_argument("--fake",        type=fake_providers.parse_spec, action="append", default=[],
+                        metavar="NAME:KEY=VALUE,...", help="fake provider settings, see fake_providers.py")
+    parser.add_argument("--repeat",      type=float, default=0.0, help="fraction of payloads reused")
+    parser.add_argument("--image-size",  type=int,   default=128, help="noise PNG side in pixels")
+    parser.add_argument("--seed",        type=int,   default=1)
+    parser.add_argument("--json",        help="write the report to this file")
+    parser.add_argument("--compare",     help="baseline report; exit 1 on regression")
+    parser.add_argument("--tolerance",   type=float, default=0.20)
+    args = parser.parse_args()
+    json_out, baseline = (os.path.abspath(p) if p else None for p in (args.json, args.compare))
+
+    fakes, server, workdir = {}, None, None
+    if args.target:
+        base = args.target.rstrip("/")
+    else:
+        fakes = fake_providers.start_all(args.fake)
+        base, server, workdir = start_app(fakes)
+
+    try:
+        print(f"{base}  concurrency={args.concurrency}  duration={args.duration:g}s  "
+              f"mix={','.join(f'{k}={v:g}' for k, v in args.mix.items())}")
+        samples = run(base, args.mix, args.concurrency, args.duration, args.warmup,
+                      args.seed, args.repeat, args.image_size)
+        report = summarise(samples, args.duration)
+        print_report(report)
+        for name, fake in fakes.items():
+            s = fake.stats()
+            print(f"  fake {name:<12} calls={s['calls']:<6} injected errors={s['errors']}")
+    finally:
+        if server is not None:
+            server.shutdown()
+        for fake in fakes.values():
+            fake.stop()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if json_out:
+        with open(json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
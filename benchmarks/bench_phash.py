@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Benchmark the perceptual-hash near-duplicate index on a synthetic corpus.
+
+    python benchmarks/bench_phash.py --size 1000000 --queries 5000
+
+Part 1 checks that dHash keeps re-encoded copies of an image within the
+configured distance.  Part 2 fills a MultiIndexHash with random 64-bit
+hashes and times lookups for near-duplicates (a few bits flipped) and for
+misses, against a linear scan over the same corpus.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from phash import MultiIndexHash, dhash, dhash_bytes, hamming
+
+
+def synthetic_image(rng, size=512):
+    img  = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1, y1 = x0 + rng.randrange(20, 200), y0 + rng.randrange(20, 200)
+        draw.ellipse((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return img.filter(ImageFilter.GaussianBlur(2))
+
+
+def encode(img, fmt, **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, fmt, **kwargs)
+    return buf.getvalue()
+
+
+def robustness(rng, images):
+    variants = {
+        "jpeg q=60":   lambda im: encode(im, "JPEG", quality=60),
+        "resize 50%":  lambda im: encode(im.resize((im.width // 2, im.height // 2)), "PNG"),
+        "resize 150%": lambda im: encode(im.resize((im.width * 3 // 2, im.height * 3 // 2)), "PNG"),
+        "crop 2%":     lambda im: encode(im.crop((5, 5, im.width - 5, im.height - 5)), "PNG"),
+    }
+    print(f"dHash distance to original over {images} synthetic images")
+    originals = [synthetic_image(rng) for _ in range(images)]
+    for name, make in variants.items():
+        dists = sorted(hamming(dhash(im), dhash_bytes(make(im))) for im in originals)
+        print(f"  {name:<12} median={dists[len(dists) // 2]:>2}  max={dists[-1]:>2}")
+    unrelated = sorted(hamming(dhash(a), dhash(b)) for a, b in zip(originals, originals[1:]))
+    print(f"  {'unrelated':<12} median={unrelated[len(unrelated) // 2]:>2}  min={unrelated[0]:>2}")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def lookups(rng, size, queries, max_distance):
+    index  = MultiIndexHash()
+    corpus = [rng.getrandbits(64) for _ in range(size)]
+    t0 = time.perf_counter()
+    for i, h in enumerate(corpus):
+        index.add(i, h)
+    print(f"\nindexed {size:,} hashes in {time.perf_counter() - t0:.2f}s")
+
+    near = []
+    for _ in range(queries):
+        h = rng.choice(corpus)
+        for b in rng.sample(range(64), rng.randint(0, max_distance)):
+            h ^= 1 << b
+        near.append(h)
+    miss = [rng.getrandbits(64) for _ in range(queries)]
+
+    for label, qs in (("near-duplicate", near), ("miss", miss)):
+        times, found = [], 0
+        for q in qs:
+            t = time.perf_counter()
+            found += index.search(q, max_distance) is not None
+            times.append(time.perf_counter() - t)
+        print(f"  {label:<15} found={found}/{len(qs)}  "
+              f"mean={sum(times) / len(times) * 1e6:7.1f}µs  "
+              f"p50={percentile(times, .50) * 1e6:7.1f}µs  "
+              f"p99={percentile(times, .99) * 1e6:7.1f}µs")
+
+    scan_n = min(50, queries)
+    t = time.perf_counter()
+    for q in near[:scan_n]:
+        min(hamming(q, h) for h in corpus)
+    print(f"  {'linear scan':<15} mean={(time.perf_counter() - t) / scan_n * 1e6:7.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size",         type=int, default=1_000_000)
+    parser.add_argument("--queries",      type=int, default=5000)
+    parser.add_argument("--images",       type=int, default=50)
+    parser.add_argument("--max-distance", type=int, default=6)
+    parser.add_argument("--seed",         type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    robustness(rng, args.images)
+    lookups(rng, args.size, args.queries, args.max_distance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+History write throughput with concurrent writers.
+
+    python benchmarks/bench_storage.py --writers 1 4 16 --rows 2000
+
+legacy   connect → INSERT → commit → close per row, default rollback journal
+         (what _save_history used to do)
+reused   one WAL connection per thread (storage.Database), commit per row
+batched  storage.BatchWriter: callers only enqueue, a background thread
+         commits grouped transactions
+
+Each writer thread inserts --rows rows; "rows/s" is total rows over the wall
+time until every row is committed, "p99 call" is the latency the caller
+(i.e. a request handler) sees per _save_history call.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Database, BatchWriter
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS history (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename    TEXT,
+        file_type   TEXT,
+        ai_score    REAL,
+        human_score REAL,
+        verdict     TEXT,
+        confidence  REAL,
+        timestamp   DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+INSERT = "INSERT INTO history (filename, file_type, ai_score, human_score, verdict, confidence) VALUES (?,?,?,?,?,?)"
+ROW    = ("image.png", "image", 0.91, 0.09, "AI Generated", 0.82)
+
+
+def legacy_writer(path):
+    def save(row):
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute(INSERT, row)
+        conn.commit()
+        conn.close()
+    return save, lambda: None
+
+
+def reused_writer(path):
+    db = Database(path, timeout=30)
+
+    def save(row):
+        with db.conn() as conn:
+            conn.execute(INSERT, row)
+    return save, lambda: None
+
+
+def batched_writer(path):
+    writer = BatchWriter(path, INSERT)
+    return writer.write, writer.flush
+
+
+def run(make_writer, path, writers, rows):
+    save, flush = make_writer(path)
+    latencies = [[] for _ in range(writers)]
+    barrier   = threading.Barrier(writers + 1)
+
+    def worker(i):
+        barrier.wait()
+        for _ in range(rows):
+            t = time.perf_counter()
+            save(ROW)
+            latencies[i].append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    flush()
+    elapsed = time.perf_counter() - started
+
+    with sqlite3.connect(path) as conn:
+        written = conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+    calls = sorted(x for per_thread in latencies for x in per_thread)
+    return written / elapsed, statistics.median(calls), calls[int(len(calls) * 0.99) - 1], written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rows",    type=int, default=1000, help="rows per writer thread")
+    args = parser.parse_args()
+
+    modes = [("legacy", legacy_writer), ("reused", reused_writer), ("batched", batched_writer)]
+    print(f"{'writers':>7}  {'mode':<8} {'rows/s':>10} {'p50 call':>10} {'p99 call':>10}")
+    for writers in args.writers:
+        for name, make_writer in modes:
+            tmp  = tempfile.mkdtemp(prefix="bench-storage-")
+            path = os.path.join(tmp, "history.db")
+            try:
+                with sqlite3.connect(path) as conn:
+                    conn.execute(SCHEMA)
+                rate, p50, p99, written = run(make_writer, path, writers, args.rows)
+                assert written == writers * args.rows, f"{name}: {written} rows written"
+                print(f"{writers:>7}  {name:<8} {rate:>10,.0f} {p50 * 1000:>8.3f}ms {p99 * 1000:>8.3f}ms")
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
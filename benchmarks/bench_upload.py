@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Memory and latency of the upload → provider path, legacy vs streaming.
+
+    python benchmarks/bench_upload.py --sizes 1 2 4 8 16 --repeat 5
+
+legacy     image.save() to UPLOAD_FOLDER, re-open, read the whole file and
+           post it with requests' `files=` (what analyze_image used to do)
+streaming  UploadSpool filled in 64 KB chunks as Werkzeug does, then
+           MultipartBody streamed through the pooled provider client
+
+Both post to a local sink server that drains the body, so the numbers cover
+buffering and transfer only.  Peak memory is the tracemalloc high-water mark
+above the baseline (the incoming upload itself is excluded).
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from http_client import ProviderClient
+from spool import UploadSpool, MultipartBody
+
+CHUNK = 64 * 1024
+
+
+class Sink(BaseHTTPRequestHandler):
+    protocol_version        = "HTTP/1.1"
+    disable_nagle_algorithm = True      # no 40 ms delayed-ACK stalls on keep-alive
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, CHUNK)))
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+def legacy(data, url, folder):
+    path = os.path.join(folder, "upload.png")
+    with open(path, "wb") as f:                        # image.save(filepath)
+        for i in range(0, len(data), CHUNK):
+            f.write(data[i:i + CHUNK])
+    with open(path, "rb") as f:
+        requests.post(url, files={"media": ("upload.png", f.read())}, timeout=30)
+
+
+def streaming(data, url, client):
+    spool = UploadSpool()
+    view  = memoryview(data)
+    for i in range(0, len(data), CHUNK):               # Werkzeug writes parts in chunks
+        spool.write(view[i:i + CHUNK])
+    spool.seek(0)
+    with MultipartBody({"models": "genai"}, "media", "upload.png", spool.reader()) as body:
+        client.post(url, data=body, headers={"Content-Type": body.content_type})
+    spool.close()
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0   = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - t0
+    peak    = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes",  type=int, nargs="+", default=[1, 2, 4, 8, 16], help="MB")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Sink)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url    = f"http://127.0.0.1:{server.server_port}/check.json"
+    client = ProviderClient("bench", pool_size=4, read_timeout=30, retries=0)
+    folder = tempfile.mkdtemp(prefix="bench-upload-")
+
+    print(f"{'size':>6}  {'path':<10} {'p50 ms':>9} {'peak MB':>9}")
+    try:
+        for mb in args.sizes:
+            data = os.urandom(mb * 1024 * 1024)
+            for name, fn, extra in (("legacy", legacy, folder), ("streaming", streaming, client)):
+                runs  = [measure(fn, data, url, extra) for _ in range(args.repeat)]
+                p50   = statistics.median(r[0] for r in runs) * 1000
+                peak  = max(r[1] for r in runs) / (1024 * 1024)
+                print(f"{mb:>4}MB  {name:<10} {p50:>9.1f} {peak:>9.2f}")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
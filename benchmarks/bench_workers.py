@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""
+Cold start and throughput from 1 to N gunicorn workers, plain vs preloaded.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --concurrency 16 --latency 0.2
+
+plain    gunicorn app:app --workers N (every worker imports the app and warms
+         its caches on its first request)
+preload  gunicorn -c gunicorn.conf.py "app:create_app(preload=True)" --workers N
+         (the master imports and warms once, workers are forked from it)
+
+Each run gets a fresh working directory whose databases were primed by a
+previous server over the same --distinct texts, so the result cache has
+something to warm.  "cold start" is the time from launching gunicorn to the
+first 200 from /api/health; "first req" is the slowest of the first
+concurrency × workers analyses, which includes any per-worker start-up.
+Then an aiohttp client keeps --concurrency requests in flight for
+--duration seconds, drawing texts from the corpus at random.  "hit ratio"
+comes from omnidetect_cache_lookups_total in /api/metrics, which sums over
+the workers.  Memory is the master plus all workers once the run is over:
+RSS counts a page shared copy-on-write once per process, PSS splits it
+between them (the figure where preloading shows).
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import aiohttp
+
+import fake_providers
+from bench_async import free_port, rss_mb, wait_ready
+from bench_load import random_text
+
+MODES = {
+    "plain":   lambda n: ["app:app", "--workers", str(n)],
+    "preload": lambda n: ["-c", os.path.join(ROOT, "gunicorn.conf.py"), "app:create_app(preload=True)",
+                          "--workers", str(n)],
+}
+
+LOOKUP_RE = re.compile(r'^omnidetect_cache_lookups_total\{result="(\w+)"\} (\d+)', re.M)
+
+
+def pss_mb(pid):
+    """Proportional set size of `pid` and its children, from /proc/<pid>/smaps_rollup."""
+    pids, total = {pid}, 0
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        pids.add(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def start_server(mode, workers, env, workdir):
+    port = free_port()
+    cmd  = [sys.executable, "-m", "gunicorn", *MODES[mode](workers), "--bind", f"127.0.0.1:{port}",
+            "--timeout", "300", "--log-level", "warning"]
+    env  = {**env, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))}
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def drive(base, corpus, concurrency, duration=None, count=None, seed=1):
+    """Keep `concurrency` requests in flight for `duration` seconds (or `count` requests in all)."""
+    latencies, errors, sent = [], 0, 0
+    stop = time.perf_counter() + (duration or 1e9)
+
+    async def worker(i):
+        nonlocal errors, sent
+        rng = random.Random(seed * 1000 + i)
+        while time.perf_counter() < stop and (count is None or sent < count):
+            sent += 1
+            t = time.perf_counter()
+            try:
+                async with session.post(f"{base}/api/analyze/text", json={"text": rng.choice(corpus)}) as r:
+                    await r.read()
+                    ok = r.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            latencies.append(time.perf_counter() - t)
+            errors += not ok
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+async def cache_lookups(base):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{base}/api/metrics") as r:
+            text = await r.text()
+    return {result: int(n) for result, n in LOOKUP_RE.findall(text)}
+
+
+def prime(corpus, env):
+    """A working directory whose databases already hold a verdict for every text."""
+    workdir = tempfile.mkdtemp(prefix="bench-workers-primed-")
+    proc, base = start_server("plain", 1, env, workdir)
+    try:
+        asyncio.run(wait_ready(base))
+        for text in corpus:
+            asyncio.run(drive(base, [text], 1, count=1))
+    finally:
+        stop_server(proc)
+    return workdir
+
+
+def run(mode, workers, args, corpus, primed, env):
+    workdir = tempfile.mkdtemp(prefix=f"bench-workers-{mode}-")
+    shutil.rmtree(workdir)
+    shutil.copytree(primed, workdir)
+    started    = time.perf_counter()
+    proc, base = start_server(mode, workers, env, workdir)
+    try:
+        asyncio.run(wait_ready(base, timeout=120))
+        cold = time.perf_counter() - started
+        first, _, _ = asyncio.run(drive(base, corpus, args.concurrency, count=args.concurrency * workers))
+
+        before = asyncio.run(cache_lookups(base))
+        latencies, errors, elapsed = asyncio.run(
+            drive(base, corpus, args.concurrency, duration=args.duration, seed=args.seed))
+        time.sleep(float(env["METRICS_SHARE_INTERVAL"]) * 2)        # let every worker publish
+        after = asyncio.run(cache_lookups(base))
+
+        delta  = {k: after.get(k, 0) - before.get(k, 0) for k in ("memory", "disk", "miss")}
+        total  = sum(delta.values())
+        latencies.sort()
+        return {
+            "cold":    cold,
+            "first":   max(first),
+            "rps":     len(latencies) / elapsed,
+            "p50":     statistics.median(latencies),
+            "p99":     latencies[max(0, int(len(latencies) * 0.99) - 1)],
+            "errors":  errors / len(latencies) if latencies else 1.0,
+            "hits":    (delta["memory"] + delta["disk"]) / total if total else 0.0,
+            "memory":  delta["memory"] / total if total else 0.0,
+            "rss":     rss_mb(proc.pid),
+            "pss":     pss_mb(proc.pid),
+        }
+    finally:
+        stop_server(proc)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes",       nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--workers",     type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int,   default=16)
+    parser.add_argument("--latency",     type=float, default=0.2, help="fake provider latency, seconds")
+    parser.add_argument("--duration",    type=float, default=10)
+    parser.add_argument("--distinct",    type=int,   default=200, help="texts in the corpus")
+    parser.add_argument("--fresh",       type=float, default=0.1, help="fraction of texts never seen before")
+    parser.add_argument("--seed",        type=int,   default=1)
+    args = parser.parse_args()
+
+    rng    = random.Random(args.seed)
+    corpus = [random_text(rng) for _ in range(args.distinct)]
+    seen   = corpus[:int(len(corpus) * (1 - args.fresh))]
+
+    specs = [(name, {"latency": args.latency, "jitter": args.latency / 10}) for name in fake_providers.PROVIDERS]
+    fakes = fake_providers.start_all(specs)
+    env   = {**os.environ, **fake_providers.environment(fakes),
+             "CASCADE_ENABLED": "0", "RATE_LIMIT_PER_MINUTE": "0", "METRICS_SHARE_INTERVAL": "0.5",
+             "OPENROUTER_CONCURRENCY": "4096"}
+    primed = prime(seen, env)
+    try:
+        print(f"provider latency={args.latency:g}s  concurrency={args.concurrency}  duration={args.duration:g}s  "
+              f"corpus={args.distinct} ({args.fresh:.0%} unseen)")
+        print(f"{'mode':<8} {'workers':>7} {'cold start':>10} {'first req':>10} {'req/s':>8} {'p50':>9} {'p99':>9} "
+              f"{'errors':>7} {'hit ratio':>9} {'in memory':>9} {'RSS':>8} {'PSS':>8}")
+        for workers in args.workers:
+            for mode in args.modes:
+                r = run(mode, workers, args, corpus, primed, env)
+                print(f"{mode:<8} {workers:>7} {r['cold']:>9.2f}s {r['first'] * 1000:>8.0f}ms {r['rps']:>8.1f} "
+                      f"{r['p50'] * 1000:>7.0f}ms {r['p99'] * 1000:>7.0f}ms {r['errors']:>6.1%} "
+                      f"{r['hits']:>9.1%} {r['memory']:>9.1%} {r['rss']:>6.1f}MB {r['pss']:>6.1f}MB", flush=True)
+    finally:
+        shutil.rmtree(primed, ignore_errors=True)
+        for fake in fakes.values():
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Local stand-ins for Sightengine, HuggingFace, OpenRouter and Resend.
+
+    python benchmarks/fake_providers.py --fake sightengine:latency=0.4,errors=0.05
+
+Each fake drains the request body, sleeps for its latency (± jitter), then
+answers with a payload shaped like the real API — or with `status` for an
+`errors` fraction of calls.  Scores are random unless `score` is given.
+Run standalone it prints the environment variables that point the app at the
+fakes; bench_load.py starts them in-process.
+
+Spec keys per provider: latency (s), jitter (s), errors (0–1), status (HTTP
+code for injected errors), score (0–1).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK = 64 * 1024
+
+PROVIDERS = {
+    # name: (env var holding the URL, path served)
+    "sightengine": ("SIGHTENGINE_API_URL", "/1.0/check.json"),
+    "huggingface": ("HUGGINGFACE_API_URL", "/models/ai-image-detector"),
+    "openrouter":  ("OPENROUTER_API_URL",  "/api/v1/chat/completions"),
+    "resend":      ("RESEND_API_URL",      "/emails"),
+}
+
+DEFAULTS = {
+    "sightengine": {"latency": 0.30, "jitter": 0.10, "errors": 0.0, "status": 503, "score": None},
+    "huggingface": {"latency": 0.60, "jitter": 0.20, "errors": 0.0, "status": 503, "score": None},
+    "openrouter":  {"latency": 0.80, "jitter": 0.30, "errors": 0.0, "status": 503, "score": None},
+    "resend":      {"latency": 0.15, "jitter": 0.05, "errors": 0.0, "status": 500, "score": None},
+}
+
+
+def _payload(name, score):
+    if name == "sightengine":
+        return {"status": "success", "type": {"ai_generated": score}}
+    if name == "huggingface":
+        return [[{"label": "ai-generated", "score": score}, {"label": "human", "score": round(1 - score, 4)}]]
+    if name == "openrouter":
+        content = json.dumps({"ai_probability": score, "confidence": 0.8, "reason": "fake provider"})
+        return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+    return {"id": str(uuid.uuid4())}
+
+
+class FakeProvider:
+    """One fake API on its own port.  Settings can be changed while it runs."""
+
+    def __init__(self, name, host="127.0.0.1", port=0, **settings):
+        self.name     = name
+        self.settings = {**DEFAULTS[name], **settings}
+        self.calls    = 0
+        self.errors   = 0
+        self._lock    = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version        = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                remaining, count = int(self.headers.get("Content-Length", 0)), None
+                if self.path.endswith("/batch"):          # Resend batch: one id per message
+                    count = len(json.loads(self.rfile.read(remaining) or b"[]"))
+                    remaining = 0
+                while remaining:
+                    remaining -= len(self.rfile.read(min(remaining, CHUNK)))
+                status, body = fake._respond(count)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{PROVIDERS[self.name][1]}"
+
+    def _respond(self, count=None):
+        s = self.settings
+        time.sleep(max(0.0, random.gauss(s["latency"], s["jitter"])))
+        with self._lock:
+            self.calls += 1
+            failed = random.random() < s["errors"]
+            if failed:
+                self.errors += 1
+        if failed:
+            return s["status"], {"error": f"injected {self.name} failure"}
+        score = s["score"] if s["score"] is not None else round(random.random(), 4)
+        if count is not None:
+            return 200, {"data": [_payload(self.name, score) for _ in range(count)]}
+        return 200, _payload(self.name, score)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name=f"fake-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors}
+
+
+def parse_spec(text):
+    """"sightengine:latency=0.4,errors=0.05" → ("sightengine", {"latency": 0.4, "errors": 0.05})."""
+    name, _, options = text.partition(":")
+    if name not in PROVIDERS:
+        raise argparse.ArgumentTypeError(f"unknown provider {name!r} (one of {', '.join(PROVIDERS)})")
+    settings = {}
+    for item in filter(None, options.split(",")):
+        key, _, value = item.partition("=")
+        if key not in DEFAULTS[name]:
+            raise argparse.ArgumentTypeError(f"unknown setting {key!r} for {name}")
+        settings[key] = int(value) if key == "status" else float(value)
+    return name, settings
+
+
+def start_all(specs=(), host="127.0.0.1"):
+    """Start every fake (specs override the defaults); returns {name: FakeProvider}."""
+    overrides = dict(specs)
+    return {name: FakeProvider(name, host, **overrides.get(name, {})).start() for name in PROVIDERS}
+
+
+def environment(fakes):
+    """Env vars pointing config.Config at the fakes (set before config is imported)."""
+    env = {PROVIDERS[name][0]: fake.url for name, fake in fakes.items()}
+    if "resend" in fakes:
+        env["RESEND_BATCH_URL"] = fakes["resend"].url + "/batch"
+    env.update({
+        "SIGHTENGINE_API_USER":   "bench",
+        "SIGHTENGINE_API_SECRET": "bench",
+        "HUGGINGFACE_API_KEY":    "bench",
+        "OPENROUTER_API_KEY":     "bench",
+        "RESEND_API_KEY":         "bench",
+    })
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fake", type=parse_spec, action="append", default=[], metavar="NAME:KEY=VALUE,...")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    fakes = start_all(args.fake, args.host)
+    for key, value in environment(fakes).items():
+        print(f"export {key}={value}")
+    print("# Ctrl-C to stop", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for fake in fakes.values():
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
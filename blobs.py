@@ -0,0 +1,241 @@
+"""
+Content-addressed upload store.
+
+Each upload is stored once per SHA-256 under a sharded layout,
+root/ab/cd/abcd…, so identical files share one copy and different files
+with the same name never overwrite each other.  The `blobs` table (main
+database) records size, last use and a reference count that triggers on
+`history` keep equal to the number of history rows naming the blob, in the
+same transaction as the insert or delete; a blob stored again after the
+collector removed it starts from the rows that still name it.
+
+A collector thread removes, in this order: unreferenced blobs older than
+`grace`, blobs unused for `max_age` seconds, then the least recently used
+blobs (unreferenced first) until the store fits in `max_bytes`.  Blobs used
+within `grace` are never collected, so an upload whose history row is still
+queued survives.  History rows keep their hash after the blob is gone.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import Config
+from metrics import blob_reclaimed_bytes, blob_store_bytes
+from storage import ConnectionLocal, connect
+
+
+CHUNK = 256 * 1024
+
+
+def init_blob_refs(conn):
+    """Create the blobs table and the history triggers that count references."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            digest      TEXT PRIMARY KEY,
+            size        INTEGER NOT NULL,
+            refs        INTEGER NOT NULL DEFAULT 0,
+            created_at  REAL NOT NULL,
+            last_used   REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_blobs_last_used ON blobs (last_used)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_history_blob ON history (blob) WHERE blob IS NOT NULL')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_blob_ref AFTER INSERT ON history WHEN NEW.blob IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refs = refs + 1 WHERE digest = NEW.blob;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_blob_unref AFTER DELETE ON history WHEN OLD.blob IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refs = refs - 1 WHERE digest = OLD.blob;
+        END
+    ''')
+    # Recount once per migration: rows re-created before refs survived a re-insert drifted
+    conn.execute("UPDATE blobs SET refs = (SELECT COUNT(*) FROM history WHERE blob = blobs.digest)")
+
+
+class BlobStore:
+    def __init__(self, path, root, max_bytes=0, max_age=0, grace=600, interval=300, batch=500):
+        self.path      = path
+        self.root      = root
+        self.max_bytes = max_bytes              # 0 = no size budget
+        self.max_age   = max_age                # seconds; 0 = keep while referenced
+        self.grace     = grace
+        self.interval  = interval
+        self.batch     = batch                  # blobs deleted per transaction
+
+        self._local    = ConnectionLocal()
+        self._wake     = threading.Event()
+        self._thread   = None
+        self._stopping = False
+
+        self._lock        = threading.Lock()
+        self.stored       = 0
+        self.deduplicated = 0
+        self.collected    = 0
+        self.reclaimed    = 0
+        self.last_gc      = None
+
+    # ── Storage ──────────────────────────────────────────────────────────
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, timeout=10, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, upload):
+        """Store an UploadSpool under its hash (once); returns the hash for history.blob."""
+        digest = upload.digest
+        now    = time.time()
+        # A re-created row counts the history rows that outlived the last copy (age/budget sweeps)
+        self._conn().execute(
+            "INSERT INTO blobs (digest, size, refs, created_at, last_used) "
+            "VALUES (?, ?, (SELECT COUNT(*) FROM history WHERE blob = ?), ?, ?) "
+            "ON CONFLICT (digest) DO UPDATE SET last_used = excluded.last_used",
+            (digest, upload.size, digest, now, now)
+        )
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            with self._lock:
+                self.deduplicated += 1
+            return digest
+
+        # Write beside the target and rename, so a reader never sees half a file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, "wb") as dst, upload.reader() as src:
+                while chunk := src.read(CHUNK):
+                    dst.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            self.stored += 1
+        return digest
+
+    def open(self, digest):
+        return open(self.path_for(digest), "rb")
+
+    # ── Garbage collection ───────────────────────────────────────────────
+    def _delete(self, conn, victims, reason):
+        """Drop rows and files while holding the write lock, so a concurrent put() cannot slip between."""
+        reclaimed = 0
+        conn.executemany("DELETE FROM blobs WHERE digest = ?", [(digest,) for digest, _ in victims])
+        for digest, size in victims:
+            try:
+                os.remove(self.path_for(digest))
+                reclaimed += size
+            except FileNotFoundError:
+                pass
+        blob_reclaimed_bytes.inc(reason, amount=reclaimed)
+        with self._lock:
+            self.collected += len(victims)
+            self.reclaimed += reclaimed
+        return reclaimed
+
+    def _sweep(self, reason, select, params, budget=None):
+        """Delete what `select` returns, `batch` rows per transaction; stop early once under `budget`."""
+        conn, reclaimed = self._conn(), 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(select, (*params, self.batch)).fetchall()
+                if budget is not None:
+                    excess = conn.execute("SELECT TOTAL(size) FROM blobs").fetchone()[0] - budget
+                    victims = []
+                    for digest, size in rows:
+                        if excess <= 0:
+                            break
+                        victims.append((digest, size))
+                        excess -= size
+                    rows = victims
+                if rows:
+                    reclaimed += self._delete(conn, rows, reason)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if len(rows) < self.batch:
+                return reclaimed
+
+    def collect(self):
+        """One pass of the collector; returns {"bytes": reclaimed, "blobs": removed} for this pass."""
+        now       = time.time()
+        before    = self.collected
+        settled   = now - self.grace
+        reclaimed = self._sweep(
+            "unreferenced",
+            "SELECT digest, size FROM blobs WHERE refs <= 0 AND last_used < ? LIMIT ?", (settled,))
+        if self.max_age:
+            reclaimed += self._sweep(
+                "age",
+                "SELECT digest, size FROM blobs WHERE last_used < ? LIMIT ?", (min(settled, now - self.max_age),))
+        if self.max_bytes:
+            reclaimed += self._sweep(
+                "budget",
+                "SELECT digest, size FROM blobs WHERE last_used < ? ORDER BY refs > 0, last_used LIMIT ?",
+                (settled,), budget=self.max_bytes)
+        blob_store_bytes.set(self._conn().execute("SELECT TOTAL(size) FROM blobs").fetchone()[0])
+        self.last_gc = now
+        return {"bytes": int(reclaimed), "blobs": self.collected - before}
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                self.collect()
+            except (sqlite3.Error, OSError) as e:
+                print(f"[WARN] Blob store GC: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="blob-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def stats(self):
+        count, size, unreferenced = self._conn().execute(
+            "SELECT COUNT(*), TOTAL(size), TOTAL(refs <= 0) FROM blobs"
+        ).fetchone()
+        with self._lock:
+            return {
+                "blobs":           count,
+                "bytes":           int(size),
+                "unreferenced":    int(unreferenced),
+                "max_bytes":       self.max_bytes,
+                "stored":          self.stored,
+                "deduplicated":    self.deduplicated,
+                "collected":       self.collected,
+                "reclaimed_bytes": self.reclaimed,
+                "last_gc_age_s":   round(time.time() - self.last_gc, 1) if self.last_gc else None
+            }
+
+
+blob_store = BlobStore(
+    Config.DATABASE,
+    Config.UPLOAD_FOLDER,
+    max_bytes = Config.BLOB_MAX_BYTES,
+    max_age   = Config.BLOB_MAX_AGE_SECONDS,
+    grace     = Config.BLOB_GRACE_SECONDS,
+    interval  = Config.BLOB_GC_INTERVAL
+)
@@ -0,0 +1,226 @@
+"""
+Content-addressed result cache for the analysis endpoints.
+
+Two tiers:
+  1. In-memory LRU (per worker, fastest; warm() fills it from tier 2, once
+     in the gunicorn master so every forked worker starts with it)
+  2. SQLite table with TTL + size-based eviction (shared across workers/restarts)
+
+Lookups are counted per tier in the cache_lookups metric, which /api/metrics
+sums over all workers.
+
+Keys are "<namespace>:<sha256>", where the namespace identifies the provider
+and model that produced the verdict, e.g. "sightengine/genai".
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from metrics import cache_lookups
+from storage import ConnectionLocal, connect
+
+
+_WS_RE = re.compile(r"\s+")
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially re-formatted copies share a key."""
+    return _WS_RE.sub(" ", text).strip()
+
+
+def hash_text(text):
+    return hash_bytes(normalize_text(text).encode("utf-8"))
+
+
+class ResultCache:
+    EVICT_EVERY = 100
+
+    def __init__(self, path, memory_size=1024, ttl=86400, max_rows=100000):
+        self.path        = path
+        self.memory_size = memory_size
+        self.ttl         = ttl
+        self.max_rows    = max_rows
+
+        self._lru  = OrderedDict()           # key → (expires_at, value)
+        self._lock = threading.Lock()
+        self._local = ConnectionLocal()
+
+        self.hits_memory = 0
+        self.hits_disk   = 0
+        self.misses      = 0
+        self.evictions   = 0
+        self._writes     = 0
+
+        self._init_table()
+
+    # ── SQLite tier ──────────────────────────────────────────────────────
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def _init_table(self):
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS result_cache (
+                key         TEXT PRIMARY KEY,
+                value       TEXT NOT NULL,
+                created_at  REAL NOT NULL,
+                expires_at  REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_expires ON result_cache (expires_at)')
+        conn.commit()
+
+    def _disk_get(self, key, now):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def _disk_put(self, key, value, now, expires_at):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO result_cache (key, value, created_at, expires_at) VALUES (?,?,?,?)",
+            (key, json.dumps(value), now, expires_at)
+        )
+        conn.commit()
+
+    def _disk_evict(self, now):
+        """Drop expired rows, then the oldest rows beyond max_rows."""
+        conn = self._conn()
+        cur  = conn.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,))
+        removed = cur.rowcount
+        total   = conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+        if total > self.max_rows:
+            cur = conn.execute(
+                "DELETE FROM result_cache WHERE key IN "
+                "(SELECT key FROM result_cache ORDER BY expires_at ASC LIMIT ?)",
+                (total - self.max_rows,)
+            )
+            removed += cur.rowcount
+        conn.commit()
+        return removed
+
+    # ── Memory tier ──────────────────────────────────────────────────────
+    def _memory_put(self, key, value, expires_at):
+        with self._lock:
+            self._lru[key] = (expires_at, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.memory_size:
+                self._lru.popitem(last=False)
+
+    # ── Public API ───────────────────────────────────────────────────────
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._lru.move_to_end(key)
+                    self.hits_memory += 1
+                    cache_lookups.inc("memory")
+                    return entry[1]
+                del self._lru[key]
+
+        try:
+            value, expires_at = self._disk_get(key, now)
+        except sqlite3.Error as e:
+            print(f"[WARN] Result cache read failed: {e}")
+            return None
+
+        if value is not None:
+            self._memory_put(key, value, expires_at)
+            with self._lock:
+                self.hits_disk += 1
+            cache_lookups.inc("disk")
+        return value
+
+    def get(self, key):
+        value = self._get(key)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            cache_lookups.inc("miss")
+        return value
+
+    def set(self, key, value):
+        now        = time.time()
+        expires_at = now + self.ttl
+        self._memory_put(key, value, expires_at)
+        try:
+            self._disk_put(key, value, now, expires_at)
+            # Amortise eviction: only sweep once every EVICT_EVERY writes
+            with self._lock:
+                self._writes += 1
+                sweep = self._writes % self.EVICT_EVERY == 0
+            if sweep:
+                removed = self._disk_evict(now)
+                with self._lock:
+                    self.evictions += removed
+        except sqlite3.Error as e:
+            print(f"[WARN] Result cache write failed: {e}")
+
+    def lookup(self, namespaces, digest):
+        """Try each provider namespace in order; return (namespace, value) or (None, None)."""
+        for ns in namespaces:
+            value = self._get(f"{ns}:{digest}")
+            if value is not None:
+                return ns, value
+        with self._lock:
+            self.misses += 1
+        cache_lookups.inc("miss")
+        return None, None
+
+    def warm(self, limit=None):
+        """Load the newest unexpired rows into the memory tier; returns how many."""
+        now  = time.time()
+        rows = self._conn().execute(
+            "SELECT key, value, expires_at FROM result_cache WHERE expires_at > ? "
+            "ORDER BY created_at DESC LIMIT ?", (now, limit or self.memory_size)
+        ).fetchall()
+        for key, value, expires_at in reversed(rows):           # newest ends up most recently used
+            self._memory_put(key, json.loads(value), expires_at)
+        return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+        conn = self._conn()
+        conn.execute("DELETE FROM result_cache")
+        conn.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits_memory + self.hits_disk
+            total = hits + self.misses
+            return {
+                "hits":        hits,
+                "hits_memory": self.hits_memory,
+                "hits_disk":   self.hits_disk,
+                "misses":      self.misses,
+                "evictions":   self.evictions,
+                "hit_ratio":   round(hits / total, 4) if total else 0.0,
+                "memory_size": len(self._lru)
+            }
+
+
+result_cache = ResultCache(
+    Config.CACHE_DATABASE,
+    memory_size = Config.CACHE_MEMORY_SIZE,
+    ttl         = Config.CACHE_TTL_SECONDS,
+    max_rows    = Config.CACHE_MAX_ROWS
+)
@@ -0,0 +1,110 @@
+"""
+Confidence-gated cascade: score locally first, pay for a provider only
+when the local score is uncertain.
+
+Each kind (text, image) has an uncertainty band [low, high] around the
+0.25/0.75 verdict thresholds.  A local score outside the band decides the
+verdict on its own; inside it the request escalates to the providers.
+Every decision is counted per tier with its latency, so the stats show how
+many provider calls — and how much provider latency — the cascade avoided.
+
+Tiers:  cache     — verdict reused from the result cache / near-duplicates
+        local     — local score outside the band
+        provider  — escalated and answered by a provider
+        fallback  — escalated (or over budget) but no provider answer; local score used
+"""
+import threading
+
+from PIL import Image, ExifTags
+
+from config import Config
+
+
+TIERS = ("cache", "local", "provider", "fallback")
+
+# Metadata written by image generators (PNG text chunks, EXIF Software, XMP/C2PA)
+GENERATOR_PNG_KEYS = ("parameters", "prompt", "workflow", "sd-metadata", "invokeai_metadata", "dream")
+GENERATOR_SOFTWARE = ("midjourney", "dall-e", "dall·e", "stable diffusion", "novelai", "firefly",
+                      "imagen", "leonardo", "comfyui", "automatic1111", "invokeai")
+GENERATOR_MARKERS  = (b"trainedAlgorithmicMedia", b"compositeWithTrainedAlgorithmicMedia", b"c2pa.ai_generat")
+METADATA_SCAN_BYTES = 256 * 1024
+
+# Calibrated against the default band (0.15–0.85) so both edges can decide:
+# a generator signature is above the high edge, camera EXIF below the low one
+GENERATOR_SCORE = 0.97
+CAMERA_SCORE    = 0.10
+NEUTRAL_SCORE   = 0.50
+
+
+class Cascade:
+    def __init__(self, kind, low, high, enabled=True):
+        self.kind    = kind
+        self.low     = low
+        self.high    = high
+        self.enabled = enabled
+
+        self._lock     = threading.Lock()
+        self._count    = dict.fromkeys(TIERS, 0)
+        self._seconds  = dict.fromkeys(TIERS, 0.0)
+
+    def decisive(self, score):
+        """True if a local score outside the uncertainty band may decide alone."""
+        return self.enabled and (score < self.low or score > self.high)
+
+    def record(self, tier, seconds):
+        with self._lock:
+            self._count[tier]   += 1
+            self._seconds[tier] += seconds
+
+    def stats(self):
+        with self._lock:
+            count, seconds = dict(self._count), dict(self._seconds)
+        avg_ms = {t: round(seconds[t] / count[t] * 1000, 2) if count[t] else 0.0 for t in TIERS}
+        escalated = count["provider"] + count["fallback"]
+        return {
+            "enabled":   self.enabled,
+            "band":      [self.low, self.high],
+            "tiers":     {t: {"count": count[t], "avg_ms": avg_ms[t]} for t in TIERS},
+            "escalated": escalated,
+            # Every local decision is a provider call that did not happen, each
+            # worth the provider tier's average latency
+            "provider_calls_saved":  count["local"],
+            "est_latency_saved_ms":  round(count["local"] * max(avg_ms["provider"] - avg_ms["local"], 0), 1),
+        }
+
+
+def image_metadata_score(fp):
+    """
+    (score, signal) from an image's metadata alone — no pixels are decoded.
+    Generator signatures → GENERATOR_SCORE; camera EXIF → CAMERA_SCORE;
+    nothing telling → NEUTRAL_SCORE with signal None.
+    """
+    head = fp.read(METADATA_SCAN_BYTES)
+    fp.seek(0)
+    for marker in GENERATOR_MARKERS:
+        if marker in head:
+            return GENERATOR_SCORE, f"xmp:{marker.decode()}"
+
+    with Image.open(fp) as img:
+        for key in GENERATOR_PNG_KEYS:
+            if key in img.info:
+                return GENERATOR_SCORE, f"png:{key}"
+
+        exif     = img.getexif()
+        software = str(exif.get(ExifTags.Base.Software, "") or img.info.get("Software", "")).lower()
+        for name in GENERATOR_SOFTWARE:
+            if name in software:
+                return GENERATOR_SCORE, f"software:{name}"
+
+        if exif.get(ExifTags.Base.Make) and exif.get(ExifTags.Base.Model):
+            return CAMERA_SCORE, "exif:camera"
+
+    return NEUTRAL_SCORE, None
+
+
+text_cascade  = Cascade("text",  Config.CASCADE_TEXT_LOW,  Config.CASCADE_TEXT_HIGH,  Config.CASCADE_ENABLED)
+image_cascade = Cascade("image", Config.CASCADE_IMAGE_LOW, Config.CASCADE_IMAGE_HIGH, Config.CASCADE_ENABLED)
+
+
+def stats():
+    return {"text": text_cascade.stats(), "image": image_cascade.stats()}
@@ -7,18 +7,145 @@ class Config:
     # ── Sightengine API ──────────────────────────────────────────────────
     SIGHTENGINE_API_USER   = os.getenv("SIGHTENGINE_API_USER",   "")
     SIGHTENGINE_API_SECRET = os.getenv("SIGHTENGINE_API_SECRET", "")
+    SIGHTENGINE_API_URL    = os.getenv("SIGHTENGINE_API_URL", "https://api.sightengine.com/1.0/check.json")
 
     # ── OpenRouter API (text analysis via GPT-3.5) ───────────────────────
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
-    OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+    OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
 
     # ── HuggingFace API (image analysis) ────────────────────────────────
     HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY", "")
+    HUGGINGFACE_API_URL = os.getenv(
+        "HUGGINGFACE_API_URL",
+        "https://api-inference.huggingface.co/models/therealvish/ai-image-detector"
+    )
 
     # ── File paths ───────────────────────────────────────────────────────
     UPLOAD_FOLDER = "uploads"
     REPORT_FOLDER = "reports"
     DATABASE      = "database.db"
+    REPORT_RETENTION_SECONDS = int(os.getenv("REPORT_RETENTION_SECONDS", str(7 * 86400)))   # see reports.py
+
+    # ── Static assets (see assets.py) ────────────────────────────────────
+    ASSET_DIR = os.getenv("ASSET_DIR", "dist")    # output of `python assets.py build`
+
+    # ── SQLite storage (see storage.py) ──────────────────────────────────
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_KB        = int(os.getenv("SQLITE_CACHE_KB",        "16384"))              # page cache per connection
+    SQLITE_MMAP_BYTES      = int(os.getenv("SQLITE_MMAP_BYTES",      str(128 * 1024 * 1024)))
+    HISTORY_BATCH_SIZE     = int(os.getenv("HISTORY_BATCH_SIZE",     "500"))    # rows per transaction
+    HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.05")) # seconds a row may wait
+
+    # ── Result cache (see cache.py) ──────────────────────────────────────
+    CACHE_DATABASE     = os.getenv("CACHE_DATABASE", "cache.db")
+    CACHE_MEMORY_SIZE  = int(os.getenv("CACHE_MEMORY_SIZE",  "1024"))    # LRU entries per worker
+    CACHE_TTL_SECONDS  = int(os.getenv("CACHE_TTL_SECONDS",  "604800"))  # 7 days
+    CACHE_MAX_ROWS     = int(os.getenv("CACHE_MAX_ROWS",     "200000"))
+
+    # ── Near-duplicate images (see phash.py) ─────────────────────────────
+    PHASH_ENABLED      = os.getenv("PHASH_ENABLED", "1") == "1"
+    PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))   # bits out of 64
+    PHASH_TTL_SECONDS  = int(os.getenv("PHASH_TTL_SECONDS",  str(CACHE_TTL_SECONDS)))
+    PHASH_MAX_ROWS     = int(os.getenv("PHASH_MAX_ROWS",     "100000"))  # hashes held by every worker
+
+    # ── Batch analysis / provider concurrency ────────────────────────────
+    BATCH_MAX_FILES         = int(os.getenv("BATCH_MAX_FILES",         "50"))
+    BATCH_WORKERS           = int(os.getenv("BATCH_WORKERS",           "16"))
+    SIGHTENGINE_CONCURRENCY = int(os.getenv("SIGHTENGINE_CONCURRENCY", "8"))
+    HUGGINGFACE_CONCURRENCY = int(os.getenv("HUGGINGFACE_CONCURRENCY", "4"))
+    OPENROUTER_CONCURRENCY  = int(os.getenv("OPENROUTER_CONCURRENCY",  "8"))
+    TEXT_BATCH_MAX_ITEMS    = int(os.getenv("TEXT_BATCH_MAX_ITEMS",    "1000"))
+    RESEND_CONCURRENCY      = int(os.getenv("RESEND_CONCURRENCY",      "4"))
+
+    # ── Admission control (see limits.py) ───────────────────────────────
+    # The *_CONCURRENCY caps above hold across all workers; callers beyond
+    # them wait in a bounded queue, then get 503 + Retry-After.
+    LIMITS_DATABASE        = os.getenv("LIMITS_DATABASE", "limits.db")
+    RATE_LIMIT_PER_MINUTE  = float(os.getenv("RATE_LIMIT_PER_MINUTE",  "120"))  # analyses per client; 0 = off
+    RATE_LIMIT_BURST       = int(os.getenv("RATE_LIMIT_BURST",          "60"))
+    PROVIDER_QUEUE_SIZE    = int(os.getenv("PROVIDER_QUEUE_SIZE",       "32"))   # waiting calls per provider
+    PROVIDER_QUEUE_TIMEOUT = float(os.getenv("PROVIDER_QUEUE_TIMEOUT",  "5"))    # seconds in the queue
+    PROXY_HOPS             = int(os.getenv("PROXY_HOPS",                "0"))    # trusted X-Forwarded-For hops
+
+    # ── asyncio serving mode (see async_app.py) ──────────────────────────
+    ASYNC_HTTP_CONNECTIONS = int(os.getenv("ASYNC_HTTP_CONNECTIONS", "512"))   # aiohttp connector limit
+    ASYNC_THREADS          = int(os.getenv("ASYNC_THREADS",          "32"))    # local work + WSGI bridge
+
+    # ── Outbound HTTP (see http_client.py) ───────────────────────────────
+    HTTP_CONNECT_TIMEOUT      = float(os.getenv("HTTP_CONNECT_TIMEOUT",      "3.05"))
+    SIGHTENGINE_READ_TIMEOUT  = float(os.getenv("SIGHTENGINE_READ_TIMEOUT",  "15"))
+    HUGGINGFACE_READ_TIMEOUT  = float(os.getenv("HUGGINGFACE_READ_TIMEOUT",  "20"))
+    OPENROUTER_READ_TIMEOUT   = float(os.getenv("OPENROUTER_READ_TIMEOUT",   "15"))
+    RESEND_READ_TIMEOUT       = float(os.getenv("RESEND_READ_TIMEOUT",       "10"))
+    HTTP_RETRIES              = int(os.getenv("HTTP_RETRIES",                "2"))
+    HTTP_BACKOFF              = float(os.getenv("HTTP_BACKOFF",              "0.5"))   # seconds, doubled per attempt
+    HTTP_BACKOFF_MAX          = float(os.getenv("HTTP_BACKOFF_MAX",          "4"))
+
+    # ── Provider routing (see router.py) ─────────────────────────────────
+    ROUTER_HEDGING            = os.getenv("ROUTER_HEDGING", "1") == "1"
+    ROUTER_HEDGE_DELAY        = float(os.getenv("ROUTER_HEDGE_DELAY",        "4"))    # seconds, upper bound
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD",   "5"))    # consecutive failures
+    BREAKER_COOLDOWN          = float(os.getenv("BREAKER_COOLDOWN",          "30"))   # seconds before a probe
+
+    # ── Local text scorer (see text_engine.py) ───────────────────────────
+    TEXT_LEXICON_PATH = os.getenv("TEXT_LEXICON_PATH", "")    # JSON {phrase: weight}; empty = built-in
+
+    # ── Confidence-gated cascade (see cascade.py) ────────────────────────
+    # A local score outside [LOW, HIGH] decides alone; inside it escalates to
+    # the providers.  Defaults: the 0.25/0.75 verdict thresholds ± 0.10.
+    CASCADE_ENABLED    = os.getenv("CASCADE_ENABLED", "1") == "1"
+    CASCADE_TEXT_LOW   = float(os.getenv("CASCADE_TEXT_LOW",   "0.15"))
+    CASCADE_TEXT_HIGH  = float(os.getenv("CASCADE_TEXT_HIGH",  "0.85"))
+    CASCADE_IMAGE_LOW  = float(os.getenv("CASCADE_IMAGE_LOW",  "0.15"))
+    CASCADE_IMAGE_HIGH = float(os.getenv("CASCADE_IMAGE_HIGH", "0.85"))
+
+    # ── Long documents (see documents.py) ────────────────────────────────
+    DOCUMENT_WINDOW_CHARS           = int(os.getenv("DOCUMENT_WINDOW_CHARS",   "800"))   # = OpenRouter prompt slice
+    DOCUMENT_WINDOW_OVERLAP         = int(os.getenv("DOCUMENT_WINDOW_OVERLAP", "160"))
+    DOCUMENT_MAX_WINDOWS            = int(os.getenv("DOCUMENT_MAX_WINDOWS",    "500"))
+    DOCUMENT_TOKEN_BUDGET           = int(os.getenv("DOCUMENT_TOKEN_BUDGET",   "8000"))  # per document, default
+    DOCUMENT_PROMPT_OVERHEAD_TOKENS = 220         # instructions + system prompt + max_tokens
+
+    # ── Animated images & video clips (see media.py) ─────────────────────
+    FFMPEG_BINARY            = os.getenv("FFMPEG_BINARY", "ffmpeg")       # video only; GIF/APNG/WebP use Pillow
+    MEDIA_FRAME_SIZE         = int(os.getenv("MEDIA_FRAME_SIZE",         "512"))   # px, long side of a frame
+    MEDIA_MAX_SECONDS        = float(os.getenv("MEDIA_MAX_SECONDS",      "300"))   # decoding stops here
+    MEDIA_DECODE_FPS         = float(os.getenv("MEDIA_DECODE_FPS",       "4"))     # video frames looked at per second
+    MEDIA_STRIDE_SECONDS     = float(os.getenv("MEDIA_STRIDE_SECONDS",   "2"))     # pick at least this often
+    MEDIA_SCENE_DISTANCE     = int(os.getenv("MEDIA_SCENE_DISTANCE",     "16"))    # dHash bits = scene change
+    MEDIA_DEDUP_DISTANCE     = int(os.getenv("MEDIA_DEDUP_DISTANCE",     "6"))     # dHash bits = same frame
+    MEDIA_MAX_FRAMES         = int(os.getenv("MEDIA_MAX_FRAMES",         "32"))    # frames kept per clip
+    MEDIA_MAX_PROVIDER_CALLS = int(os.getenv("MEDIA_MAX_PROVIDER_CALLS", "8"))     # per clip
+
+    # ── Async jobs (see jobs.py) ─────────────────────────────────────────
+    JOBS_DATABASE         = os.getenv("JOBS_DATABASE", "jobs.db")
+    JOB_WORKERS           = int(os.getenv("JOB_WORKERS",             "4"))
+    JOB_MAX_ATTEMPTS      = int(os.getenv("JOB_MAX_ATTEMPTS",        "3"))
+    JOB_RETRY_BACKOFF     = float(os.getenv("JOB_RETRY_BACKOFF",     "2"))       # seconds, doubled per attempt
+    JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS",   "86400"))
+
+    # ── Upload buffering (see spool.py) ──────────────────────────────────
+    UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", str(8 * 1024 * 1024)))  # then temp file
+    UPLOAD_PERSIST          = os.getenv("UPLOAD_PERSIST", "0") == "1"    # also keep a copy in the blob store
+
+    # ── Upload store: content-addressed under UPLOAD_FOLDER (see blobs.py) ─
+    BLOB_MAX_BYTES       = int(os.getenv("BLOB_MAX_BYTES",       str(5 * 1024 ** 3)))  # 0 = no size budget
+    BLOB_MAX_AGE_SECONDS = int(os.getenv("BLOB_MAX_AGE_SECONDS", str(30 * 86400)))     # unused this long → gone
+    BLOB_GRACE_SECONDS   = int(os.getenv("BLOB_GRACE_SECONDS",   "600"))    # never collect a blob used this recently
+    BLOB_GC_INTERVAL     = int(os.getenv("BLOB_GC_INTERVAL",     "300"))
+
+    # ── Multi-worker deployment (see gunicorn.conf.py) ───────────────────
+    METRICS_DATABASE        = os.getenv("METRICS_DATABASE", "metrics.db")
+    METRICS_SHARE_INTERVAL  = float(os.getenv("METRICS_SHARE_INTERVAL",  "5"))   # s between snapshots; 0 = per worker
+    PRECONNECT_PER_PROVIDER = int(os.getenv("PRECONNECT_PER_PROVIDER",   "2"))   # connections a worker opens at start
+
+    # ── Profiling & admin API (see profiling.py) ─────────────────────────
+    ADMIN_TOKEN         = os.getenv("ADMIN_TOKEN", "")        # X-Admin-Token for /api/admin/*; empty = off
+    SERVER_TIMING       = os.getenv("SERVER_TIMING", "1") == "1"
+    PROFILE_FOLDER      = os.getenv("PROFILE_FOLDER", "profiles")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))      # fraction of API requests profiled
+    PROFILE_INTERVAL    = float(os.getenv("PROFILE_INTERVAL",    "0.005"))  # seconds between stack samples
+    PROFILE_KEEP        = int(os.getenv("PROFILE_KEEP",          "200"))    # newest profiles kept on disk
 
     # ── Flask config ─────────────────────────────────────────────────────
     SECRET_KEY          = os.getenv("SECRET_KEY", "change-this-in-production")
@@ -43,4 +170,14 @@ class Config:
     GMAIL_RECEIVER = os.getenv("GMAIL_RECEIVER",  "")
 
     # ── Resend API ───────────────────────────────────────────────────────
-    RESEND_API_KEY = os.getenv("RESEND_API_KEY", "")
\ No newline at end of file
+    RESEND_API_KEY = os.getenv("RESEND_API_KEY", "")
+    RESEND_API_URL   = os.getenv("RESEND_API_URL",   "https://api.resend.com/emails")
+    RESEND_BATCH_URL = os.getenv("RESEND_BATCH_URL", "https://api.resend.com/emails/batch")
+
+    # ── Email outbox (see outbox.py) ─────────────────────────────────────
+    OUTBOX_BATCH_SIZE        = int(os.getenv("OUTBOX_BATCH_SIZE",          "50"))      # ≤ 100 per Resend batch call
+    OUTBOX_RATE_PER_SECOND   = float(os.getenv("OUTBOX_RATE_PER_SECOND",   "2"))       # Resend's default API rate limit
+    OUTBOX_MAX_ATTEMPTS      = int(os.getenv("OUTBOX_MAX_ATTEMPTS",        "8"))
+    OUTBOX_RETRY_BACKOFF     = float(os.getenv("OUTBOX_RETRY_BACKOFF",     "5"))       # seconds, doubled per attempt
+    OUTBOX_DEDUPE_SECONDS    = int(os.getenv("OUTBOX_DEDUPE_SECONDS",      "3600"))
+    OUTBOX_RETENTION_SECONDS = int(os.getenv("OUTBOX_RETENTION_SECONDS",   "604800"))  # 7 days
\ No newline at end of file
@@ -0,0 +1,11 @@
+"""
+Run the tests from a scratch directory: the modules open their SQLite
+files (database.db, cache.db, limits.db, …) relative to the working
+directory as soon as they are imported.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+os.environ.setdefault("METRICS_SHARE_INTERVAL", "0")
+os.chdir(tempfile.mkdtemp(prefix="omnidetect-tests-"))
@@ -0,0 +1,110 @@
+"""
+Long-document text analysis helpers.
+
+The OpenRouter prompt only carries ~800 characters, so a long document is
+split into overlapping, sentence-aligned windows that each fit the prompt.
+A token budget decides how many windows go to OpenRouter (spread evenly over
+the document); the heuristic scores the rest.  Window scores are combined
+into one document score weighted by window length and confidence.
+"""
+import re
+
+from config import Config
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+def split_sentences(text):
+    """Sentences with their start offsets in `text`."""
+    sentences, start = [], 0
+    for match in _SENTENCE_RE.finditer(text):
+        if match.start() > start:
+            sentences.append((start, text[start:match.start()]))
+        start = match.end()
+    if start < len(text):
+        sentences.append((start, text[start:]))
+    return sentences
+
+
+def _hard_split(offset, sentence, size):
+    """Break a sentence longer than a window at word boundaries."""
+    while len(sentence) > size:
+        cut = sentence.rfind(" ", 0, size)
+        cut = cut if cut > 0 else size
+        yield offset, sentence[:cut]
+        rest     = sentence[cut:].lstrip()
+        offset  += len(sentence) - len(rest)
+        sentence = rest
+    if sentence:
+        yield offset, sentence
+
+
+def split_windows(text, size=None, overlap=None):
+    """
+    Overlapping windows of whole sentences, each at most `size` characters.
+    Consecutive windows share up to `overlap` characters of trailing sentences.
+    Returns [{"index", "start", "end", "text"}].
+    """
+    size    = Config.DOCUMENT_WINDOW_CHARS    if size    is None else size
+    overlap = Config.DOCUMENT_WINDOW_OVERLAP  if overlap is None else overlap
+
+    pieces = []
+    for offset, sentence in split_sentences(text):
+        pieces.extend(_hard_split(offset, sentence, size))
+
+    windows, current = [], []
+
+    def length(items):
+        return items[-1][0] + len(items[-1][1]) - items[0][0] if items else 0
+
+    def flush():
+        start, end = current[0][0], current[-1][0] + len(current[-1][1])
+        windows.append({"index": len(windows), "start": start, "end": end, "text": text[start:end]})
+
+    for piece in pieces:
+        if current and length(current + [piece]) > size:
+            flush()
+            # Carry trailing sentences over as context for the next window
+            carried = []
+            for prev in reversed(current):
+                if length([prev] + carried) > overlap or length([prev] + carried + [piece]) > size:
+                    break
+                carried.insert(0, prev)
+            current = carried
+        current.append(piece)
+    if current:
+        flush()
+    return windows
+
+
+def window_cost(window):
+    """Approximate OpenRouter tokens for one window (prompt + completion)."""
+    return len(window["text"]) // 4 + Config.DOCUMENT_PROMPT_OVERHEAD_TOKENS
+
+
+def select_for_provider(windows, token_budget):
+    """Indices of the windows to send to OpenRouter, spread evenly across the document."""
+    if not windows or token_budget <= 0:
+        return set()
+    # Sizing by the most expensive window guarantees the budget is never exceeded
+    affordable = min(len(windows), token_budget // max(window_cost(w) for w in windows))
+    if affordable == 0:
+        return set()
+    step = len(windows) / affordable
+    return {windows[int(i * step)]["index"] for i in range(affordable)}
+
+
+def combine(sections):
+    """Document-level score from per-window results (weighted by length × confidence)."""
+    total_weight = 0.0
+    score_sum    = 0.0
+    conf_sum     = 0.0
+    for s in sections:
+        weight = (s["end"] - s["start"]) * max(s["confidence"], 0.05)
+        total_weight += weight
+        score_sum    += weight * s["ai_score"]
+        conf_sum     += weight * s["confidence"]
+    if not total_weight:
+        return 0.5, 0.0
+    return score_sum / total_weight, conf_sum / total_weight
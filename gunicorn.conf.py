@@ -0,0 +1,26 @@
+"""
+gunicorn settings for the multi-worker deployment (the Procfile uses them).
+
+    gunicorn -c gunicorn.conf.py "app:create_app(preload=True)"
+
+preload_app: the master imports the app, creates the schema and warms the
+caches and the text lexicon once; workers are forked from it with all of
+that already in memory (shared copy-on-write), so adding a worker costs a
+fork rather than a full import.  post_fork starts each worker's own threads
+and provider connections, which cannot be inherited.
+"""
+import os
+import uuid
+
+# One id for this server start, inherited by every worker (see metrics.RUN_ID)
+os.environ["OMNIDETECT_RUN_ID"] = uuid.uuid4().hex
+
+bind        = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers     = int(os.getenv("WEB_CONCURRENCY", "2"))
+timeout     = 120
+preload_app = True
+
+
+def post_fork(server, worker):
+    import app
+    app.start_worker()
@@ -0,0 +1,180 @@
+"""
+Pooled, keep-alive HTTP clients for the outbound providers.
+
+One requests.Session per provider host, so TCP+TLS connections are reused
+across analyses instead of being set up on every call.  Each client applies
+(connect, read) timeouts and retries 429/5xx responses and connection errors
+with jittered exponential backoff (honouring Retry-After).
+
+Sockets cannot be shared across a fork, so a forked child drops the pools
+it inherited and preconnect() opens a few connections per provider in each
+worker before its first request needs them.
+"""
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from metrics import provider_requests, provider_latency
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ProviderClient:
+    def __init__(self, name, pool_size, read_timeout,
+                 connect_timeout=None, retries=None, backoff=None, backoff_max=None):
+        self.name            = name
+        self.pool_size       = pool_size
+        self.read_timeout    = read_timeout
+        self.connect_timeout = Config.HTTP_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+        self.retries         = Config.HTTP_RETRIES         if retries is None else retries
+        self.backoff         = Config.HTTP_BACKOFF         if backoff is None else backoff
+        self.backoff_max     = Config.HTTP_BACKOFF_MAX     if backoff_max is None else backoff_max
+
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://",  self.adapter)
+
+        self._lock     = threading.Lock()
+        self.in_flight = 0
+        self.calls     = 0
+        self.retried   = 0
+        self.failures  = 0
+
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = min(self.backoff_max, self.backoff * (2 ** attempt))
+        delay *= random.uniform(0.5, 1.5)                 # jitter: avoid synchronized retries
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, min(self.backoff_max, int(retry_after)))
+        time.sleep(delay)
+
+    def request(self, method, url, **kwargs):
+        """Like requests.request(); a streamed `data` body must be seekable so retries can rewind it."""
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        with self._lock:
+            self.in_flight += 1
+            self.calls     += 1
+        try:
+            attempt = 0
+            while True:
+                if attempt and hasattr(kwargs.get("data"), "seek"):
+                    kwargs["data"].seek(0)
+                started = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.RequestException as e:
+                    provider_latency.observe(time.perf_counter() - started, self.name)
+                    provider_requests.inc(self.name, "error")
+                    if not isinstance(e, requests.ConnectionError) or attempt >= self.retries:
+                        raise
+                    self._sleep_before_retry(attempt)
+                else:
+                    provider_latency.observe(time.perf_counter() - started, self.name)
+                    provider_requests.inc(self.name, str(response.status_code))
+                    if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                        return response
+                    response.close()
+                    self._sleep_before_retry(attempt, response)
+                attempt += 1
+                with self._lock:
+                    self.retried += 1
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def preconnect(self, url, count):
+        """Open up to `count` idle connections to `url`'s host; returns how many were opened."""
+        pool = self.adapter.get_connection_with_tls_context(
+            requests.Request("POST", url).prepare(), verify=True)
+        conns = []
+        try:
+            for _ in range(min(count, self.pool_size)):
+                conns.append(pool._get_conn())      # taken out so each loop gets a different one
+                if conns[-1].sock is None:
+                    conns[-1].timeout = self.connect_timeout
+                    conns[-1].connect()
+        finally:
+            for conn in conns:
+                pool._put_conn(conn)
+        return sum(1 for conn in conns if conn.sock is not None)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def stats(self):
+        idle = opened = requests_sent = 0
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            idle          += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+            opened        += pool.num_connections
+            requests_sent += pool.num_requests
+        with self._lock:
+            return {
+                "pool_size":         self.pool_size,
+                "in_flight":         self.in_flight,
+                "idle_connections":  idle,
+                "connections_made":  opened,
+                "requests":          requests_sent,
+                "reuse_ratio":       round(1 - opened / requests_sent, 4) if requests_sent else 0.0,
+                "calls":             self.calls,
+                "retries":           self.retried,
+                "failures":          self.failures
+            }
+
+
+clients = {
+    "sightengine": ProviderClient("sightengine", Config.SIGHTENGINE_CONCURRENCY, Config.SIGHTENGINE_READ_TIMEOUT),
+    "huggingface": ProviderClient("huggingface", Config.HUGGINGFACE_CONCURRENCY, Config.HUGGINGFACE_READ_TIMEOUT),
+    "openrouter":  ProviderClient("openrouter",  Config.OPENROUTER_CONCURRENCY,  Config.OPENROUTER_READ_TIMEOUT),
+    "resend":      ProviderClient("resend",      Config.RESEND_CONCURRENCY,      Config.RESEND_READ_TIMEOUT),
+}
+
+
+def pool_stats():
+    return {name: client.stats() for name, client in clients.items()}
+
+
+def preconnect(count=2):
+    """Warm the pools of the providers that have credentials configured (best effort)."""
+    targets = {
+        "sightengine": (Config.SIGHTENGINE_API_USER, Config.SIGHTENGINE_API_URL),
+        "huggingface": (Config.HUGGINGFACE_API_KEY,  Config.HUGGINGFACE_API_URL),
+        "openrouter":  (Config.OPENROUTER_API_KEY,   Config.OPENROUTER_API_URL),
+        "resend":      (Config.RESEND_API_KEY,       Config.RESEND_API_URL),
+    }
+    opened = {}
+    for name, (credential, url) in targets.items():
+        if not credential or count <= 0:
+            continue
+        try:
+            opened[name] = clients[name].preconnect(url, count)
+        except Exception as e:
+            print(f"[WARN] Could not preconnect to {name}: {e}")
+    return opened
+
+
+def _forget_pools():
+    # The parent's sockets (and the pool locks, possibly held) must not be used by the child
+    for client in clients.values():
+        adapter = client.adapter
+        adapter.init_poolmanager(adapter._pool_connections, adapter._pool_maxsize, block=adapter._pool_block)
+
+
+os.register_at_fork(after_in_child=_forget_pools)
@@ -0,0 +1,262 @@
+"""
+SQLite-backed job queue for asynchronous analyses.
+
+Endpoints enqueue a job and return its ID at once; a pool of local worker
+threads claims queued jobs, runs the registered handler and stores the
+result.  Transient failures (handler status >= 500) are retried with
+exponential backoff.  Finished jobs are kept for JOB_RETENTION_SECONDS.
+
+A running job holds a `lease`: a heartbeat thread renews updated_at every
+lease/3 seconds for the jobs this process is running, so a long job (a big
+report) is never taken for dead.  A job whose lease lapsed — its process
+died — is claimed again, or failed once it has used its `max_attempts`, so a
+job that crashes its worker does not loop forever.
+
+Handlers take (payload bytes, params dict) and return (body, status) — the
+same shape the synchronous endpoints produce.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import Config
+from storage import ConnectionLocal, connect
+
+
+TERMINAL = ("succeeded", "failed")
+
+
+class JobQueue:
+    def __init__(self, path, workers=4, max_attempts=3, backoff=2.0,
+                 retention=86400, lease=300, poll_interval=0.5):
+        self.path          = path
+        self.workers       = workers
+        self.max_attempts  = max_attempts
+        self.backoff       = backoff
+        self.retention     = retention
+        self.lease         = lease
+        self.poll_interval = poll_interval
+
+        self.handlers  = {}
+        self._local    = ConnectionLocal()
+        self._changed  = threading.Condition()
+        self._threads  = []
+        self._stopping = False
+        self._last_gc  = 0.0
+        self._running  = set()                  # ids of the jobs this process is running
+        self._running_lock = threading.Lock()
+        self._stopped  = threading.Event()      # wakes the heartbeat on stop()
+
+        self._init_table()
+
+    # ── Storage ──────────────────────────────────────────────────────────
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, timeout=10, isolation_level=None, row_factory=sqlite3.Row)
+            self._local.conn = conn
+        return conn
+
+    def _init_table(self):
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id           TEXT PRIMARY KEY,
+                kind         TEXT NOT NULL,
+                status       TEXT NOT NULL,
+                payload      BLOB,
+                params       TEXT,
+                result       TEXT,
+                error        TEXT,
+                attempts     INTEGER DEFAULT 0,
+                run_after    REAL NOT NULL,
+                created_at   REAL NOT NULL,
+                updated_at   REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at)')
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    # ── Producer side ────────────────────────────────────────────────────
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def submit(self, kind, params=None, payload=None):
+        job_id = uuid.uuid4().hex
+        now    = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, status, payload, params, run_after, created_at, updated_at) "
+            "VALUES (?,?,?,?,?,?,?,?)",
+            (job_id, kind, "queued", payload, json.dumps(params or {}), now, now, now)
+        )
+        self._notify()
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, kind, status, result, error, attempts, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def wait_for_change(self, timeout):
+        """Block until a local job changes state (or timeout); used by SSE streams."""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def stats(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"workers": self.workers if self._threads else 0, **{status: count for status, count in rows}}
+
+    # ── Worker side ──────────────────────────────────────────────────────
+    def _claim(self):
+        conn = self._conn()
+        now  = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 'running' past its lease: its worker died.  Out of attempts → failed, not re-run
+            abandoned = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, updated_at = ? "
+                "WHERE status = 'running' AND updated_at < ? AND attempts >= ?",
+                (f"Worker lost during the job ({self.max_attempts} attempts)", now, now - self.lease,
+                 self.max_attempts)
+            ).rowcount
+            row = conn.execute(
+                "SELECT id, kind, payload, params, attempts FROM jobs "
+                "WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND updated_at < ?) "
+                "ORDER BY run_after LIMIT 1",
+                (now, now - self.lease)     # 'running' past its lease: its worker died
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (now, row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if abandoned:
+            self._notify()
+        return row
+
+    def _heartbeat(self):
+        """Renew the lease of every job this process is running."""
+        while not self._stopped.wait(self.lease / 3):
+            with self._running_lock:
+                ids = list(self._running)
+            if not ids:
+                continue
+            try:
+                self._conn().execute(
+                    f"UPDATE jobs SET updated_at = ? WHERE status = 'running' AND id IN ({','.join('?' * len(ids))})",
+                    (time.time(), *ids)
+                )
+            except sqlite3.Error as e:
+                print(f"[WARN] Job heartbeat: {e}")
+
+    def _finish(self, job_id, status, result=None, error=None, run_after=None):
+        now = time.time()
+        if status == "queued":
+            self._conn().execute(
+                "UPDATE jobs SET status = 'queued', error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                (error, run_after, now, job_id)
+            )
+        else:
+            # Drop the upload once the job is done; only the verdict is retained
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, now, job_id)
+            )
+        self._notify()
+
+    def _run(self, row):
+        handler = self.handlers.get(row["kind"])
+        if handler is None:
+            self._finish(row["id"], "failed", error=f"Unknown job kind: {row['kind']}")
+            return
+
+        try:
+            body, status = handler(row["payload"], json.loads(row["params"] or "{}"))
+        except Exception as e:
+            body, status = {"success": False, "error": str(e)}, 500
+
+        if body.get("success"):
+            self._finish(row["id"], "succeeded", result=body.get("data"))
+        elif status >= 500 and row["attempts"] + 1 < self.max_attempts:
+            delay = self.backoff * (2 ** row["attempts"])
+            print(f"[WARN] Job {row['id']} attempt {row['attempts'] + 1} failed: {body.get('error')} — retrying in {delay:.1f}s")
+            self._finish(row["id"], "queued", error=body.get("error"), run_after=time.time() + delay)
+        else:
+            self._finish(row["id"], "failed", error=body.get("error"))
+
+    def _gc(self):
+        now = time.time()
+        if now - self._last_gc < 60:
+            return
+        self._last_gc = now
+        self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+            (now - self.retention,)
+        )
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                self._gc()
+                row = self._claim()
+            except sqlite3.Error as e:
+                print(f"[WARN] Job queue: {e}")
+                row = None
+
+            if row is None:
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+            with self._running_lock:
+                self._running.add(row["id"])
+            try:
+                self._run(row)
+            finally:
+                with self._running_lock:
+                    self._running.discard(row["id"])
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping = False
+        self._stopped.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self):
+        self._stopping = True
+        self._stopped.set()
+        self._notify()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+
+
+job_queue = JobQueue(
+    Config.JOBS_DATABASE,
+    workers       = Config.JOB_WORKERS,
+    max_attempts  = Config.JOB_MAX_ATTEMPTS,
+    backoff       = Config.JOB_RETRY_BACKOFF,
+    retention     = Config.JOB_RETENTION_SECONDS
+)
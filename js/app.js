@@ -403,13 +403,17 @@ function updateCharCount() {
 // ─────────────────────────────────────────────
 let allHistory    = [];
 let currentFilter = 'all';
+let historyETag   = null;   // revalidate instead of re-downloading an unchanged history
 
 async function loadHistory() {
   try {
-    const res  = await fetch(`${API_BASE}/history`, { signal: AbortSignal.timeout(5000) });
+    const headers = historyETag ? { 'If-None-Match': historyETag } : {};
+    const res     = await fetch(`${API_BASE}/history`, { headers, cache: 'no-store', signal: AbortSignal.timeout(5000) });
+    if (res.status === 304) return;          // nothing changed since the last load
     const data = await res.json();
     if (data.success) {
-      allHistory = data.history;
+      historyETag = res.headers.get('ETag');
+      allHistory  = data.history;
       renderHistory();
       loadStats();
       return;
@@ -0,0 +1,281 @@
+"""
+Admission control shared by every worker process.
+
+Each client has a token bucket (refilled at `rate` tokens/s up to `burst`);
+an analysis spends one token per item or is answered 429 with Retry-After.
+Each provider has a cap on calls in flight across all workers; a caller
+waits for a free slot in a bounded FIFO queue and is turned away with
+Overloaded when the queue is full or the wait exceeds `max_wait`, rather
+than holding a worker until the gunicorn timeout.
+
+The state lives in one small SQLite file so the limits apply to the whole
+server, not to each process.  It is disposable: rows left by a crashed
+worker expire after `lease` seconds, and the file is not fsynced.
+"""
+import asyncio
+import math
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from config import Config
+from metrics import provider_queue_wait, provider_shed
+from storage import ConnectionLocal, connect
+
+
+class Overloaded(Exception):
+    """A provider slot could not be had in time; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Limits:
+    def __init__(self, path, rate=2.0, burst=60, capacity=None, queue_size=32,
+                 max_wait=5.0, lease=120, poll_interval=0.05):
+        self.path          = path
+        self.rate          = rate                  # tokens per second; 0 = no rate limit
+        self.burst         = burst
+        self.capacity      = dict(capacity or {})  # provider → calls in flight, all workers
+        self.queue_size    = queue_size
+        self.max_wait      = max_wait
+        self.lease         = lease
+        self.poll_interval = poll_interval
+
+        self._local    = ConnectionLocal()
+        self._released = threading.Condition()     # wakes this process's waiters at once
+        self._hold     = {}                        # provider → EWMA of slot hold time, seconds
+        self._last_gc  = 0.0
+
+        self._lock   = threading.Lock()
+        self.limited = 0
+        self.shed    = 0
+
+        self._init_tables()
+
+    # ── Storage ──────────────────────────────────────────────────────────
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous = OFF")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _init_tables(self):
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS buckets (
+                client      TEXT PRIMARY KEY,
+                tokens      REAL NOT NULL,
+                updated_at  REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS slots (
+                id          TEXT PRIMARY KEY,
+                provider    TEXT NOT NULL,
+                state       TEXT NOT NULL,
+                queued_at   REAL NOT NULL,
+                expires_at  REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_slots_provider ON slots (provider, state, queued_at)')
+
+    def _gc(self, now):
+        if now - self._last_gc < 60:
+            return
+        self._last_gc = now
+        # A bucket untouched for burst/rate seconds is full again — same as no row
+        idle = self.burst / self.rate if self.rate > 0 else 0
+        self._conn().execute("DELETE FROM buckets WHERE updated_at < ?", (now - idle,))
+        self._conn().execute("DELETE FROM slots WHERE expires_at < ?", (now,))
+
+    # ── Per-client rate limit ────────────────────────────────────────────
+    def take(self, client, cost=1, paid=0):
+        """Spend `cost` tokens of the client's bucket, on top of `paid` the same request already
+        spent.  Returns 0 when allowed, else seconds to wait."""
+        if self.rate <= 0:
+            return 0.0
+        now  = time.time()
+        need = min(cost, self.burst - paid)    # a batch bigger than the burst runs, then pays it off
+        with self._transaction() as conn:
+            row    = conn.execute("SELECT tokens, updated_at FROM buckets WHERE client = ?", (client,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            wait   = 0.0
+            if tokens >= need:
+                tokens -= cost
+            else:
+                wait = (need - tokens) / self.rate
+            conn.execute("INSERT OR REPLACE INTO buckets (client, tokens, updated_at) VALUES (?,?,?)",
+                         (client, tokens, now))
+        self._gc(now)
+        if wait:
+            with self._lock:
+                self.limited += 1
+        return wait
+
+    # ── Provider slots ───────────────────────────────────────────────────
+    def _counts(self, conn, provider, now, queued_at=None, slot_id=""):
+        """(slots held, callers queued ahead of `queued_at` — all of them when None)."""
+        held = conn.execute(
+            "SELECT COUNT(*) FROM slots WHERE provider = ? AND state = 'held' AND expires_at >= ?",
+            (provider, now)
+        ).fetchone()[0]
+        if queued_at is None:
+            queued_at, slot_id = float("inf"), ""
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM slots WHERE provider = ? AND state = 'waiting' AND expires_at >= ? "
+            "AND (queued_at < ? OR (queued_at = ? AND id < ?))",
+            (provider, now, queued_at, queued_at, slot_id)
+        ).fetchone()[0]
+        return held, ahead
+
+    def retry_after(self, provider, queued):
+        """Rough seconds until `queued` callers ahead have been served."""
+        hold = self._hold.get(provider, 1.0)
+        return max(1, math.ceil(hold * (queued + 1) / max(1, self.capacity.get(provider, 1))))
+
+    def _refuse(self, provider, reason, queued):
+        provider_shed.inc(provider, reason)
+        with self._lock:
+            self.shed += 1
+        limit = self.capacity[provider]
+        return Overloaded(f"{provider} is at capacity ({limit} in flight, {queued} waiting)",
+                          self.retry_after(provider, queued))
+
+    def enter(self, provider):
+        """Take a slot or join the queue.  Returns (ticket, granted); raises Overloaded when the queue is full."""
+        now     = time.time()
+        slot_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            held, queued = self._counts(conn, provider, now)
+            if held < self.capacity[provider] and queued == 0:
+                state, expires = "held", now + self.lease
+            elif queued >= self.queue_size:
+                raise self._refuse(provider, "queue_full", queued)
+            else:
+                state, expires = "waiting", now + self.max_wait + 1     # a live waiter gives up by then
+            conn.execute("INSERT INTO slots (id, provider, state, queued_at, expires_at) VALUES (?,?,?,?,?)",
+                         (slot_id, provider, state, now, expires))
+        return (provider, slot_id, now), state == "held"
+
+    def poll(self, ticket):
+        """Promote a queued ticket to a slot when one is free for it; returns True once held."""
+        provider, slot_id, queued_at = ticket
+        limit = self.capacity[provider]
+        now   = time.time()
+        held, ahead = self._counts(self._conn(), provider, now, queued_at, slot_id)
+        if held + ahead >= limit:               # cheap WAL read first; write only when it looks free
+            return False
+        with self._transaction() as conn:
+            held, ahead = self._counts(conn, provider, now, queued_at, slot_id)
+            if held + ahead >= limit:
+                return False
+            conn.execute("UPDATE slots SET state = 'held', expires_at = ? WHERE id = ?",
+                         (now + self.lease, slot_id))
+        return True
+
+    def leave(self, ticket, held_for=None):
+        provider, slot_id, _ = ticket
+        self._conn().execute("DELETE FROM slots WHERE id = ?", (slot_id,))
+        if held_for is not None:
+            previous = self._hold.get(provider)
+            self._hold[provider] = held_for if previous is None else 0.2 * held_for + 0.8 * previous
+        with self._released:
+            self._released.notify_all()
+
+    def _timed_out(self, ticket):
+        provider, _, queued_at = ticket
+        _, ahead = self._counts(self._conn(), provider, time.time(), queued_at, ticket[1])
+        return self._refuse(provider, "timeout", ahead)
+
+    @contextmanager
+    def slot(self, provider):
+        """Hold one of `provider`'s slots for the duration of the block."""
+        if provider not in self.capacity:
+            yield
+            return
+        started = time.monotonic()
+        ticket, granted = self.enter(provider)
+        try:
+            while not granted:
+                remaining = started + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(ticket)
+                with self._released:
+                    self._released.wait(min(self.poll_interval, remaining))
+                granted = self.poll(ticket)
+            acquired = time.monotonic()
+            provider_queue_wait.observe(acquired - started, provider)
+            yield
+        finally:
+            self.leave(ticket, time.monotonic() - acquired if granted else None)
+
+    @asynccontextmanager
+    async def slot_async(self, provider):
+        """slot() for coroutines: the SQLite steps run in the default executor, waits on the loop."""
+        if provider not in self.capacity:
+            yield
+            return
+        loop    = asyncio.get_running_loop()
+        started = time.monotonic()
+        ticket, granted = await loop.run_in_executor(None, self.enter, provider)
+        try:
+            while not granted:
+                remaining = started + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    raise await loop.run_in_executor(None, self._timed_out, ticket)
+                await asyncio.sleep(min(self.poll_interval, remaining))
+                granted = await loop.run_in_executor(None, self.poll, ticket)
+            acquired = time.monotonic()
+            provider_queue_wait.observe(acquired - started, provider)
+            yield
+        finally:
+            held_for = time.monotonic() - acquired if granted else None
+            await loop.run_in_executor(None, self.leave, ticket, held_for)
+
+    def stats(self):
+        conn, now = self._conn(), time.time()
+        providers = {}
+        for provider, limit in self.capacity.items():
+            held, queued = self._counts(conn, provider, now)
+            providers[provider] = {"limit": limit, "in_flight": held, "queued": queued}
+        with self._lock:
+            limited, shed = self.limited, self.shed
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst":           self.burst,
+            "queue_size":      self.queue_size,
+            "max_wait_s":      self.max_wait,
+            "rate_limited":    limited,
+            "shed":            shed,
+            "providers":       providers
+        }
+
+
+limits = Limits(
+    Config.LIMITS_DATABASE,
+    rate       = Config.RATE_LIMIT_PER_MINUTE / 60,
+    burst      = Config.RATE_LIMIT_BURST,
+    capacity   = {
+        "sightengine": Config.SIGHTENGINE_CONCURRENCY,
+        "huggingface": Config.HUGGINGFACE_CONCURRENCY,
+        "openrouter":  Config.OPENROUTER_CONCURRENCY,
+    },
+    queue_size = Config.PROVIDER_QUEUE_SIZE,
+    max_wait   = Config.PROVIDER_QUEUE_TIMEOUT
+)
@@ -0,0 +1,193 @@
+"""
+Frame sampling for animated images and short video clips.
+
+frames() decodes one frame at a time, downscaled to `size` pixels on the
+long side: Pillow for GIF / APNG / animated WebP (any still image is a
+one-frame clip), an `ffmpeg` subprocess, when one is installed, for MP4,
+WebM, MOV and the like.  A clip is never held in memory whole.
+
+FrameSampler picks frames as they arrive: the first one, a scene change
+(dHash moved `scene_distance` bits or more from the previous frame), or
+`stride` seconds after the last pick.  A pick within `dedup_distance` bits
+of a frame already kept is dropped and its screen time is credited to that
+frame.  When more than `max_frames` are kept, every other one is merged into
+its predecessor and the stride doubles, so a long clip stays evenly covered.
+
+combine() weights each frame's score by the screen time it stands for.
+"""
+import io
+import shutil
+import subprocess
+import tempfile
+
+from PIL import Image, ImageSequence, UnidentifiedImageError
+
+from config import Config
+from phash import dhash, hamming
+
+
+CHUNK = 256 * 1024
+
+
+class UnsupportedMedia(ValueError):
+    pass
+
+
+# ── Decoding ─────────────────────────────────────────────────────────────
+def _pillow_frames(fp, size, max_seconds):
+    with Image.open(fp) as img:
+        t = 0.0
+        for frame in ImageSequence.Iterator(img):
+            duration = (frame.info.get("duration") or 100) / 1000     # ms; GIFs without one play at ~10 fps
+            try:
+                image = frame.convert("RGB")
+            except OSError as e:
+                if t == 0:
+                    raise UnsupportedMedia(f"Could not decode image: {e}")
+                return                          # truncated: score the frames that did decode
+            image.thumbnail((size, size))
+            yield t, duration, image
+            t += duration
+            if t >= max_seconds:
+                return
+
+
+def _read_ppm(stream):
+    """One binary PPM (P6) image from `stream`, or None at end of stream."""
+    header = []
+    while len(header) < 4:
+        line = stream.readline()
+        if not line:
+            return None
+        header += line.split(b"#", 1)[0].split()
+    if header[0] != b"P6":
+        raise UnsupportedMedia("ffmpeg produced an unexpected frame format")
+    width, height = int(header[1]), int(header[2])
+    data = stream.read(width * height * 3)
+    if len(data) < width * height * 3:
+        return None
+    return Image.frombytes("RGB", (width, height), data)
+
+
+def _ffmpeg_frames(path, size, max_seconds, fps):
+    cmd = [Config.FFMPEG_BINARY, "-v", "error", "-nostdin", "-t", str(max_seconds), "-i", path,
+           "-an", "-vf", f"fps={fps},scale={size}:{size}:force_original_aspect_ratio=decrease",
+           "-f", "image2pipe", "-c:v", "ppm", "-"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        index = 0
+        while (image := _read_ppm(proc.stdout)) is not None:
+            yield index / fps, 1 / fps, image
+            index += 1
+        if proc.wait() != 0 and index == 0:
+            raise UnsupportedMedia(f"Could not decode video: {proc.stderr.read(500).decode(errors='replace').strip()}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.stderr.close()
+        proc.wait()
+
+
+def frames(upload, size=None, max_seconds=None, fps=None):
+    """Yield (t, duration, RGB image) for each decoded frame of an UploadSpool, in order."""
+    size        = size or Config.MEDIA_FRAME_SIZE
+    max_seconds = max_seconds or Config.MEDIA_MAX_SECONDS
+    try:
+        with upload.reader() as reader:
+            yield from _pillow_frames(reader, size, max_seconds)
+        return
+    except UnidentifiedImageError:
+        pass
+
+    if not shutil.which(Config.FFMPEG_BINARY):
+        raise UnsupportedMedia("Unsupported media type (video needs ffmpeg on the server)")
+    # Containers such as MP4 may keep their index at the end, so ffmpeg gets a seekable file
+    with tempfile.NamedTemporaryFile(suffix=".media") as tmp:
+        with upload.reader() as reader:
+            shutil.copyfileobj(reader, tmp, CHUNK)
+        tmp.flush()
+        yield from _ffmpeg_frames(tmp.name, size, max_seconds, fps or Config.MEDIA_DECODE_FPS)
+
+
+# ── Sampling ─────────────────────────────────────────────────────────────
+def encode_frame(image, quality=90):
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+class FrameSampler:
+    def __init__(self, stride=None, scene_distance=None, dedup_distance=None, max_frames=None):
+        self.stride         = stride or Config.MEDIA_STRIDE_SECONDS
+        self.scene_distance = scene_distance or Config.MEDIA_SCENE_DISTANCE
+        self.dedup_distance = Config.MEDIA_DEDUP_DISTANCE if dedup_distance is None else dedup_distance
+        self.max_frames     = max_frames or Config.MEDIA_MAX_FRAMES
+
+        self.kept     = []                      # samples in time order
+        self.decoded  = 0
+        self.skipped  = 0                       # picks dropped as near-duplicates
+        self.duration = 0.0
+        self._owner   = None                    # sample the current frames are credited to
+        self._prev    = None                    # dHash of the previous decoded frame
+        self._last_t  = None                    # time of the last pick
+
+    def feed(self, t, duration, image):
+        value   = dhash(image)
+        reason  = None
+        if self._prev is None:
+            reason = "first"
+        elif hamming(value, self._prev) >= self.scene_distance:
+            reason = "scene"
+        elif t - self._last_t >= self.stride:
+            reason = "stride"
+        self._prev     = value
+        self.decoded  += 1
+        self.duration  = t + duration
+
+        if reason is not None:
+            self._last_t = t
+            match = min(self.kept, key=lambda s: hamming(value, s["phash"]), default=None)
+            if match is not None and hamming(value, match["phash"]) <= self.dedup_distance:
+                self._owner   = match
+                self.skipped += 1
+            else:
+                self._owner = {"t": round(t, 3), "span": 0.0, "phash": value, "reason": reason,
+                               "data": encode_frame(image)}
+                self.kept.append(self._owner)
+                if len(self.kept) > self.max_frames:
+                    self._thin()
+        self._owner["span"] += duration
+
+    def _thin(self):
+        kept = self.kept[::2]
+        for dropped, into in zip(self.kept[1::2], kept):
+            into["span"] += dropped["span"]
+            if self._owner is dropped:
+                self._owner = into
+        self.kept    = kept
+        self.stride *= 2
+
+    def samples(self):
+        for index, sample in enumerate(self.kept):
+            sample["index"] = index
+            sample["span"]  = round(sample["span"], 3)
+        return self.kept
+
+
+def spread(items, limit):
+    """Up to `limit` of `items`, evenly spaced (all of them when they fit)."""
+    if limit <= 0:
+        return []
+    if len(items) <= limit:
+        return list(items)
+    step = len(items) / limit
+    return [items[int(i * step)] for i in range(limit)]
+
+
+def combine(frames):
+    """(clip score, peak) from scored frames ({ai_score, weight}): the weighted mean and the highest score."""
+    total = sum(f["weight"] for f in frames)
+    if not total:
+        return 0.5, 0.5
+    return sum(f["ai_score"] * f["weight"] for f in frames) / total, max(f["ai_score"] for f in frames)
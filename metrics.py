@@ -0,0 +1,348 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are plain Python objects guarded by one lock each;
+observe()/inc() is a dict lookup plus a bisect, cheap enough to wrap every
+request, provider call and SQLite statement.  /api/metrics renders the
+registry.
+
+With several gunicorn workers, SharedMetrics makes /api/metrics answer for
+the whole server: every process publishes a snapshot of its registry to one
+SQLite file every few seconds, and render() merges the other processes'
+latest snapshots into its own live values — counters and histograms are
+summed, a gauge comes from the most recent snapshot.  Snapshots carry the
+run id (RUN_ID, shared by every process of one server start through the
+environment) and the process's start time: those of exited workers of this
+run are kept (what they counted still happened); those of another run are
+deleted once that exact process is gone, so a recycled pid (pid 1 in a
+container, the same shell under `flask run`) never revives them.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from config import Config
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS      = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+SIZE_BUCKETS    = tuple(1024 * 4 ** i for i in range(8))        # 1 KB … 16 MB
+DELIVERY_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry      = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name   = name
+        self.help   = help
+        self.labels = tuple(labels)
+        self._lock  = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def merge(into, label_values, value):
+        into[label_values] = into.get(label_values, 0) + value
+
+    def render(self, values=None):
+        items = sorted((self.snapshot() if values is None else values).items())
+        for values, total in items:
+            yield f"{self.name}{_labels(self.labels, values)} {_number(total)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    @staticmethod
+    def merge(into, label_values, value):
+        into[label_values] = value              # snapshots are merged oldest first
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name    = name
+        self.help    = help
+        self.labels  = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock   = threading.Lock()
+        self._series = {}                       # label values → [bucket counts…, +Inf count, sum]
+        with _registry_lock:
+            _registry.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1]    += value
+
+    def snapshot(self):
+        with self._lock:
+            return {k: list(v) for k, v in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def merge(into, label_values, series):
+        current = into.get(label_values)
+        into[label_values] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, values=None):
+        items = sorted((self.snapshot() if values is None else values).items())
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, values)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {cumulative}"
+
+
+def render():
+    """The whole registry as Prometheus text — for every worker when sharing is on."""
+    with _registry_lock:
+        metrics = list(_registry)
+    others = shared.collect() if shared.enabled else []
+    lines  = []
+    for metric in metrics:
+        values = {}
+        for snapshot in others:
+            for label_values, value in snapshot.get(metric.name, ()):
+                metric.merge(values, tuple(label_values), value)
+        for label_values, value in metric.snapshot().items():
+            metric.merge(values, label_values, value)
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render(values))
+    return "\n".join(lines) + "\n"
+
+
+# ── Sharing across worker processes ─────────────────────────────────────
+# Set before the first import in the server's first process (gunicorn.conf.py
+# does it in the master); every worker forked or spawned from it inherits it.
+RUN_ID = os.environ.setdefault("OMNIDETECT_RUN_ID", uuid.uuid4().hex)
+
+
+def _started(pid):
+    """Start time of `pid` in clock ticks since boot (Linux), or None."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _alive(pid, started):
+    """Is the process that wrote a snapshot (`pid` started at `started`) still running?"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    current = _started(pid)
+    return current is None or started is None or current == started
+
+
+_STARTED = _started(os.getpid())
+
+
+class SharedMetrics:
+    def __init__(self, path, interval=5.0):
+        self.path     = path
+        self.interval = interval                # seconds between snapshots; 0 = per-process metrics
+        self._thread  = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def _connect(self):
+        # Opened per use: a few statements every `interval`, and nothing to carry across a fork
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")      # disposable, like limits.db
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                pid         INTEGER PRIMARY KEY,
+                run         TEXT NOT NULL,
+                started     INTEGER,
+                updated_at  REAL NOT NULL,
+                data        TEXT NOT NULL
+            )
+        ''')
+        return conn
+
+    def publish(self):
+        with _registry_lock:
+            metrics = list(_registry)
+        data = json.dumps({m.name: [[list(k), v] for k, v in m.snapshot().items()] for m in metrics})
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO snapshots (pid, run, started, updated_at, data) VALUES (?,?,?,?,?)",
+                         (os.getpid(), RUN_ID, _STARTED, time.time(), data))
+        finally:
+            conn.close()
+
+    def collect(self):
+        """The other processes' snapshots, oldest first."""
+        pid, snapshots = os.getpid(), []
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT pid, run, started, data FROM snapshots WHERE pid != ? ORDER BY updated_at", (pid,)
+                ).fetchall()
+                # Another run's row counts only while its process lives: a sibling
+                # worker that was started without the shared RUN_ID
+                stale = {p for p, run, started, _ in rows if run != RUN_ID and not _alive(p, started)}
+                if stale:
+                    conn.executemany("DELETE FROM snapshots WHERE pid = ?", [(p,) for p in stale])
+                snapshots = [json.loads(data) for p, _, _, data in rows if p not in stale]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[WARN] Shared metrics read failed: {e}")
+        return snapshots
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.publish()
+            except sqlite3.Error as e:
+                print(f"[WARN] Shared metrics publish failed: {e}")
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        try:
+            self.publish()                      # replace a snapshot an earlier run left under this pid
+        except sqlite3.Error as e:
+            print(f"[WARN] Shared metrics publish failed: {e}")
+        self._thread = threading.Thread(target=self._run, name="metrics-publisher", daemon=True)
+        self._thread.start()
+
+
+def _reset_in_child():
+    # A forked worker starts from zero, else the master's counts would be reported once per worker
+    global _STARTED
+    for metric in list(_registry):
+        metric.reset()
+    shared._thread = None
+    _STARTED = _started(os.getpid())
+
+
+shared = SharedMetrics(Config.METRICS_DATABASE, interval=Config.METRICS_SHARE_INTERVAL)
+os.register_at_fork(after_in_child=_reset_in_child)
+
+
+# ── Metrics used across the app ─────────────────────────────────────────
+http_requests = Counter(
+    "omnidetect_http_requests_total", "HTTP requests handled, by route, method and status",
+    ("route", "method", "status"))
+http_latency = Histogram(
+    "omnidetect_http_request_duration_seconds", "Time to produce the response, by route",
+    ("route", "method"))
+
+provider_requests = Counter(
+    "omnidetect_provider_requests_total", "Outbound provider HTTP attempts, by status code (or 'error')",
+    ("provider", "status"))
+provider_latency = Histogram(
+    "omnidetect_provider_request_duration_seconds", "Outbound provider HTTP attempt latency",
+    ("provider",))
+provider_fallbacks = Counter(
+    "omnidetect_provider_fallbacks_total", "Answers that had to come from a later tier than the first choice",
+    ("from", "to"))
+provider_hedges = Counter(
+    "omnidetect_provider_hedges_total", "Hedged requests started because a provider was slow",
+    ("from", "to"))
+
+provider_queue_wait = Histogram(
+    "omnidetect_provider_queue_wait_seconds", "Time a provider call waited for one of the provider's slots",
+    ("provider",))
+provider_shed = Counter(
+    "omnidetect_provider_shed_total", "Provider calls refused because the wait queue was full or the wait timed out",
+    ("provider", "reason"))
+rate_limited = Counter(
+    "omnidetect_rate_limited_total", "Requests rejected by the client's rate limit, by route",
+    ("route",))
+
+db_latency = Histogram(
+    "omnidetect_db_query_duration_seconds", "SQLite statement execution time, by database and statement",
+    ("db", "op"), buckets=DB_BUCKETS)
+
+email_delivery = Histogram(
+    "omnidetect_email_delivery_seconds", "Time from enqueue to accepted by Resend",
+    ("kind",), buckets=DELIVERY_BUCKETS)
+outbox_depth = Gauge(
+    "omnidetect_outbox_depth", "Emails waiting in the outbox (queued or being sent)")
+
+blob_store_bytes = Gauge(
+    "omnidetect_blob_store_bytes", "Bytes held by the upload blob store (as of the last collection)")
+blob_reclaimed_bytes = Counter(
+    "omnidetect_blob_reclaimed_bytes_total", "Bytes freed by the blob collector, by reason",
+    ("reason",))
+
+media_frames = Counter(
+    "omnidetect_media_frames_total", "Clip frames by what became of them (decoded, deduplicated, cached, provider, unscored)",
+    ("outcome",))
+
+cache_lookups = Counter(
+    "omnidetect_cache_lookups_total", "Result cache lookups, by the tier that answered (memory, disk) or miss",
+    ("result",))
+
+upload_bytes = Histogram(
+    "omnidetect_upload_bytes", "Size of uploaded files",
+    ("kind",), buckets=SIZE_BUCKETS)
@@ -0,0 +1,357 @@
+"""
+Persistent outbox for transactional email.
+
+Endpoints enqueue a Resend message and return at once — inside their own
+transaction when given `conn`, so a newsletter signup and its confirmation
+email are committed together or not at all.  One dispatcher thread per
+process claims due messages and sends up to `batch_size` per API call
+(Resend's batch endpoint).  Calls are paced to `rate` per second for the
+whole server, not per process: each call reserves the next send slot in the
+`outbox_pacing` row, and a rate-limit signal from Resend (limit exhausted,
+or 429) pushes that row's `blocked_until` out for every dispatcher.
+
+Connection errors, 429 and 5xx are retried with exponential backoff up to
+`max_attempts`; any other 4xx rejects the message.  An Idempotency-Key header
+makes a retry safe when Resend accepted the first call but the response was
+lost: each message keeps the key of the call that carried it (`batch_key`),
+and a retry re-sends that same group under that same key.  `dedupe_key` drops
+a second enqueue of the same message within `dedupe_window` seconds of the
+first one's `created_at` (0 = forever), e.g. a double-submitted contact form.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import requests
+
+from config import Config
+from http_client import clients
+from metrics import email_delivery, outbox_depth
+from storage import ConnectionLocal, connect
+
+
+PENDING = ("queued", "sending")
+
+# Due now: queued and past run_after, or 'sending' past its lease (its process died)
+DUE     = "((status = 'queued' AND run_after <= ?) OR (status = 'sending' AND updated_at < ?))"
+CLAIMED = "id, kind, message, attempts, created_at"
+
+
+class Outbox:
+    def __init__(self, path, batch_size=50, rate=2.0, max_attempts=8, backoff=5.0,
+                 dedupe_window=3600, retention=604800, lease=120, poll_interval=1.0):
+        self.path          = path
+        self.batch_size    = max(1, min(100, batch_size))      # Resend accepts ≤ 100 per batch call
+        self.rate          = rate
+        self.max_attempts  = max_attempts
+        self.backoff       = backoff
+        self.dedupe_window = dedupe_window
+        self.retention     = retention
+        self.lease         = lease
+        self.poll_interval = poll_interval
+
+        self._local         = ConnectionLocal()
+        self._wake          = threading.Event()
+        self._thread        = None
+        self._stopping      = False
+        self._last_gc       = 0.0
+
+        self._lock         = threading.Lock()
+        self._latencies    = deque(maxlen=500)      # recent enqueue → sent, seconds
+        self.api_calls     = 0
+        self.sent          = 0
+        self.rate_limited  = 0
+
+        self._init_table()
+
+    # ── Storage ──────────────────────────────────────────────────────────
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, timeout=10, isolation_level=None, row_factory=sqlite3.Row)
+            self._local.conn = conn
+        return conn
+
+    def _init_table(self):
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind         TEXT NOT NULL,
+                dedupe_key   TEXT UNIQUE,
+                message      TEXT NOT NULL,
+                status       TEXT NOT NULL,
+                attempts     INTEGER DEFAULT 0,
+                error        TEXT,
+                provider_id  TEXT,
+                run_after    REAL NOT NULL,
+                created_at   REAL NOT NULL,
+                updated_at   REAL NOT NULL,
+                sent_at      REAL,
+                batch_key    TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status_run_after ON outbox (status, run_after)')
+        if "batch_key" not in {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}:
+            conn.execute("ALTER TABLE outbox ADD COLUMN batch_key TEXT")    # Idempotency-Key of its last call
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_updated_at ON outbox (updated_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_batch_key ON outbox (batch_key)')
+        # One row: the next free send slot of every dispatcher process (wall-clock times)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_pacing (
+                id             INTEGER PRIMARY KEY CHECK (id = 1),
+                next_slot      REAL NOT NULL,
+                blocked_until  REAL NOT NULL
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO outbox_pacing (id, next_slot, blocked_until) VALUES (1, 0, 0)")
+
+    # ── Producer side ────────────────────────────────────────────────────
+    def enqueue(self, kind, message, dedupe_key=None, dedupe_window=None, conn=None):
+        """Queue one Resend message (dict).  Returns its id, or None for a duplicate."""
+        now    = time.time()
+        window = self.dedupe_window if dedupe_window is None else dedupe_window
+        conn   = conn or self._conn()
+        if dedupe_key and window:
+            # An older copy outside the window gives up the key; one inside it makes this a duplicate
+            conn.execute("UPDATE outbox SET dedupe_key = NULL WHERE dedupe_key = ? AND created_at <= ?",
+                         (dedupe_key, now - window))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO outbox (kind, dedupe_key, message, status, run_after, created_at, updated_at) "
+            "VALUES (?,?,?,?,?,?,?)",
+            (kind, dedupe_key, json.dumps(message), "queued", now, now, now)
+        )
+        if cursor.rowcount == 0:
+            return None
+        self._wake.set()        # a caller's open transaction is picked up on the next poll
+        return cursor.lastrowid
+
+    def depth(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM outbox WHERE status IN ('queued', 'sending')"
+        ).fetchone()[0]
+
+    def stats(self):
+        conn   = self._conn()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status = 'queued'").fetchone()[0]
+        with self._lock:
+            latencies = sorted(self._latencies)
+            calls, sent, limited = self.api_calls, self.sent, self.rate_limited
+        return {
+            "running":         self._thread is not None,
+            "depth":           sum(counts.get(status, 0) for status in PENDING),
+            "oldest_queued_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "sent":            counts.get("sent", 0),
+            "failed":          counts.get("failed", 0),
+            "api_calls":       calls,
+            "avg_batch":       round(sent / calls, 2) if calls else 0.0,
+            "rate_limited":    limited,
+            "avg_delivery_s":  round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p95_delivery_s":  round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else None
+        }
+
+    # ── Dispatcher side ──────────────────────────────────────────────────
+    def _claim(self):
+        """Messages for the next call and its Idempotency-Key: the group an earlier call
+        carried, under its key, or up to `batch_size` never-sent messages under a new one."""
+        conn = self._conn()
+        now  = time.time()
+        due  = (now, now - self.lease)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first = conn.execute(f"SELECT batch_key FROM outbox WHERE {DUE} ORDER BY run_after, id LIMIT 1",
+                                 due).fetchone()
+            if first is None:
+                rows, key = [], None
+            elif first["batch_key"]:
+                key  = first["batch_key"]
+                rows = conn.execute(f"SELECT {CLAIMED} FROM outbox WHERE batch_key = ? AND {DUE} ORDER BY id",
+                                    (key, *due)).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {CLAIMED} FROM outbox WHERE batch_key IS NULL AND {DUE} ORDER BY run_after, id LIMIT ?",
+                    (*due, self.batch_size)
+                ).fetchall()
+                key  = "outbox-" + hashlib.sha1(",".join(str(row["id"]) for row in rows).encode()).hexdigest()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1, batch_key = ?, updated_at = ? "
+                "WHERE id = ?",
+                [(key, now, row["id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows, key
+
+    def _pace(self):
+        """Reserve the next send slot and wait for it: `rate` calls/s across all processes,
+        or later after a rate-limit signal."""
+        conn = self._conn()
+        now  = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            next_slot, blocked_until = conn.execute(
+                "SELECT next_slot, blocked_until FROM outbox_pacing WHERE id = 1").fetchone()
+            slot = max(now, next_slot, blocked_until)
+            conn.execute("UPDATE outbox_pacing SET next_slot = ? WHERE id = 1", (slot + 1.0 / self.rate,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _note_rate_limit(self, response):
+        retry_after = response.headers.get("Retry-After")
+        if response.status_code != 429 and response.headers.get("ratelimit-remaining") == "0":
+            retry_after = response.headers.get("ratelimit-reset")
+        try:
+            wait = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            wait = None
+        if response.status_code == 429:
+            with self._lock:
+                self.rate_limited += 1
+            wait = 1.0 if wait is None else wait
+        if wait:
+            self._conn().execute("UPDATE outbox_pacing SET blocked_until = MAX(blocked_until, ?) WHERE id = 1",
+                                 (time.time() + min(wait, 60.0),))
+
+    def _post(self, rows, key):
+        messages = [json.loads(row["message"]) for row in rows]
+        headers  = {
+            "Authorization":   f"Bearer {Config.RESEND_API_KEY}",
+            "Content-Type":    "application/json",
+            "Idempotency-Key": key,
+        }
+        self._pace()
+        try:
+            if len(rows) == 1:
+                return clients["resend"].post(Config.RESEND_API_URL, headers=headers, json=messages[0])
+            return clients["resend"].post(Config.RESEND_BATCH_URL, headers=headers, json=messages)
+        finally:
+            with self._lock:
+                self.api_calls += 1
+
+    def _send(self, rows, key):
+        try:
+            response = self._post(rows, key)
+        except requests.RequestException as e:
+            self._retry(rows, f"Resend: {e}")
+            return
+
+        self._note_rate_limit(response)
+        status = response.status_code
+        if status in (200, 201):
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            if len(rows) == 1:
+                provider_ids = [data.get("id")]
+            else:
+                provider_ids = [item.get("id") for item in data.get("data", [])]
+            self._sent(rows, provider_ids)
+        elif status == 429 or status >= 500:
+            self._retry(rows, f"Resend HTTP {status}")
+        elif len(rows) > 1:
+            # One invalid message rejects the whole batch (nothing was sent) — send them one by one
+            for row in rows:
+                key = f"outbox-{row['id']}"
+                self._conn().execute("UPDATE outbox SET batch_key = ? WHERE id = ?", (key, row["id"]))
+                self._send([row], key)
+        else:
+            print(f"[WARN] Outbox message {rows[0]['id']} rejected: HTTP {status} {response.text[:200]}")
+            self._finish(rows, "failed", error=f"Resend HTTP {status}: {response.text[:200]}")
+
+    def _sent(self, rows, provider_ids):
+        now = time.time()
+        provider_ids = list(provider_ids) + [None] * (len(rows) - len(provider_ids))
+        self._conn().executemany(
+            "UPDATE outbox SET status = 'sent', error = NULL, provider_id = ?, sent_at = ?, updated_at = ? WHERE id = ?",
+            [(provider_id, now, now, row["id"]) for row, provider_id in zip(rows, provider_ids)]
+        )
+        with self._lock:
+            self.sent += len(rows)
+            for row in rows:
+                self._latencies.append(now - row["created_at"])
+        for row in rows:
+            email_delivery.observe(now - row["created_at"], row["kind"])
+
+    def _retry(self, rows, error):
+        retry, give_up = [], []
+        for row in rows:
+            attempts = row["attempts"] + 1
+            (give_up if attempts >= self.max_attempts else retry).append(row)
+        if retry:
+            print(f"[WARN] {error} — {len(retry)} email(s) will be retried")
+            now = time.time()
+            self._conn().executemany(
+                "UPDATE outbox SET status = 'queued', error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                [(error, now + min(3600.0, self.backoff * 2 ** row["attempts"]), now, row["id"]) for row in retry]
+            )
+        if give_up:
+            print(f"[WARN] {error} — giving up on {len(give_up)} email(s) after {self.max_attempts} attempts")
+            self._finish(give_up, "failed", error=error)
+
+    def _finish(self, rows, status, error=None):
+        now = time.time()
+        self._conn().executemany(
+            "UPDATE outbox SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            [(status, error, now, row["id"]) for row in rows]
+        )
+
+    def _gc(self):
+        now = time.time()
+        if now - self._last_gc < 60:
+            return
+        self._last_gc = now
+        self._conn().execute(
+            "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND updated_at < ?",
+            (now - self.retention,)
+        )
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                self._gc()
+                rows, key = self._claim()
+                if rows:
+                    self._send(rows, key)
+                outbox_depth.set(self.depth())
+            except sqlite3.Error as e:
+                print(f"[WARN] Outbox: {e}")      # claimed rows are re-claimed after the lease
+                rows = []
+            if not rows:
+                self._wake.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+
+outbox = Outbox(
+    Config.DATABASE,
+    batch_size    = Config.OUTBOX_BATCH_SIZE,
+    rate          = Config.OUTBOX_RATE_PER_SECOND,
+    max_attempts  = Config.OUTBOX_MAX_ATTEMPTS,
+    backoff       = Config.OUTBOX_RETRY_BACKOFF,
+    dedupe_window = Config.OUTBOX_DEDUPE_SECONDS,
+    retention     = Config.OUTBOX_RETENTION_SECONDS
+)
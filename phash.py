@@ -0,0 +1,303 @@
+"""
+Perceptual-hash near-duplicate index for uploaded images.
+
+A 64-bit dHash survives resizing, re-compression and most screenshots, so a
+re-uploaded image lands within a few bits of the original.  Lookups use
+multi-index hashing: the hash is split into CHUNKS 16-bit substrings, and by
+the pigeonhole principle any hash within distance d of the query matches at
+least one substring within d // CHUNKS bits.  Only those buckets are probed
+and the candidates are verified with a full popcount.
+
+Hashes live in SQLite (shared across workers); each worker keeps the
+substring buckets in compact arrays and pulls rows added by other workers
+before every lookup.  Rows are evicted like the result cache's: past `ttl`,
+then the oldest beyond `max_rows`, swept every EVICT_EVERY writes.  Both
+drop the lowest ids, so a worker rebuilds its arrays once a quarter of what
+it holds has been evicted.
+"""
+import io
+import json
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from itertools import combinations
+
+from PIL import Image
+
+from config import Config
+from storage import ConnectionLocal, connect
+
+
+HASH_BITS  = 64
+CHUNKS     = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def dhash(image, size=8):
+    """64-bit difference hash of a PIL image."""
+    img = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+    px  = img.tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (px[offset + col] < px[offset + col + 1])
+    return value
+
+
+def dhash_file(fp):
+    with Image.open(fp) as img:
+        img.draft("L", (64, 64))            # JPEG: decode at reduced size
+        return dhash(img)
+
+
+def dhash_bytes(data):
+    return dhash_file(io.BytesIO(data))
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+_PROBE_MASKS = {}
+
+
+def _probe_masks(radius):
+    """XOR masks reaching every CHUNK_BITS-bit value within `radius` flips."""
+    masks = _PROBE_MASKS.get(radius)
+    if masks is None:
+        masks = [0]
+        for r in range(1, radius + 1):
+            for bits in combinations(range(CHUNK_BITS), r):
+                masks.append(sum(1 << b for b in bits))
+        _PROBE_MASKS[radius] = masks
+    return masks
+
+
+class MultiIndexHash:
+    """In-memory multi-index over 64-bit hashes; ids are caller-supplied ints."""
+
+    def __init__(self):
+        self.ids     = array("q")
+        self.hashes  = array("Q")
+        self.buckets = [{} for _ in range(CHUNKS)]   # chunk value → array of positions
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, item_id, value):
+        pos = len(self.hashes)
+        self.ids.append(item_id)
+        self.hashes.append(value)
+        for i in range(CHUNKS):
+            chunk  = (value >> (i * CHUNK_BITS)) & CHUNK_MASK
+            bucket = self.buckets[i].get(chunk)
+            if bucket is None:
+                bucket = self.buckets[i][chunk] = array("I")
+            bucket.append(pos)
+
+    def search(self, value, max_distance):
+        """Return (distance, id) of the closest stored hash, or None."""
+        masks  = _probe_masks(max_distance // CHUNKS)
+        hashes = self.hashes
+        best_d = max_distance + 1
+        best   = None
+        for i in range(CHUNKS):
+            table = self.buckets[i]
+            chunk = (value >> (i * CHUNK_BITS)) & CHUNK_MASK
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket is None:
+                    continue
+                for pos in bucket:
+                    d = (hashes[pos] ^ value).bit_count()
+                    if d < best_d:
+                        best_d, best = d, pos
+                        if d == 0:
+                            return 0, self.ids[pos]
+        return None if best is None else (best_d, self.ids[best])
+
+    def within(self, value, max_distance):
+        """Return [(distance, id), …] for every stored hash within range, nearest first."""
+        masks  = _probe_masks(max_distance // CHUNKS)
+        hashes = self.hashes
+        found  = {}
+        for i in range(CHUNKS):
+            table = self.buckets[i]
+            chunk = (value >> (i * CHUNK_BITS)) & CHUNK_MASK
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket is None:
+                    continue
+                for pos in bucket:
+                    if pos not in found:
+                        d = (hashes[pos] ^ value).bit_count()
+                        found[pos] = d if d <= max_distance else None
+        ids = self.ids
+        return sorted((d, ids[pos]) for pos, d in found.items() if d is not None)
+
+
+class NearDuplicateIndex:
+    EVICT_EVERY  = 100
+    LOOKUP_BATCH = 64     # ranked candidates checked per query against the table
+
+    def __init__(self, path, max_distance=6, ttl=86400, max_rows=100000):
+        self.path         = path
+        self.max_distance = max_distance
+        self.ttl          = ttl
+        self.max_rows     = max_rows
+
+        self._index   = MultiIndexHash()
+        self._last_id = 0
+        self._lock    = threading.Lock()
+        self._local   = ConnectionLocal()
+
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self._writes   = 0
+
+        self._init_table()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def _init_table(self):
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS phash_index (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                phash       INTEGER NOT NULL,
+                result      TEXT NOT NULL,
+                created_at  REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def _evict(self, now):
+        """Drop expired rows, then the oldest rows beyond max_rows."""
+        conn    = self._conn()
+        removed = conn.execute("DELETE FROM phash_index WHERE created_at <= ?", (now - self.ttl,)).rowcount
+        total   = conn.execute("SELECT COUNT(*) FROM phash_index").fetchone()[0]
+        if total > self.max_rows:
+            removed += conn.execute(
+                "DELETE FROM phash_index WHERE id IN (SELECT id FROM phash_index ORDER BY id LIMIT ?)",
+                (total - self.max_rows,)
+            ).rowcount
+        conn.commit()
+        return removed
+
+    def _sync(self):
+        """Pull rows written since the last sync (by this or another worker)."""
+        conn  = self._conn()
+        first = conn.execute("SELECT MIN(id) FROM phash_index").fetchone()[0]
+        with self._lock:
+            held    = len(self._index)
+            stale   = held if first is None else bisect_left(self._index.ids, first)
+            rebuild = stale > 0 and stale * 4 >= held
+            last_id = 0 if rebuild else self._last_id
+        rows = conn.execute(
+            "SELECT id, phash FROM phash_index WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        if rebuild:
+            index = MultiIndexHash()
+            for row_id, value in rows:
+                index.add(row_id, _to_unsigned(value))
+            with self._lock:
+                self._index, self._last_id = index, (rows[-1][0] if rows else 0)
+            return
+        if rows:
+            with self._lock:
+                for row_id, value in rows:
+                    if row_id > self._last_id:
+                        self._index.add(row_id, _to_unsigned(value))
+                        self._last_id = row_id
+
+    def warm(self):
+        """Build the in-memory index from the table now rather than on the first lookup."""
+        self._evict(time.time())
+        self._sync()
+        return len(self._index)
+
+    def lookup(self, value):
+        """Return (distance, result) for the nearest stored image, or (None, None)."""
+        try:
+            self._sync()
+            with self._lock:
+                matches = self._index.within(value, self.max_distance)
+            # Rank first, then skip rows that expired or were evicted since the
+            # last sync, so a stale nearest match doesn't hide a live one.
+            cutoff = time.time() - self.ttl
+            for start in range(0, len(matches), self.LOOKUP_BATCH):
+                batch = matches[start:start + self.LOOKUP_BATCH]
+                live  = dict(self._conn().execute(
+                    f"SELECT id, result FROM phash_index WHERE created_at > ? "
+                    f"AND id IN ({','.join('?' * len(batch))})",
+                    (cutoff, *(row_id for _, row_id in batch))
+                ).fetchall())
+                for distance, row_id in batch:
+                    if row_id in live:
+                        with self._lock:
+                            self.hits += 1
+                        return distance, json.loads(live[row_id])
+        except sqlite3.Error as e:
+            print(f"[WARN] pHash index read failed: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def add(self, value, result):
+        try:
+            now  = time.time()
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO phash_index (phash, result, created_at) VALUES (?,?,?)",
+                (_to_signed(value), json.dumps(result), now)
+            )
+            conn.commit()
+            # Amortise eviction: only sweep once every EVICT_EVERY writes
+            with self._lock:
+                self._writes += 1
+                sweep = self._writes % self.EVICT_EVERY == 0
+            if sweep:
+                removed = self._evict(now)
+                with self._lock:
+                    self.evictions += removed
+            self._sync()
+        except sqlite3.Error as e:
+            print(f"[WARN] pHash index write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size":         len(self._index),
+                "hits":         self.hits,
+                "misses":       self.misses,
+                "evictions":    self.evictions,
+                "max_distance": self.max_distance
+            }
+
+
+near_duplicates = NearDuplicateIndex(
+    Config.CACHE_DATABASE,
+    max_distance = Config.PHASH_MAX_DISTANCE,
+    ttl          = Config.PHASH_TTL_SECONDS,
+    max_rows     = Config.PHASH_MAX_ROWS
+)
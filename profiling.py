@@ -0,0 +1,259 @@
+"""
+Per-request phase timings and an opt-in sampling profiler.
+
+phase("name") times a step of the current request (the thread-local set up
+by begin()); the totals go out in the Server-Timing header.  Outside a
+request it does nothing.
+
+A request is profiled when it asks for it (X-Profile with a valid admin
+token) or falls in the sampled fraction `sample_rate`, which the admin API
+can change at run time for every worker (it is kept in settings.json in the
+profile folder).  While any request is profiled one sampler thread reads
+the stacks of the profiled threads every `interval` seconds, including pool
+threads attach()ed to the request for a provider call.  Each profile is
+written as <id>.folded (collapsed stacks, the input of flamegraph.pl and
+speedscope) and <id>.json (route, status, phases, sample counts); only the
+newest `keep` are kept.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from config import Config
+
+
+MAX_DEPTH = 128
+
+_state = threading.local()
+
+
+# ── Phase timings ────────────────────────────────────────────────────────
+def begin():
+    _state.phases  = {}
+    _state.profile = None
+
+
+def end():
+    phases = getattr(_state, "phases", None)
+    _state.phases = _state.profile = None
+    return phases or {}
+
+
+@contextmanager
+def phase(name):
+    phases = getattr(_state, "phases", None)
+    if phases is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def server_timing(phases, total=None, profile_id=None):
+    """Server-Timing header value: one metric per phase, in milliseconds."""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    if profile_id:
+        parts.append(f'profile;desc="{profile_id}"')
+    return ", ".join(parts)
+
+
+# ── Sampling profiler ────────────────────────────────────────────────────
+def _frame_key(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    def __init__(self, route, method, reason):
+        self.id      = uuid.uuid4().hex
+        self.route   = route
+        self.method  = method
+        self.reason  = reason                   # "header" or "sampled"
+        self.started = time.time()
+        self.stacks  = Counter()
+        self.samples = 0
+
+    def add(self, frame, root):
+        names = []
+        while frame is not None and len(names) < MAX_DEPTH:
+            names.append(_frame_key(frame))
+            frame = frame.f_back
+        names.append(root)
+        self.stacks[";".join(reversed(names))] += 1
+        self.samples += 1
+
+
+class Profiler:
+    def __init__(self, folder, sample_rate=0.0, interval=0.005, keep=200):
+        self.folder      = folder
+        self.sample_rate = sample_rate
+        self.interval    = interval
+        self.keep        = keep
+
+        self._lock     = threading.Lock()
+        self._threads  = {}                     # thread id → (profile, root label)
+        self._wake     = threading.Event()
+        self._thread   = None
+        self._checked  = 0.0
+        self._mtime    = None
+
+        os.makedirs(folder, exist_ok=True)
+
+    # ── Run-time setting shared by every worker ──────────────────────────
+    @property
+    def _settings_path(self):
+        return os.path.join(self.folder, "settings.json")
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < 2:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self._settings_path).st_mtime
+            if mtime != self._mtime:
+                with open(self._settings_path) as f:
+                    self.sample_rate = float(json.load(f)["sample_rate"])
+                self._mtime = mtime
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def set_sample_rate(self, rate):
+        tmp = f"{self._settings_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"sample_rate": rate}, f)
+        os.replace(tmp, self._settings_path)
+        self.sample_rate, self._checked = rate, 0.0
+
+    def wanted(self):
+        """Should the request starting now be sampled?"""
+        self._refresh()
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    # ── Sampling ─────────────────────────────────────────────────────────
+    def start(self, route, method, reason):
+        """Profile the current thread until finish(); returns the Profile."""
+        profile = Profile(route, method, reason)
+        _state.profile = profile
+        self._attach(threading.get_ident(), profile, "request")
+        return profile
+
+    def _attach(self, ident, profile, root):
+        with self._lock:
+            self._threads[ident] = (profile, root)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _detach(self, ident):
+        with self._lock:
+            self._threads.pop(ident, None)
+
+    @contextmanager
+    def attached(self, profile, root):
+        """Sample this (pool) thread into `profile` for the duration of the block."""
+        if profile is None:
+            yield
+            return
+        ident = threading.get_ident()
+        self._attach(ident, profile, root)
+        try:
+            yield
+        finally:
+            self._detach(ident)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                watched = dict(self._threads)
+            if not watched:
+                self._wake.clear()
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for ident, (profile, root) in watched.items():
+                frame = frames.get(ident)
+                if frame is not None and ident != me:
+                    profile.add(frame, root)
+            del frames
+            time.sleep(self.interval)
+
+    def finish(self, profile, status, total, phases):
+        """Stop sampling and write the profile files; returns the metadata written."""
+        self._detach(threading.get_ident())
+        meta = {
+            "id":          profile.id,
+            "route":       profile.route,
+            "method":      profile.method,
+            "reason":      profile.reason,
+            "status":      status,
+            "started":     profile.started,
+            "duration_ms": round(total * 1000, 1),
+            "samples":     profile.samples,
+            "interval_ms": self.interval * 1000,
+            "phases_ms":   {name: round(seconds * 1000, 1) for name, seconds in phases.items()}
+        }
+        stacks = dict(profile.stacks)           # the sampler may still be adding a last sample
+        base   = os.path.join(self.folder, profile.id)
+        with open(base + ".folded", "w") as f:
+            for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        with open(base + ".json", "w") as f:
+            json.dump(meta, f)
+        self._prune()
+        return meta
+
+    def release(self):
+        """Stop sampling the current thread (a request that ended without finish())."""
+        self._detach(threading.get_ident())
+
+    def _prune(self):
+        entries = [e for e in os.scandir(self.folder) if e.name.endswith(".json") and e.name != "settings.json"]
+        if len(entries) <= self.keep:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.keep]:
+            for ext in (".json", ".folded"):
+                try:
+                    os.remove(entry.path[:-len(".json")] + ext)
+                except FileNotFoundError:
+                    pass
+
+    def list(self, limit=100):
+        """Metadata of the newest profiles, newest first."""
+        entries = [e for e in os.scandir(self.folder) if e.name.endswith(".json") and e.name != "settings.json"]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        profiles = []
+        for entry in entries[:limit]:
+            try:
+                with open(entry.path) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                pass                            # pruned or half-written meanwhile
+        return profiles
+
+
+def current():
+    """The profile of the request on this thread, or None."""
+    return getattr(_state, "profile", None)
+
+
+profiler = Profiler(
+    Config.PROFILE_FOLDER,
+    sample_rate = Config.PROFILE_SAMPLE_RATE,
+    interval    = Config.PROFILE_INTERVAL,
+    keep        = Config.PROFILE_KEEP
+)
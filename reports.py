@@ -0,0 +1,190 @@
+"""
+History export and server-side reports.
+
+export_rows() reads `history` oldest first through its own connection, so
+the export is one consistent WAL snapshot, fetching `batch` rows at a time.
+csv_chunks() / ndjson_chunks() turn the rows into ~64 KB pieces of a
+streamed response.  Memory stays constant whatever the size of the table.
+
+build_report() makes a single pass over the same cursor.  It writes one CSV
+row per time bucket and file type as each bucket closes, and finishes with
+a JSON summary: totals and averages per file type and an ai_score histogram.
+Only the running aggregates are held in memory, never the rows.
+"""
+import csv
+import io
+import json
+import os
+import re
+import time
+
+from aggregates import GRANULARITIES
+from storage import connect
+
+
+CHUNK      = 64 * 1024
+SCORE_BINS = 10
+
+REPORT_NAME = re.compile(r"[0-9a-f]{32}\.(csv|json)")          # <report_id>.<ext>, as build_report writes
+
+
+def history_sql(columns, where=()):
+    return (f"SELECT {', '.join(columns)} FROM history"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY timestamp, id")
+
+
+def export_rows(path, columns, where=(), params=(), batch=1000):
+    """Yield history rows (tuples of `columns`), oldest first, `batch` rows per fetch."""
+    conn = connect(path)
+    try:
+        cursor = conn.execute(history_sql(columns, where), params)
+        while rows := cursor.fetchmany(batch):
+            yield from rows
+    finally:
+        conn.close()
+
+
+def _cell(value):
+    # A leading = + - @ (or a tab / CR before one) makes spreadsheets evaluate
+    # the cell (filenames are user input)
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return "'" + value
+    return value
+
+
+def csv_chunks(rows, columns, chunk=CHUNK):
+    buf    = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_cell(v) for v in row])
+        if buf.tell() >= chunk:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def ndjson_chunks(rows, columns, chunk=CHUNK):
+    parts, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= chunk:
+            yield "".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts)
+
+
+# ── Reports ──────────────────────────────────────────────────────────────
+REPORT_COLUMNS = ("bucket", "file_type", "total", "ai_generated", "human", "uncertain",
+                  "avg_ai_score", "avg_confidence")
+
+
+class _Tally:
+    __slots__ = ("total", "ai", "human", "uncertain", "score_sum", "confidence_sum")
+
+    def __init__(self):
+        self.total = self.ai = self.human = self.uncertain = 0
+        self.score_sum = self.confidence_sum = 0.0
+
+    def add(self, verdict, score, confidence):
+        self.total += 1
+        if verdict == "AI Generated":
+            self.ai += 1
+        elif (verdict or "").startswith("Human"):
+            self.human += 1
+        else:
+            self.uncertain += 1
+        self.score_sum      += score or 0.0
+        self.confidence_sum += confidence or 0.0
+
+    def row(self):
+        return [self.total, self.ai, self.human, self.uncertain,
+                round(self.score_sum / self.total, 4), round(self.confidence_sum / self.total, 4)]
+
+    def summary(self):
+        return dict(zip(REPORT_COLUMNS[2:], self.row()))
+
+
+def build_report(path, folder, report_id, where=(), params=(), granularity="day"):
+    """Write <report_id>.csv (per bucket × file type) and <report_id>.json (summary) into `folder`."""
+    fmt, _  = GRANULARITIES[granularity]
+    started = time.time()
+    csv_path, json_path = (os.path.join(folder, f"{report_id}.{ext}") for ext in ("csv", "json"))
+
+    totals  = {}                                # file_type → _Tally
+    scores  = {}                                # file_type → score histogram
+    first = last = None
+    buckets = rows = 0
+
+    conn = connect(path)
+    try:
+        columns = [f"strftime('{fmt}', timestamp)", "COALESCE(file_type, '')",
+                   "verdict", "ai_score", "confidence", "timestamp"]
+        cursor  = conn.execute(history_sql(columns, where), params)
+        with open(csv_path + ".tmp", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(REPORT_COLUMNS)
+            bucket, current = None, {}
+            while batch := cursor.fetchmany(1000):
+                for key, file_type, verdict, score, confidence, timestamp in batch:
+                    if key != bucket:
+                        for name, tally in sorted(current.items()):
+                            writer.writerow([bucket, name, *tally.row()])
+                        bucket, current = key, {}
+                        buckets += 1
+                    current.setdefault(file_type, _Tally()).add(verdict, score, confidence)
+                    totals.setdefault(file_type, _Tally()).add(verdict, score, confidence)
+                    histogram = scores.setdefault(file_type, [0] * SCORE_BINS)
+                    histogram[min(SCORE_BINS - 1, int((score or 0.0) * SCORE_BINS))] += 1
+                    first = first or timestamp
+                    last  = timestamp
+                    rows += 1
+            for name, tally in sorted(current.items()):
+                writer.writerow([bucket, name, *tally.row()])
+    finally:
+        conn.close()
+
+    overall = _Tally()
+    for tally in totals.values():
+        for field in _Tally.__slots__:
+            setattr(overall, field, getattr(overall, field) + getattr(tally, field))
+
+    summary = {
+        "report_id":    report_id,
+        "granularity":  granularity,
+        "rows":         rows,
+        "buckets":      buckets,
+        "first":        first,
+        "last":         last,
+        "totals":       overall.summary() if rows else None,
+        "by_type":      {name: tally.summary() for name, tally in sorted(totals.items())},
+        "score_histogram": {
+            "bins":    [round(i / SCORE_BINS, 2) for i in range(SCORE_BINS + 1)],
+            "by_type": scores
+        },
+        "generated_in_s": round(time.time() - started, 3)
+    }
+    with open(json_path + ".tmp", "w") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(csv_path + ".tmp", csv_path)
+    os.replace(json_path + ".tmp", json_path)
+    return summary
+
+
+def prune_reports(folder, max_age):
+    """Delete generated report files (and .tmp leftovers) older than `max_age` seconds; returns how many.
+
+    Anything else in the folder — .gitkeep, files an operator put there — is left alone.
+    """
+    cutoff, removed = time.time() - max_age, 0
+    for entry in os.scandir(folder):
+        name = entry.name[:-len(".tmp")] if entry.name.endswith(".tmp") else entry.name
+        if REPORT_NAME.fullmatch(name) and entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return removed
@@ -0,0 +1,286 @@
+"""
+Latency-aware provider routing.
+
+Each provider gets a latency tracker (EWMA + p95 over a sliding window), an
+error-rate EWMA and a circuit breaker.  A call walks the providers in
+preference order, skipping any whose breaker is open.  If the current
+provider has not answered after the hedge delay, the next provider is
+started in parallel and whichever succeeds first wins.
+
+Provider functions follow the app's convention: they return a result dict,
+or a dict with an "error" key on failure.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config import Config
+from limits import Overloaded
+from metrics import provider_fallbacks, provider_hedges
+
+
+class ProviderHealth:
+    def __init__(self, name, alpha=0.2, window=200,
+                 failure_threshold=5, cooldown=30.0):
+        self.name              = name
+        self.alpha             = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown          = cooldown
+
+        self._lock      = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.ewma       = None                 # seconds
+        self.error_rate = 0.0
+
+        self.state       = "closed"            # closed → open → half_open → closed
+        self.opened_at   = 0.0
+        self.consecutive = 0
+        self._trial      = False
+
+        self.calls    = 0
+        self.failures = 0
+        self.skipped  = 0
+
+    # ── Circuit breaker ──────────────────────────────────────────────────
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial:
+                self._trial = True             # let exactly one probe through
+                return True
+            self.skipped += 1
+            return False
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.calls += 1
+            self._latencies.append(latency)
+            self.ewma = latency if self.ewma is None else self.alpha * latency + (1 - self.alpha) * self.ewma
+            self.error_rate = self.alpha * (0 if ok else 1) + (1 - self.alpha) * self.error_rate
+            self._trial = False
+
+            if ok:
+                self.consecutive = 0
+                self.state       = "closed"
+                return
+
+            self.failures    += 1
+            self.consecutive += 1
+            if self.state == "half_open" or self.consecutive >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[WARN] Circuit open for {self.name} after {self.consecutive} failures")
+                self.state     = "open"
+                self.opened_at = time.monotonic()
+
+    def abandon(self):
+        """A call refused before it reached the provider: release a half-open probe, record nothing."""
+        with self._lock:
+            self._trial = False
+
+    # ── Latency ──────────────────────────────────────────────────────────
+    def p95(self):
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def stats(self):
+        p95 = self.p95()
+        with self._lock:
+            return {
+                "state":      self.state,
+                "ewma_ms":    round(self.ewma * 1000, 1) if self.ewma is not None else None,
+                "p95_ms":     round(p95 * 1000, 1) if p95 is not None else None,
+                "error_rate": round(self.error_rate, 4),
+                "calls":      self.calls,
+                "failures":   self.failures,
+                "skipped":    self.skipped
+            }
+
+
+class ProviderRouter:
+    def __init__(self, hedge_delay=None, hedging=None, max_workers=32):
+        self.hedge_delay = Config.ROUTER_HEDGE_DELAY if hedge_delay is None else hedge_delay
+        self.hedging     = Config.ROUTER_HEDGING     if hedging     is None else hedging
+
+        self.health = {}
+        self._lock  = threading.Lock()
+        self._pool  = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router")
+
+        self.hedges    = 0
+        self.fallbacks = 0
+        self._background = set()                # async losers of a hedge, still running
+
+    def provider(self, name):
+        with self._lock:
+            if name not in self.health:
+                self.health[name] = ProviderHealth(
+                    name,
+                    failure_threshold = Config.BREAKER_FAILURE_THRESHOLD,
+                    cooldown          = Config.BREAKER_COOLDOWN
+                )
+            return self.health[name]
+
+    def _hedge_after(self, health):
+        """Hedge once the provider is slower than usual (its p95), capped by hedge_delay."""
+        p95 = health.p95()
+        if p95 is None or health.calls < 20:
+            return self.hedge_delay
+        return min(self.hedge_delay, p95)
+
+    def _timed(self, name, fn, args):
+        health = self.provider(name)
+        start  = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Overloaded as e:
+            health.abandon()                    # our own queue, not the provider, said no
+            return {"error": f"{name}: {e}", "retry_after": e.retry_after}
+        except Exception as e:
+            result = {"error": f"{name}: {e}"}
+        health.record(time.perf_counter() - start, "error" not in result)
+        return result
+
+    def call(self, chain, *args):
+        """
+        Run `chain` — a list of (name, fn) in preference order — and return the
+        first successful result, tagged with "provider".  Returns {"error": ...}
+        when every provider failed or was skipped by its breaker — with
+        "retry_after" when the last one was refused by its admission queue.
+        """
+        queue      = list(chain)
+        pending    = {}                         # future → provider name
+        last_error = None
+
+        def launch():
+            # Breakers are consulted lazily so a half-open probe is only
+            # claimed by a provider that is actually called.
+            while queue:
+                name, fn = queue.pop(0)
+                if self.provider(name).allow():
+                    pending[self._pool.submit(self._timed, name, fn, args)] = name
+                    return name
+            return None
+
+        current = launch()
+        if current is None:
+            return {"error": "All providers unavailable (circuit open): " + ", ".join(n for n, _ in chain)}
+
+        while pending:
+            timeout = None
+            if self.hedging and queue:
+                timeout = self._hedge_after(self.provider(current))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Slow answer: start the next provider alongside it
+                hedge = launch()
+                if hedge is not None:
+                    provider_hedges.inc(current, hedge)
+                    current = hedge
+                    with self._lock:
+                        self.hedges += 1
+                continue
+
+            for future in done:
+                name   = pending.pop(future)
+                result = future.result()
+                if "error" not in result:
+                    return {**result, "provider": name}
+                last_error, failed, failure = result["error"], name, result
+
+            if not pending and queue:
+                print(f"[WARN] {last_error} — trying {queue[0][0]}")
+                fallback = launch()
+                if fallback is not None:
+                    provider_fallbacks.inc(failed, fallback)
+                    current = fallback
+                    with self._lock:
+                        self.fallbacks += 1
+
+        return failure
+
+    async def _timed_async(self, name, fn, args):
+        health = self.provider(name)
+        start  = time.perf_counter()
+        try:
+            result = await fn(*args)
+        except Overloaded as e:
+            health.abandon()                    # our own queue, not the provider, said no
+            return {"error": f"{name}: {e}", "retry_after": e.retry_after}
+        except Exception as e:
+            result = {"error": f"{name}: {e}"}
+        health.record(time.perf_counter() - start, "error" not in result)
+        return result
+
+    async def call_async(self, chain, *args):
+        """call() for coroutine functions, on the running event loop — same breakers, hedging and fallback."""
+        queue      = list(chain)
+        pending    = {}                         # task → provider name
+        last_error = None
+
+        def launch():
+            while queue:
+                name, fn = queue.pop(0)
+                if self.provider(name).allow():
+                    pending[asyncio.ensure_future(self._timed_async(name, fn, args))] = name
+                    return name
+            return None
+
+        current = launch()
+        if current is None:
+            return {"error": "All providers unavailable (circuit open): " + ", ".join(n for n, _ in chain)}
+
+        try:
+            while pending:
+                timeout = None
+                if self.hedging and queue:
+                    timeout = self._hedge_after(self.provider(current))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedge = launch()
+                    if hedge is not None:
+                        provider_hedges.inc(current, hedge)
+                        current = hedge
+                        with self._lock:
+                            self.hedges += 1
+                    continue
+
+                for task in done:
+                    name   = pending.pop(task)
+                    result = task.result()
+                    if "error" not in result:
+                        return {**result, "provider": name}
+                    last_error, failed, failure = result["error"], name, result
+
+                if not pending and queue:
+                    print(f"[WARN] {last_error} — trying {queue[0][0]}")
+                    fallback = launch()
+                    if fallback is not None:
+                        provider_fallbacks.inc(failed, fallback)
+                        current = fallback
+                        with self._lock:
+                            self.fallbacks += 1
+        finally:
+            # Like the thread pool, let a slower hedge finish so its latency is recorded
+            for task in pending:
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+        return failure
+
+    def stats(self):
+        with self._lock:
+            names = list(self.health)
+            summary = {"hedges": self.hedges, "fallbacks": self.fallbacks}
+        return {**summary, "providers": {name: self.health[name].stats() for name in names}}
+
+
+router = ProviderRouter()
@@ -0,0 +1,231 @@
+"""
+Zero-copy upload buffering.
+
+UploadSpool is handed to Werkzeug as the multipart file container, so the
+upload is SHA-256 hashed while it is being received and kept in memory up to
+UPLOAD_SPOOL_MAX_MEMORY (larger uploads roll over to an anonymous temp file).
+Providers read it through independent SpoolReader views, which stream the
+bytes without materialising another copy, so hedged requests can read the
+same upload concurrently.  Keeping a copy on disk is blobs.py's job.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import uuid
+
+from flask import Request
+
+from config import Config
+
+
+class UploadSpool(io.RawIOBase):
+    def __init__(self, max_memory=None):
+        self.max_memory = Config.UPLOAD_SPOOL_MAX_MEMORY if max_memory is None else max_memory
+        self._hash = hashlib.sha256()
+        self._buf  = bytearray()
+        self._file = None                       # temp file once rolled over
+        self._pos  = 0
+        self.size  = 0
+
+    @classmethod
+    def from_bytes(cls, data):
+        spool = cls()
+        spool.write(data)
+        spool.seek(0)
+        return spool
+
+    @property
+    def digest(self):
+        return self._hash.hexdigest()
+
+    @property
+    def in_memory(self):
+        return self._file is None
+
+    # ── File protocol (what Werkzeug and FileStorage use) ────────────────
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        self._hash.update(data)
+        if self._file is None and len(self._buf) + len(data) > self.max_memory:
+            self._file = tempfile.TemporaryFile(prefix="omnidetect-")
+            self._file.write(self._buf)
+            self._buf = bytearray()
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._buf += data
+        self.size += len(data)
+        self._pos  = self.size
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def readinto(self, b):
+        n = self._read_at(self._pos, b)
+        self._pos += n
+        return n
+
+    def _read_at(self, offset, b):
+        want = min(len(b), self.size - offset)
+        if want <= 0:
+            return 0
+        if self._file is None:
+            b[:want] = self._buf[offset:offset + want]
+            return want
+        self._file.flush()
+        chunk = os.pread(self._file.fileno(), want, offset)
+        b[:len(chunk)] = chunk
+        return len(chunk)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._buf = bytearray()
+        super().close()
+
+    # ── Zero-copy access ─────────────────────────────────────────────────
+    def reader(self):
+        """An independent, seekable read-only view of the whole upload."""
+        if self._file is None:
+            return SpoolReader(memoryview(self._buf), self.size)
+        self._file.flush()
+        return SpoolReader(os.dup(self._file.fileno()), self.size)
+
+
+class SpoolReader(io.RawIOBase):
+    """Reads from a memoryview or a dup'ed fd, so it outlives the request's spool."""
+
+    def __init__(self, source, size):
+        self._mem  = source if isinstance(source, memoryview) else None
+        self._fd   = None if self._mem is not None else source
+        self._pos  = 0
+        self.size  = size
+
+    def __len__(self):                          # lets requests set Content-Length
+        return self.size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def readinto(self, b):
+        want = min(len(b), self.size - self._pos)
+        if want <= 0:
+            return 0
+        if self._mem is not None:
+            b[:want] = self._mem[self._pos:self._pos + want]
+            n = want
+        else:
+            chunk = os.pread(self._fd, want, self._pos)
+            n = len(chunk)
+            b[:n] = chunk
+        self._pos += n
+        return n
+
+    def close(self):
+        if self._fd is not None and not self.closed:
+            os.close(self._fd)
+        self._mem = None
+        super().close()
+
+
+class MultipartBody(io.RawIOBase):
+    """
+    multipart/form-data body that streams a SpoolReader between a small
+    header and trailer, instead of requests' `files=` which builds the whole
+    body as one bytes object.  Seekable, so retries can rewind it.
+    """
+
+    def __init__(self, fields, file_field, filename, reader, content_type="application/octet-stream"):
+        self.boundary = uuid.uuid4().hex
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'
+        ).encode()
+        self._parts = [io.BytesIO(head), reader, io.BytesIO(f"\r\n--{self.boundary}--\r\n".encode())]
+        self._sizes = [len(head), reader.size, len(self._parts[2].getvalue())]
+        self._index = 0
+        self._pos   = 0
+        self.size   = sum(self._sizes)
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR and offset == 0:
+            return self._pos
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("MultipartBody only rewinds to 0")
+        for part in self._parts:
+            part.seek(0)
+        self._index = 0
+        self._pos   = 0
+        return 0
+
+    def tell(self):
+        return self._pos
+
+    def readinto(self, b):
+        while self._index < len(self._parts):
+            n = self._parts[self._index].readinto(b)
+            if n:
+                self._pos += n
+                return n
+            self._index += 1
+        return 0
+
+    def close(self):
+        self._parts[1].close()
+        super().close()
+
+
+class SpooledRequest(Request):
+    """Flask request whose uploaded files are UploadSpools."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool()
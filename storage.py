@@ -0,0 +1,247 @@
+"""
+SQLite storage layer.
+
+Every connection is opened through connect(), so all databases get the same
+pragmas: WAL (readers never block the writer), synchronous=NORMAL (fsync at
+checkpoints rather than on every commit — still crash-safe in WAL mode), a
+busy timeout instead of an immediate "database is locked", in-memory temp
+storage, a larger page cache and memory-mapped reads.
+
+Database hands out one connection per thread and keeps reusing it.
+BatchWriter takes inserts off the request path: rows are queued and a
+background thread writes them in grouped transactions.
+
+A connection must not be used on both sides of a fork (gunicorn preloads the
+app in the master, see gunicorn.conf.py).  Per-thread connections are kept
+in a ConnectionLocal, which forgets them in a forked child; the child opens
+its own on first use.
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+
+from config import Config
+from metrics import db_latency
+
+
+def _statement(sql):
+    return sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "EMPTY"
+
+
+class TimedConnection(sqlite3.Connection):
+    """Records each statement's execution time in the db_latency histogram."""
+    db_name = "sqlite"
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            db_latency.observe(time.perf_counter() - start, self.db_name, _statement(sql))
+
+    def executemany(self, sql, parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            db_latency.observe(time.perf_counter() - start, self.db_name, _statement(sql))
+
+
+def connect(path, timeout=None, isolation_level="", row_factory=None):
+    """sqlite3.connect() with the shared pragmas applied."""
+    timeout = Config.SQLITE_BUSY_TIMEOUT_MS / 1000 if timeout is None else timeout
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=isolation_level, factory=TimedConnection)
+    conn.db_name = os.path.basename(path)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA cache_size=-{Config.SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={Config.SQLITE_MMAP_BYTES}")
+    return conn
+
+
+# ── Fork safety ──────────────────────────────────────────────────────────
+_connection_locals = weakref.WeakSet()
+_inherited         = []                 # the parent's connections: never used or closed in the child
+
+
+class ConnectionLocal(threading.local):
+    """threading.local() for connections: emptied in a forked child."""
+
+    def __init__(self):
+        _connection_locals.add(self)
+
+
+def _forget_connections():
+    for local in list(_connection_locals):
+        _inherited.append(dict(local.__dict__))
+        local.__dict__.clear()
+
+
+os.register_at_fork(after_in_child=_forget_connections)
+
+
+class Database:
+    """One reused connection per thread.  Use `with db.conn() as conn:` for writes."""
+
+    def __init__(self, path, **connect_kwargs):
+        self.path            = path
+        self._connect_kwargs = connect_kwargs
+        self._local          = ConnectionLocal()
+
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, **self._connect_kwargs)
+            self._local.conn = conn
+        return conn
+
+
+class BatchWriter:
+    """
+    Queues rows for one INSERT statement and writes them from a background
+    thread, up to `batch_size` rows per transaction, at most `interval`
+    seconds after the first queued row.  flush() waits for everything
+    queued so far (read-your-writes for the caller).
+    """
+
+    def __init__(self, path, sql, batch_size=500, interval=0.05):
+        self.sql        = sql
+        self.batch_size = batch_size
+        self.interval   = interval
+        self._db        = Database(path)
+
+        self._queue   = queue.Queue()
+        self._urgent  = threading.Event()
+        self._written = threading.Condition()
+        self._thread  = None
+        self._start_lock = threading.Lock()
+
+        self.queued   = 0
+        self.rows     = 0
+        self.batches  = 0
+        self.failed   = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def write(self, row):
+        self.write_many([row])
+
+    def write_many(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        self._ensure_started()
+        with self._written:
+            self.queued += len(rows)
+        self._queue.put(rows)
+
+    def flush(self, timeout=5.0):
+        """Block until every row queued before this call is committed."""
+        with self._written:
+            target = self.queued
+            if self.rows + self.failed >= target:
+                return True
+        self._urgent.set()
+        self._queue.put([])                    # wake the writer if it is waiting for more rows
+        deadline = time.monotonic() + timeout
+        with self._written:
+            while self.rows + self.failed < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._written.wait(remaining)
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def _insert(self, batch):
+        conn = self._db.conn()
+        for attempt in range(3):
+            try:
+                with conn:
+                    conn.executemany(self.sql, batch)
+                return True
+            except sqlite3.OperationalError as e:
+                print(f"[WARN] Batch write attempt {attempt + 1} failed: {e}")
+                time.sleep(0.1 * (attempt + 1))
+            except sqlite3.Error as e:
+                print(f"[WARN] Batch write failed, dropping {len(batch)} rows: {e}")
+                return False
+        return False
+
+    def _commit(self, batch):
+        ok = self._insert(batch)
+        with self._written:
+            if ok:
+                self.rows    += len(batch)
+                self.batches += 1
+            else:
+                self.failed  += len(batch)
+            self._written.notify_all()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch    = list(first)
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size and not self._urgent.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    more = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if more is None:
+                    stopping = True
+                    break
+                batch.extend(more)
+            self._urgent.clear()
+
+            if batch:
+                self._commit(batch)
+
+        # Drain whatever is left before exiting
+        leftover = []
+        while True:
+            try:
+                rows = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if rows:
+                leftover.extend(rows)
+        if leftover:
+            self._commit(leftover)
+
+    def stats(self):
+        with self._written:
+            return {
+                "queued":     self.queued - self.rows - self.failed,
+                "written":    self.rows,
+                "batches":    self.batches,
+                "avg_batch":  round(self.rows / self.batches, 1) if self.batches else 0.0,
+                "failed":     self.failed
+            }
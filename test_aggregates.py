@@ -0,0 +1,102 @@
+"""History aggregates (aggregates.py): trigger-maintained tables against a full recompute."""
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from aggregates import history_version, init_aggregates, rebuild_aggregates, timeseries, totals
+
+
+HISTORY = '''
+    CREATE TABLE history (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename    TEXT,
+        file_type   TEXT,
+        ai_score    REAL,
+        human_score REAL,
+        verdict     TEXT,
+        confidence  REAL,
+        timestamp   DATETIME DEFAULT CURRENT_TIMESTAMP,
+        blob        TEXT
+    )
+'''
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.execute(HISTORY)
+    init_aggregates(conn)
+    return conn
+
+
+def insert(conn, rng, n):
+    start = datetime(2026, 1, 1)
+    conn.executemany(
+        "INSERT INTO history (filename, file_type, ai_score, verdict, timestamp) VALUES (?,?,?,?,?)",
+        [(f"f{i}", rng.choice(["image", "text", "video", None]), rng.choice([rng.random(), None]),
+          rng.choice(["AI Generated", "Human Created", "Uncertain", None]),
+          (start + timedelta(minutes=rng.randrange(3 * 24 * 60))).strftime("%Y-%m-%d %H:%M:%S"))
+         for i in range(n)]
+    )
+
+
+def snapshot(conn):
+    """Both aggregate tables, empty buckets dropped and sums rounded."""
+    return (
+        sorted((t, v, c, round(s, 6)) for t, v, c, s in
+               conn.execute("SELECT * FROM history_totals WHERE count > 0")),
+        sorted((g, b, t, v, c, round(s, 6)) for g, b, t, v, c, s in
+               conn.execute("SELECT * FROM history_rollups WHERE count > 0")),
+    )
+
+
+def test_triggers_match_a_recompute_after_inserts_and_deletes(conn):
+    rng = random.Random(5)
+    insert(conn, rng, 500)
+    conn.execute("DELETE FROM history WHERE id % 3 = 0")
+    insert(conn, rng, 200)
+    conn.execute("DELETE FROM history WHERE file_type = 'text' AND id % 2 = 0")
+
+    maintained = snapshot(conn)
+    rebuild_aggregates(conn)
+    assert maintained == snapshot(conn)
+
+
+def test_totals_match_count_star(conn):
+    insert(conn, random.Random(6), 300)
+    conn.execute("DELETE FROM history WHERE id <= 50")
+    summary = totals(conn)
+    assert summary["total"] == conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+    for file_type, count in conn.execute("SELECT COALESCE(file_type, ''), COUNT(*) FROM history GROUP BY 1"):
+        assert summary["by_type"][file_type] == count
+    avg = conn.execute("SELECT TOTAL(ai_score) / COUNT(*) FROM history").fetchone()[0]
+    assert summary["avg_ai_score"] == round(avg, 4)
+
+
+def test_timeseries_buckets_match_count_star(conn):
+    insert(conn, random.Random(7), 300)
+    days = timeseries(conn, "day", datetime(2026, 1, 1), file_type="image")
+    for day in days:
+        count = conn.execute(
+            "SELECT COUNT(*) FROM history WHERE file_type = 'image' AND date(timestamp) = date(?)", (day["bucket"],)
+        ).fetchone()[0]
+        assert day["total"] == count
+    assert sum(day["total"] for day in days) == totals(conn)["by_type"]["image"]
+
+
+def test_existing_history_is_backfilled():
+    fresh = sqlite3.connect(":memory:", isolation_level=None)
+    fresh.execute(HISTORY)
+    insert(fresh, random.Random(8), 100)
+    init_aggregates(fresh)
+    assert totals(fresh)["total"] == 100
+
+
+def test_version_changes_on_every_write(conn):
+    before = history_version(conn)
+    insert(conn, random.Random(9), 2)
+    conn.execute("UPDATE history SET verdict = 'Uncertain' WHERE id = 1")
+    conn.execute("DELETE FROM history WHERE id = 2")
+    assert history_version(conn) == before + 4
@@ -0,0 +1,68 @@
+"""asyncio mode (async_app.py): upload size cap and streamed provider bodies."""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from aiohttp import web
+
+import async_app
+from config import Config
+from spool import UploadSpool
+
+
+async def serve(application):
+    runner = web.AppRunner(application)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f"http://{host}:{port}"
+
+
+def test_streamed_body_is_resent_whole_on_retry():
+    data   = os.urandom(200_000)
+    upload = UploadSpool.from_bytes(data)
+    seen   = []
+
+    async def provider(request):
+        seen.append((request.headers.get("Content-Length"), await request.read()))
+        return web.json_response({}, status=503 if len(seen) == 1 else 200)
+
+    async def run():
+        application = web.Application(client_max_size=1 << 24)
+        application.router.add_post("/", provider)
+        runner, base = await serve(application)
+        try:
+            async with aiohttp.ClientSession() as session:
+                with upload.reader() as reader, ThreadPoolExecutor(2) as pool:
+                    return await async_app.AsyncProviderClient("test", 5).request(
+                        session, "POST", base + "/", stream=async_app._streamed(pool, reader),
+                        headers={"Content-Length": str(len(reader))})
+        finally:
+            await runner.cleanup()
+
+    status, _ = asyncio.run(run())
+    assert status == 200
+    assert seen == [(str(len(data)), data)] * 2
+
+
+def test_oversized_multipart_upload_is_a_413():
+    async def parts():
+        for _ in range(Config.MAX_CONTENT_LENGTH // async_app.CHUNK + 2):
+            yield b"x" * async_app.CHUNK
+
+    async def run():
+        runner, base = await serve(await async_app.create_app())
+        try:
+            with aiohttp.MultipartWriter("form-data") as body:          # chunked: no Content-Length to check
+                part = body.append(parts())
+                part.set_content_disposition("form-data", name="image", filename="big.png")
+            async with aiohttp.ClientSession() as session:
+                async with session.post(base + "/api/analyze/image", data=body) as response:
+                    return response.status, await response.json()
+        finally:
+            await runner.cleanup()
+
+    status, body = asyncio.run(run())
+    assert status == 413 and body["success"] is False
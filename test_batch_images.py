@@ -0,0 +1,67 @@
+"""/api/analyze/images: concurrent scoring, input order and per-item failures."""
+import io
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app as omnidetect
+from config import Config
+
+
+def png(seed):
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(seed).integers(0, 255, (32, 32, 3), dtype=np.uint8)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Slow Sightengine stand-in recording its peak concurrency; files named bad-* fail."""
+    state = {"active": 0, "peak": 0}
+    lock  = threading.Lock()
+
+    def analyze(upload, filename="image"):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.1)
+        with lock:
+            state["active"] -= 1
+        if filename.startswith("bad-"):
+            return {"error": "provider rejected the image"}
+        return {"ai_generated": 0.9, "model": "Sightengine"}
+
+    monkeypatch.setattr(omnidetect, "analyze_with_sightengine", analyze)
+    monkeypatch.setattr(omnidetect, "analyze_with_huggingface", lambda *args: {"error": "unavailable"})
+    omnidetect.ensure_schema()
+    return state
+
+
+def post(files):
+    return omnidetect.app.test_client().post(
+        "/api/analyze/images", data={"images": [(io.BytesIO(data), name) for name, data in files]})
+
+
+def test_images_are_scored_concurrently_in_input_order(provider):
+    files = [(f"img-{i}.png", png(100 + i)) for i in range(6)]
+    body  = post(files).get_json()
+    assert body["success"] and body["succeeded"] == 6
+    assert [(r["index"], r["filename"]) for r in body["results"]] == [(i, name) for i, (name, _) in enumerate(files)]
+    assert provider["peak"] > 1
+
+
+def test_one_failed_image_does_not_fail_the_batch(provider):
+    files = [("img-a.png", png(200)), ("bad-b.png", png(201)), ("img-c.png", png(202))]
+    body  = post(files).get_json()
+    assert (body["total"], body["succeeded"], body["failed"]) == (3, 2, 1)
+    assert [r["success"] for r in body["results"]] == [True, False, True]
+    assert "error" in body["results"][1]
+
+
+def test_too_many_files_is_a_400(provider):
+    files = [(f"img-{i}.png", b"x") for i in range(Config.BATCH_MAX_FILES + 1)]
+    response = post(files)
+    assert response.status_code == 400 and not response.get_json()["success"]
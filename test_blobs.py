@@ -0,0 +1,96 @@
+"""Upload blob store (blobs.py): reference counts kept by triggers, and the collector."""
+import os
+import sqlite3
+
+import pytest
+
+from blobs import BlobStore, init_blob_refs
+from spool import UploadSpool
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "database.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT, blob TEXT)")
+    init_blob_refs(conn)
+    conn.close()
+    return BlobStore(path, str(tmp_path / "uploads"), grace=0)
+
+
+def refs(store, digest):
+    row = store._conn().execute("SELECT refs FROM blobs WHERE digest = ?", (digest,)).fetchone()
+    return None if row is None else row[0]
+
+
+def add_history(store, digest):
+    return store._conn().execute("INSERT INTO history (filename, blob) VALUES ('x.png', ?)", (digest,)).lastrowid
+
+
+def age(store, seconds):
+    store._conn().execute("UPDATE blobs SET last_used = last_used - ?", (seconds,))
+
+
+def test_identical_uploads_are_stored_once(store):
+    first  = store.put(UploadSpool.from_bytes(b"same bytes"))
+    second = store.put(UploadSpool.from_bytes(b"same bytes"))
+    assert first == second
+    with store.open(first) as f:
+        assert f.read() == b"same bytes"
+    assert (store.stored, store.deduplicated) == (1, 1)
+
+
+def test_triggers_count_history_rows(store):
+    digest = store.put(UploadSpool.from_bytes(b"image"))
+    assert refs(store, digest) == 0
+    row_ids = [add_history(store, digest) for _ in range(3)]
+    assert refs(store, digest) == 3
+    store._conn().execute("DELETE FROM history WHERE id = ?", (row_ids[0],))
+    assert refs(store, digest) == 2
+
+
+def test_collects_only_unreferenced_blobs(store):
+    kept    = store.put(UploadSpool.from_bytes(b"kept"))
+    dropped = store.put(UploadSpool.from_bytes(b"dropped"))
+    add_history(store, kept)
+    age(store, 60)
+    assert store.collect() == {"bytes": len(b"dropped"), "blobs": 1}
+    assert os.path.exists(store.path_for(kept))
+    assert not os.path.exists(store.path_for(dropped))
+    assert refs(store, dropped) is None
+
+
+def test_grace_protects_recent_blobs(store):
+    store.grace = 600
+    store.put(UploadSpool.from_bytes(b"queued history row"))
+    assert store.collect()["blobs"] == 0
+
+
+def test_refs_survive_age_eviction_and_reupload(store):
+    """A referenced blob dropped by the age sweep keeps its count when stored again."""
+    digest = store.put(UploadSpool.from_bytes(b"old upload"))
+    add_history(store, digest)
+    store.max_age = 30
+    age(store, 60)
+    assert store.collect()["blobs"] == 1
+    assert refs(store, digest) is None
+
+    store.put(UploadSpool.from_bytes(b"old upload"))
+    assert refs(store, digest) == 1
+    store.max_age = 0
+    age(store, 60)
+    assert store.collect()["blobs"] == 0
+    assert os.path.exists(store.path_for(digest))
+
+
+def test_budget_evicts_least_recently_used(store):
+    older = store.put(UploadSpool.from_bytes(b"o" * 100))
+    newer = store.put(UploadSpool.from_bytes(b"n" * 100))
+    add_history(store, older)
+    add_history(store, newer)
+    age(store, 60)
+    store._conn().execute("UPDATE blobs SET last_used = last_used - 60 WHERE digest = ?", (older,))
+    store.max_bytes = 150
+    assert store.collect() == {"bytes": 100, "blobs": 1}
+    assert not os.path.exists(store.path_for(older))
+    assert os.path.exists(store.path_for(newer))
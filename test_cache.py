@@ -0,0 +1,58 @@
+"""Result cache (cache.py): memory and disk tiers, expiry, size cap."""
+import time
+
+from cache import ResultCache, hash_text
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResultCache(str(tmp_path / "cache.db"), **kwargs)
+
+
+def test_miss_then_memory_hit(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("text:a") is None
+    cache.set("text:a", {"ai_generated": 0.9})
+    assert cache.get("text:a") == {"ai_generated": 0.9}
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits_memory"], stats["hits_disk"]) == (1, 1, 0)
+
+
+def test_disk_hit_from_another_instance(tmp_path):
+    make_cache(tmp_path).set("text:a", {"ai_generated": 0.2})
+    other = make_cache(tmp_path)                # another worker: empty memory tier, same table
+    assert other.get("text:a") == {"ai_generated": 0.2}
+    assert other.get("text:a") == {"ai_generated": 0.2}
+    stats = other.stats()
+    assert (stats["hits_disk"], stats["hits_memory"]) == (1, 1)
+
+
+def test_lookup_tries_namespaces_in_order(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("hf:abc", {"provider": "huggingface"})
+    assert cache.lookup(["se", "hf"], "abc") == ("hf", {"provider": "huggingface"})
+    assert cache.lookup(["se", "hf"], "def") == (None, None)
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = make_cache(tmp_path, ttl=0.05)
+    cache.set("text:a", {"ai_generated": 0.5})
+    time.sleep(0.1)
+    assert cache.get("text:a") is None
+    assert make_cache(tmp_path).get("text:a") is None
+
+
+def test_eviction_caps_rows(tmp_path):
+    cache = make_cache(tmp_path, memory_size=4, max_rows=10)
+    cache.EVICT_EVERY = 5
+    for i in range(30):
+        cache.set(f"text:{i}", {"i": i})
+    rows = cache._conn().execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+    assert rows <= 10 + cache.EVICT_EVERY
+    assert cache.stats()["memory_size"] == 4
+    assert cache.get("text:29") == {"i": 29}
+    assert make_cache(tmp_path).get("text:0") is None       # oldest rows went first
+
+
+def test_hash_text_ignores_whitespace():
+    assert hash_text("Hello   world\n") == hash_text(" Hello world")
+    assert hash_text("Hello world") != hash_text("hello world")
@@ -0,0 +1,74 @@
+"""Cascade decision bands (cascade.py): both edges must be reachable by the local scores."""
+import io
+
+import pytest
+from PIL import ExifTags, Image, PngImagePlugin
+
+from cascade import CAMERA_SCORE, GENERATOR_SCORE, NEUTRAL_SCORE, Cascade, image_metadata_score
+from config import Config
+from text_engine import engine
+
+
+AI_TEXT = ("In today's fast-paced world, it is important to note that technology plays a crucial role. "
+           "Furthermore, it is worth noting that we must delve into the multifaceted landscape. "
+           "In conclusion, leveraging these insights fosters a seamless and robust synergy. "
+           "Moreover, this comprehensive approach underscores the pivotal importance of innovation.")
+HUMAN_TEXT = ("Missed the bus again. Ugh! My boss who never notices anything at all unless someone from upstairs "
+              "is visiting with coffee and slides saw me sneak in at twenty to ten and just raised one eyebrow. "
+              "Whatever. Lunch was cold. Tomorrow I'm biking across the old bridge past the bakery, rain or shine "
+              "with headphones on because frankly nothing else gets me moving before dawn. Maybe.")
+
+
+def image_bytes(fmt, **save):
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), (120, 80, 40)).save(buf, fmt, **save)
+    buf.seek(0)
+    return buf
+
+
+@pytest.mark.parametrize("score, decisive", [
+    (0.00, True), (0.14, True), (0.15, False), (0.50, False), (0.85, False), (0.86, True), (1.00, True),
+])
+def test_band_edges(score, decisive):
+    assert Cascade("text", 0.15, 0.85).decisive(score) is decisive
+
+
+def test_disabled_never_decides():
+    cascade = Cascade("text", 0.15, 0.85, enabled=False)
+    assert not cascade.decisive(0.0) and not cascade.decisive(1.0)
+
+
+def test_record_counts_tiers():
+    cascade = Cascade("image", 0.15, 0.85)
+    cascade.record("local", 0.01)
+    cascade.record("provider", 0.5)
+    stats = cascade.stats()
+    assert stats["tiers"]["local"]["count"] == 1 and stats["tiers"]["provider"]["count"] == 1
+    assert stats["provider_calls_saved"] == 1 and stats["escalated"] == 1
+
+
+def test_text_scores_reach_both_edges():
+    cascade = Cascade("text", Config.CASCADE_TEXT_LOW, Config.CASCADE_TEXT_HIGH)
+    ai, human = engine.score_batch([AI_TEXT, HUMAN_TEXT]).tolist()
+    assert ai > cascade.high and cascade.decisive(ai)
+    assert human < cascade.low and cascade.decisive(human)
+
+
+def test_image_scores_reach_both_edges():
+    cascade = Cascade("image", Config.CASCADE_IMAGE_LOW, Config.CASCADE_IMAGE_HIGH)
+    assert cascade.decisive(GENERATOR_SCORE) and GENERATOR_SCORE > cascade.high
+    assert cascade.decisive(CAMERA_SCORE) and CAMERA_SCORE < cascade.low
+    assert not cascade.decisive(NEUTRAL_SCORE)
+
+
+def test_image_metadata_signals():
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make]  = "Canon"
+    exif[ExifTags.Base.Model] = "EOS R6"
+    assert image_metadata_score(image_bytes("JPEG", exif=exif)) == (CAMERA_SCORE, "exif:camera")
+
+    info = PngImagePlugin.PngInfo()
+    info.add_text("parameters", "a castle, highly detailed, steps: 30")
+    assert image_metadata_score(image_bytes("PNG", pnginfo=info)) == (GENERATOR_SCORE, "png:parameters")
+
+    assert image_metadata_score(image_bytes("PNG")) == (NEUTRAL_SCORE, None)
@@ -0,0 +1,58 @@
+"""/api/history: keyset pagination and ETag revalidation."""
+import pytest
+
+import app as omnidetect
+
+
+@pytest.fixture(scope="module")
+def client():
+    omnidetect.ensure_schema()
+    omnidetect._save_history_many([
+        (f"text_{i}", "text" if i % 2 else "image", i / 10, 1 - i / 10, "Paging Test", 0.5, None)
+        for i in range(7)
+    ])
+    return omnidetect.app.test_client()
+
+
+def pages(client, query):
+    """Follow next_cursor to the end; returns the pages' filenames (this module's rows only)."""
+    seen, cursor = [], None
+    while True:
+        url = f"/api/history?verdict=Paging%20Test&{query}" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        assert body["success"]
+        seen.append([row["filename"] for row in body["history"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return seen
+
+
+def test_cursor_walks_every_row_once_newest_first(client):
+    seen = pages(client, "limit=3&fields=filename")
+    assert [len(page) for page in seen] == [3, 3, 1]
+    assert sum(seen, []) == [f"text_{i}" for i in reversed(range(7))]
+
+
+def test_cursor_keeps_filters(client):
+    seen = pages(client, "limit=2&file_type=text&fields=filename")
+    assert sum(seen, []) == ["text_5", "text_3", "text_1"]
+
+
+def test_bad_cursor_is_a_400(client):
+    response = client.get("/api/history?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_etag_revalidates_until_history_changes(client):
+    first = client.get("/api/history?limit=2")
+    etag  = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    assert client.get("/api/history?limit=2", headers={"If-None-Match": etag}).status_code == 304
+    other = client.get("/api/history?limit=3", headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["ETag"] != etag
+
+    omnidetect._save_history("late.txt", "text", 0.9, 0.1, "AI Generated", 0.8)
+    changed = client.get("/api/history?limit=2", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.get_json()["history"][0]["filename"] == "late.txt"
@@ -0,0 +1,84 @@
+"""Pooled provider clients (http_client.py): retries, body rewinds and connection reuse."""
+import io
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import ProviderClient
+
+
+class Provider(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"                               # keep-alive, like the real APIs
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.bodies.append(body)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Provider)
+    httpd.bodies, httpd.statuses = [], []
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def client(retries=2):
+    return ProviderClient("test", pool_size=2, read_timeout=5, connect_timeout=1,
+                          retries=retries, backoff=0, backoff_max=0)
+
+
+def test_retryable_statuses_are_retried_with_the_body_rewound(server):
+    server.statuses += [503, 429]
+    http = client()
+    response = http.post(server.url, data=io.BytesIO(b"upload bytes"))
+    assert response.status_code == 200
+    assert server.bodies == [b"upload bytes"] * 3
+    assert http.stats()["retries"] == 2
+
+
+def test_gives_up_after_the_last_retry(server):
+    server.statuses += [503] * 3
+    response = client(retries=1).post(server.url, data=b"x")
+    assert response.status_code == 503 and len(server.bodies) == 2
+
+
+def test_client_errors_are_not_retried(server):
+    server.statuses += [400]
+    assert client().post(server.url, data=b"x").status_code == 400
+    assert len(server.bodies) == 1
+
+
+def test_connections_are_reused(server):
+    http = client()
+    for _ in range(5):
+        http.post(server.url, data=b"x").close()
+    stats = http.stats()
+    assert stats["connections_made"] == 1 and stats["requests"] == 5
+    assert stats["idle_connections"] == 1 and stats["in_flight"] == 0
+
+
+def test_connection_errors_are_retried_then_raised():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]                            # nothing listens here
+    http = client(retries=2)
+    with pytest.raises(requests.ConnectionError):
+        http.post(f"http://127.0.0.1:{port}/", data=b"x")
+    assert http.stats()["retries"] == 2 and http.stats()["failures"] == 1
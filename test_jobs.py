@@ -0,0 +1,82 @@
+"""Job queue (jobs.py): retries, lease expiry and re-claim, abandoned jobs."""
+import time
+
+import pytest
+
+from jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), workers=1, max_attempts=2, backoff=0, lease=0.05)
+
+
+def expire_lease(queue, job_id):
+    queue._conn().execute("UPDATE jobs SET updated_at = updated_at - 1 WHERE id = ?", (job_id,))
+
+
+def test_handler_result_is_stored(queue):
+    queue.register("echo", lambda payload, params: ({"success": True, "data": {"n": params["n"]}}, 200))
+    job_id = queue.submit("echo", {"n": 3}, b"x")
+    queue._run(queue._claim())
+    job = queue.get(job_id)
+    assert job["status"] == "succeeded" and job["result"] == {"n": 3} and job["attempts"] == 1
+
+
+def test_server_error_is_retried_then_failed(queue):
+    queue.register("flaky", lambda payload, params: ({"success": False, "error": "upstream"}, 502))
+    job_id = queue.submit("flaky")
+    queue._run(queue._claim())
+    assert queue.get(job_id)["status"] == "queued"
+    queue._run(queue._claim())
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["error"] == "upstream" and job["attempts"] == 2
+
+
+def test_client_error_is_not_retried(queue):
+    queue.register("bad", lambda payload, params: ({"success": False, "error": "bad input"}, 400))
+    job_id = queue.submit("bad")
+    queue._run(queue._claim())
+    assert queue.get(job_id)["status"] == "failed"
+
+
+def test_lapsed_lease_is_claimed_again(queue):
+    job_id = queue.submit("echo")
+    assert queue._claim()["id"] == job_id
+    assert queue._claim() is None                              # lease still live: nobody else takes it
+    expire_lease(queue, job_id)
+    row = queue._claim()
+    assert row["id"] == job_id and row["attempts"] == 1
+    assert queue.get(job_id)["attempts"] == 2
+
+
+def test_abandoned_job_out_of_attempts_is_failed(queue):
+    job_id = queue.submit("echo", payload=b"upload")
+    for _ in range(2):
+        assert queue._claim()["id"] == job_id
+        expire_lease(queue, job_id)
+    assert queue._claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["error"].startswith("Worker lost")
+    assert queue._conn().execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()[0] is None
+
+
+def test_heartbeat_keeps_a_long_job_alive(queue):
+    started = []
+
+    def slow(payload, params):
+        started.append(time.time())
+        time.sleep(0.3)                                        # six leases long
+        return {"success": True, "data": {}}, 200
+
+    queue.workers, queue.poll_interval = 2, 0.01                 # an idle worker would take a lapsed lease
+    queue.register("slow", slow)
+    job_id = queue.submit("slow")
+    queue.start()
+    try:
+        deadline = time.time() + 5
+        while queue.get(job_id)["status"] != "succeeded" and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        queue.stop()
+    assert queue.get(job_id)["status"] == "succeeded" and len(started) == 1
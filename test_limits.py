@@ -0,0 +1,74 @@
+"""Admission control (limits.py): token buckets, provider slot queues and 503 load shedding."""
+import io
+from contextlib import ExitStack
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app as omnidetect
+from limits import Limits, Overloaded
+
+
+@pytest.fixture
+def limits(tmp_path):
+    return Limits(str(tmp_path / "limits.db"), rate=1.0, burst=3,
+                  capacity={"p": 1}, queue_size=1, max_wait=0.2, poll_interval=0.01)
+
+
+def test_bucket_refuses_past_the_burst_with_a_wait(limits):
+    assert [limits.take("a") for _ in range(3)] == [0, 0, 0]
+    wait = limits.take("a")
+    assert 0 < wait <= 1 and limits.limited == 1
+    assert limits.take("b") == 0                               # buckets are per client
+
+
+def test_batch_bigger_than_the_burst_runs_then_pays_it_off(limits):
+    assert limits.take("a", cost=5) == 0
+    assert limits.take("a") > 1                                # two tokens in debt
+
+
+def test_full_queue_is_refused_at_once(limits):
+    held, granted = limits.enter("p")
+    assert granted
+    waiting, granted = limits.enter("p")
+    assert not granted
+    with pytest.raises(Overloaded) as refused:
+        limits.enter("p")
+    assert refused.value.retry_after >= 1 and limits.shed == 1
+
+    limits.leave(held)
+    assert limits.poll(waiting)                                # first in line takes the freed slot
+
+
+def test_wait_past_max_wait_is_refused(limits):
+    with limits.slot("p"):
+        with pytest.raises(Overloaded):
+            with limits.slot("p"):
+                pass
+    assert limits.stats()["providers"]["p"] == {"limit": 1, "in_flight": 0, "queued": 0}
+
+
+def test_unlimited_provider_needs_no_slot(limits):
+    with limits.slot("other"):
+        assert limits.stats()["providers"]["p"]["in_flight"] == 0
+
+
+def test_shed_image_request_is_a_503_with_retry_after(monkeypatch, tmp_path):
+    full = Limits(str(tmp_path / "limits.db"), rate=0, capacity={"sightengine": 1, "huggingface": 1},
+                  queue_size=0, max_wait=0.2)
+    monkeypatch.setattr(omnidetect, "limits", full)
+    monkeypatch.setattr(omnidetect, "analyze_with_sightengine", lambda *args: {"ai_generated": 0.5})
+    monkeypatch.setattr(omnidetect, "analyze_with_huggingface", lambda *args: {"ai_generated": 0.5})
+    omnidetect.ensure_schema()
+
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(11).integers(0, 255, (32, 32, 3), dtype=np.uint8)).save(buf, "PNG")
+    with ExitStack() as stack:
+        stack.enter_context(full.slot("sightengine"))
+        stack.enter_context(full.slot("huggingface"))
+        response = omnidetect.app.test_client().post(
+            "/api/analyze/image", data={"image": (io.BytesIO(buf.getvalue()), "shed.png")})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.get_json()["retry_after"] == int(response.headers["Retry-After"])
@@ -0,0 +1,79 @@
+"""Media analysis (media.py, /api/analyze/media): frame spreading, the per-clip call cap, stats."""
+import io
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app as omnidetect
+from config import Config
+from media import spread
+
+
+def clip(seed, frames=12):
+    """An animated GIF of `frames` unrelated noise frames, one second each."""
+    rng    = np.random.default_rng(seed)
+    images = [Image.fromarray(rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)) for _ in range(frames)]
+    buf    = io.BytesIO()
+    images[0].save(buf, "GIF", save_all=True, append_images=images[1:], duration=1000)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Sightengine stand-in that counts its calls."""
+    calls = []
+    lock  = threading.Lock()
+
+    def analyze(upload, filename="image"):
+        with lock:
+            calls.append(filename)
+        return {"ai_generated": 0.9, "model": "Sightengine"}
+
+    monkeypatch.setattr(omnidetect, "analyze_with_sightengine", analyze)
+    omnidetect.ensure_schema()
+    return calls
+
+
+def post_clip(data, **form):
+    return omnidetect.app.test_client().post(
+        "/api/analyze/media", data={"media": (io.BytesIO(data), "clip.gif"), **form})
+
+
+def test_spread_keeps_items_evenly_spaced():
+    assert spread(list(range(10)), 20) == list(range(10))
+    assert spread(list(range(10)), 5) == [0, 2, 4, 6, 8]
+    assert spread(list(range(10)), 0) == []
+
+
+def test_provider_calls_are_capped_per_clip(provider):
+    response = post_clip(clip(1), max_provider_calls="3")
+    data     = response.get_json()["data"]
+    assert response.status_code == 200
+    assert data["provider_calls"] == len(provider) == 3
+    assert data["frames_decoded"] == 12
+    tiers = [f["tier"] for f in data["frames"]]
+    assert tiers.count("provider") == 3
+    assert tiers.count(None) == len(tiers) - 3                   # left to the nearest scored frame
+
+
+def test_requested_cap_is_clamped_to_the_server_limit(provider):
+    response = post_clip(clip(2, frames=Config.MEDIA_MAX_PROVIDER_CALLS + 4), max_provider_calls="1000")
+    assert response.get_json()["data"]["provider_calls"] == len(provider) == Config.MEDIA_MAX_PROVIDER_CALLS
+
+
+def test_cached_frames_cost_no_calls(provider):
+    data = clip(3, frames=4)
+    post_clip(data)
+    calls = len(provider)
+    second = post_clip(data).get_json()["data"]
+    assert len(provider) == calls and second["provider_calls"] == 0
+    assert {f["tier"] for f in second["frames"]} == {"cache"}
+
+
+def test_clips_count_in_stats(provider):
+    post_clip(clip(4, frames=2))
+    stats = omnidetect.app.test_client().get("/api/stats").get_json()["stats"]
+    assert stats["video_analyses"] >= 1
+    assert stats["image_analyses"] + stats["text_analyses"] + stats["video_analyses"] == stats["total_analyses"]
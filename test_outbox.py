@@ -0,0 +1,94 @@
+"""Email outbox (outbox.py): retries, Idempotency-Key stability and deduplication."""
+import time
+
+import pytest
+
+from outbox import Outbox
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.headers     = {}
+        self.text        = ""
+        self._data       = data or {}
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(str(tmp_path / "database.db"), rate=1000, backoff=0, max_attempts=3, dedupe_window=60)
+    box.calls, box.replies = [], []
+
+    def post(rows, key):
+        box.calls.append(([row["id"] for row in rows], key))
+        return box.replies.pop(0)
+
+    box._post = post
+    return box
+
+
+def dispatch(box):
+    rows, key = box._claim()
+    if rows:
+        box._send(rows, key)
+    return rows
+
+
+def status(box):
+    return dict(box._conn().execute("SELECT id, status FROM outbox").fetchall())
+
+
+def test_batch_is_sent_in_one_call(outbox):
+    ids = [outbox.enqueue("contact", {"to": [f"{i}@example.com"]}) for i in range(3)]
+    outbox.replies.append(FakeResponse(200, {"data": [{"id": "a"}, {"id": "b"}, {"id": "c"}]}))
+    dispatch(outbox)
+    assert [call[0] for call in outbox.calls] == [ids]
+    assert set(status(outbox).values()) == {"sent"}
+
+
+def test_retry_resends_the_same_group_under_the_same_key(outbox):
+    ids = [outbox.enqueue("contact", {"n": i}) for i in range(2)]
+    outbox.replies += [FakeResponse(503), FakeResponse(200, {"data": [{"id": "a"}, {"id": "b"}]})]
+    dispatch(outbox)
+    late = outbox.enqueue("contact", {"n": 2})                # must not join the retried call
+    time.sleep(0.01)
+    dispatch(outbox)
+    (first_ids, first_key), (retry_ids, retry_key) = outbox.calls
+    assert first_ids == retry_ids == ids and first_key == retry_key
+    assert status(outbox) == {ids[0]: "sent", ids[1]: "sent", late: "queued"}
+
+
+def test_gives_up_after_max_attempts(outbox):
+    message_id = outbox.enqueue("contact", {"n": 1})
+    outbox.replies += [FakeResponse(500)] * 3
+    for _ in range(3):
+        dispatch(outbox)
+    assert status(outbox) == {message_id: "failed"}
+    assert dispatch(outbox) == []
+
+
+def test_rejected_batch_falls_back_to_single_sends(outbox):
+    good, bad = outbox.enqueue("contact", {"n": 1}), outbox.enqueue("contact", {"n": 2})
+    outbox.replies += [FakeResponse(422), FakeResponse(200, {"id": "a"}), FakeResponse(422)]
+    dispatch(outbox)
+    assert [call[0] for call in outbox.calls] == [[good, bad], [good], [bad]]
+    assert len({key for _, key in outbox.calls}) == 3
+    assert status(outbox) == {good: "sent", bad: "failed"}
+
+
+def test_dedupe_within_window_of_first_message(outbox):
+    first = outbox.enqueue("contact", {"n": 1}, dedupe_key="form")
+    assert outbox.enqueue("contact", {"n": 1}, dedupe_key="form") is None
+    outbox._conn().execute("UPDATE outbox SET created_at = created_at - 59 WHERE id = ?", (first,))
+    assert outbox.enqueue("contact", {"n": 1}, dedupe_key="form") is None
+    outbox._conn().execute("UPDATE outbox SET created_at = created_at - 2 WHERE id = ?", (first,))
+    assert outbox.enqueue("contact", {"n": 1}, dedupe_key="form") is not None
+
+
+def test_dedupe_forever_with_zero_window(outbox):
+    assert outbox.enqueue("newsletter", {"n": 1}, dedupe_key="newsletter:a@b.c", dedupe_window=0)
+    outbox._conn().execute("UPDATE outbox SET created_at = created_at - 1e6")
+    assert outbox.enqueue("newsletter", {"n": 1}, dedupe_key="newsletter:a@b.c", dedupe_window=0) is None
@@ -0,0 +1,48 @@
+"""Near-duplicate index (phash.py): multi-index search and stale-candidate skipping."""
+import random
+
+from phash import MultiIndexHash, NearDuplicateIndex, hamming
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_within_matches_a_linear_scan():
+    rng    = random.Random(7)
+    base   = [rng.getrandbits(64) for _ in range(50)]
+    stored = base + [flip(v, *rng.sample(range(64), rng.randint(1, 8))) for v in base]
+    index  = MultiIndexHash()
+    for i, value in enumerate(stored):
+        index.add(i, value)
+    for query in base[:10]:
+        expected = sorted((hamming(v, query), i) for i, v in enumerate(stored) if hamming(v, query) <= 6)
+        assert index.within(query, 6) == expected
+        assert index.search(query, 6) == expected[0]
+
+
+def test_lookup_skips_expired_nearest_candidate(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "phash.db"), max_distance=6, ttl=60)
+    query = 0x0123456789ABCDEF
+    index.add(query, {"verdict": "nearest"})
+    index.add(flip(query, 3, 40), {"verdict": "farther"})
+    assert index.lookup(query) == (0, {"verdict": "nearest"})
+
+    index._conn().execute("UPDATE phash_index SET created_at = created_at - 120 WHERE id = 1")
+    index._conn().commit()
+    assert index.lookup(query) == (2, {"verdict": "farther"})
+
+
+def test_lookup_skips_evicted_nearest_candidate(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "phash.db"), max_distance=6)
+    query = 0xFEDCBA9876543210
+    index.add(flip(query, 1), {"verdict": "evicted"})
+    index.add(flip(query, 5, 9, 33), {"verdict": "live"})
+    assert index.lookup(query)[1] == {"verdict": "evicted"}
+
+    index._conn().execute("DELETE FROM phash_index WHERE id = 1")      # another worker's sweep
+    index._conn().commit()
+    assert index.lookup(query) == (3, {"verdict": "live"})
+    assert index.lookup(flip(query, 20, 21, 22, 23, 24, 25, 26)) == (None, None)
@@ -0,0 +1,44 @@
+"""History export (reports.py, /api/history/export): CSV formula escaping and chunking."""
+import csv
+import io
+import json
+
+import app as omnidetect
+from reports import csv_chunks, ndjson_chunks
+
+
+FORMULAS = ["=HYPERLINK(\"http://x\")", "+1+1", "-2+3", "@SUM(A1)", "\t=1+1", "\r=1+1"]
+
+
+def parse(chunks):
+    return list(csv.reader(io.StringIO("".join(chunks))))
+
+
+def test_formula_cells_are_escaped():
+    rows = [(name, 0.5) for name in FORMULAS] + [("photo.png", -0.25)]
+    body = parse(csv_chunks(rows, ("filename", "ai_score")))
+    assert body[0] == ["filename", "ai_score"]
+    assert [row[0] for row in body[1:]] == ["'" + name for name in FORMULAS] + ["photo.png"]
+    assert body[-1][1] == "-0.25"                               # numbers are not text: left as they are
+
+
+def test_ndjson_keeps_values_verbatim():
+    lines = "".join(ndjson_chunks([(name,) for name in FORMULAS], ("filename",))).splitlines()
+    assert [json.loads(line)["filename"] for line in lines] == FORMULAS
+
+
+def test_small_chunks_reassemble_to_the_same_csv():
+    rows = [(f"file_{i}.png", i / 100) for i in range(500)]
+    whole  = "".join(csv_chunks(rows, ("filename", "ai_score")))
+    pieces = list(csv_chunks(rows, ("filename", "ai_score"), chunk=256))
+    assert len(pieces) > 10 and "".join(pieces) == whole
+
+
+def test_export_endpoint_escapes_filenames():
+    omnidetect.ensure_schema()
+    omnidetect._save_history_many([(name, "text", 0.9, 0.1, "Export Test", 0.8, None) for name in FORMULAS])
+    response = omnidetect.app.test_client().get(
+        "/api/history/export?format=csv&verdict=Export%20Test&fields=filename,verdict")
+    assert response.status_code == 200 and response.mimetype == "text/csv"
+    body = parse([response.get_data(as_text=True)])
+    assert body == [["filename", "verdict"]] + [["'" + name, "Export Test"] for name in FORMULAS]
@@ -0,0 +1,110 @@
+"""Provider routing (router.py): circuit breaker transitions, hedging and fallback."""
+import asyncio
+import threading
+import time
+
+from config import Config
+from limits import Overloaded
+from router import ProviderHealth, ProviderRouter
+
+
+def test_breaker_opens_after_consecutive_failures():
+    health = ProviderHealth("p", failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        assert health.allow()
+        health.record(0.01, False)
+    assert health.state == "closed"
+    health.record(0.01, False)
+    assert health.state == "open"
+    assert not health.allow() and health.skipped == 1
+
+
+def test_half_open_lets_one_probe_through():
+    health = ProviderHealth("p", failure_threshold=1, cooldown=0.05)
+    health.record(0.01, False)
+    assert not health.allow()
+    time.sleep(0.06)
+    assert health.allow() and health.state == "half_open"
+    assert not health.allow()                                  # the probe is still out
+
+    health.record(0.01, False)                                 # failed probe: open again
+    assert health.state == "open" and not health.allow()
+    time.sleep(0.06)
+    assert health.allow()
+    health.record(0.01, True)                                  # successful probe: closed
+    assert health.state == "closed" and health.allow() and health.allow()
+
+
+def test_abandoned_probe_is_released_without_a_verdict():
+    health = ProviderHealth("p", failure_threshold=1, cooldown=0)
+    health.record(0.01, False)
+    assert health.allow()
+    health.abandon()
+    assert health.state == "half_open" and health.calls == 1 and health.allow()
+
+
+def test_open_breaker_is_skipped_for_the_next_provider():
+    router = ProviderRouter(hedging=False)
+    for _ in range(Config.BREAKER_FAILURE_THRESHOLD):
+        router.provider("a").record(0.01, False)
+    result = router.call([("a", lambda: {"x": "a"}), ("b", lambda: {"x": "b"})])
+    assert result == {"x": "b", "provider": "b"}
+    assert router.call([("a", lambda: {"x": "a"})])["error"].startswith("All providers unavailable")
+
+
+def test_failure_falls_back_in_order():
+    router = ProviderRouter(hedging=False)
+    result = router.call([("a", lambda: {"error": "down"}), ("b", lambda: {"x": 1})])
+    assert result == {"x": 1, "provider": "b"} and router.fallbacks == 1
+
+
+def test_overloaded_provider_reports_retry_after_and_keeps_breaker_closed():
+    def refuse():
+        raise Overloaded("queue full", retry_after=7)
+
+    router = ProviderRouter(hedging=False)
+    result = router.call([("a", refuse)])
+    assert result["retry_after"] == 7 and "error" in result
+    assert router.provider("a").calls == 0 and router.provider("a").state == "closed"
+
+
+def test_hedge_returns_the_fast_answer_and_lets_the_slow_call_finish():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return {"x": "slow"}
+
+    router = ProviderRouter(hedge_delay=0.05)
+    start  = time.perf_counter()
+    result = router.call([("slow", slow), ("fast", lambda: {"x": "fast"})])
+    assert result == {"x": "fast", "provider": "fast"}
+    assert time.perf_counter() - start < 1 and router.hedges == 1
+
+    assert router.provider("slow").calls == 0                  # still running, not cancelled
+    release.set()
+    router._pool.shutdown(wait=True)
+    assert router.provider("slow").calls == 1                  # its latency is still recorded
+
+
+def test_async_hedge_keeps_the_loser_until_it_finishes():
+    async def run():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return {"x": "slow"}
+
+        async def fast():
+            return {"x": "fast"}
+
+        router = ProviderRouter(hedge_delay=0.05)
+        result = await router.call_async([("slow", slow), ("fast", fast)])
+        held   = len(router._background)
+        release.set()
+        await asyncio.sleep(0.01)
+        return result, held, len(router._background), router.provider("slow").calls
+
+    result, held, left, slow_calls = asyncio.run(run())
+    assert result == {"x": "fast", "provider": "fast"}
+    assert (held, left, slow_calls) == (1, 0, 1)
@@ -0,0 +1,67 @@
+"""Local text scorer (text_engine.py): Rabin–Karp phrase matches against a naive scan."""
+import random
+
+import numpy as np
+import pytest
+
+from text_engine import _WORDCHAR, DEFAULT_LEXICON, TextEngine
+
+
+def naive_phrase_score(text, lexicon):
+    """Sum of the weights of the phrases found at a word start, each counted once."""
+    data  = text.lower().encode("utf-8")
+    score = 0.0
+    for phrase, weight in lexicon.items():
+        needle = phrase.encode("utf-8")
+        at = data.find(needle)
+        while at != -1 and at > 0 and _WORDCHAR[data[at - 1]]:
+            at = data.find(needle, at + 1)
+        if at != -1:
+            score += weight
+    return score
+
+
+def corpus(seed, n=200):
+    rng     = random.Random(seed)
+    phrases = list(DEFAULT_LEXICON)
+    filler  = ["the", "has", "an", "aim", "unforeseen", "fostering", "café", "naïve", "—", "of",
+               "course-work", "in", "to", "delve", "into", "(certainly)", "x", "Moreover,", "AS", "AI"]
+    texts = []
+    for _ in range(n):
+        words = [rng.choice(phrases) if rng.random() < 0.15 else rng.choice(filler)
+                 for _ in range(rng.randint(0, 40))]
+        glue  = rng.choice([" ", "  ", "\n", ". ", ""])
+        texts.append(glue.join(words))
+    return texts
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_phrase_scores_match_a_naive_scan(seed):
+    texts    = corpus(seed)
+    engine   = TextEngine()
+    expected = [naive_phrase_score(t, DEFAULT_LEXICON) for t in texts]
+    assert np.allclose(engine.features(texts)["phrase_score"], expected)
+
+
+def test_edge_cases_match_a_naive_scan():
+    texts = [
+        "",
+        "has an aim",                          # "as an ai" inside a word: no match
+        "As An AI, I cannot say.",
+        "Certainly certainly CERTAINLY",       # counted once
+        "fostering",                           # prefix of a longer word still matches
+        "delve",
+        " into the realm of",                  # "delve" / " into" across documents: no match
+        "café moreover",
+        "in today's fast-paced world",
+    ]
+    expected = [naive_phrase_score(t, DEFAULT_LEXICON) for t in texts]
+    assert np.allclose(TextEngine().features(texts)["phrase_score"], expected)
+    assert expected[1] == 0 and expected[3] == DEFAULT_LEXICON["certainly"]
+
+
+def test_short_and_overlapping_phrases_match_a_naive_scan():
+    lexicon = {"ai": 0.1, "as an ai": 0.2, "an": 0.05, "a": 0.01, "an aim": 0.3}
+    texts    = corpus(9, n=100)
+    expected = [naive_phrase_score(t, lexicon) for t in texts]
+    assert np.allclose(TextEngine(lexicon).features(texts)["phrase_score"], expected)
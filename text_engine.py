@@ -0,0 +1,248 @@
+"""
+High-throughput local text scorer (replaces the phrase-loop heuristic).
+
+A whole batch of documents is lower-cased once, concatenated into a single
+uint8 array, and everything is computed with NumPy over that array:
+
+  • phrases — a multi-pattern Rabin–Karp matcher.  A rolling polynomial
+    hash (mod 2**64) is built once per batch; for each distinct phrase
+    length the hash of the text starting at every word start is compared
+    against the lexicon's hashes in one vectorised pass, so the cost grows
+    with the number of distinct phrase lengths, not the number of phrases.
+  • stylometry — punctuation rates, words per sentence, sentence-length
+    variance, burstiness and type-token ratio, via bincount over the
+    document/sentence index of every byte.  Uniform sentences and commas
+    raise the score; uneven sentences and a varied vocabulary lower it.
+
+The per-document Python work is limited to lower()/encode().
+"""
+import json
+
+import numpy as np
+
+from config import Config
+
+
+# phrase → score added when the phrase appears at least once
+DEFAULT_LEXICON = {
+    # original heuristic phrases
+    "as an ai": 0.18, "language model": 0.18, "i cannot": 0.18, "i'm unable": 0.18,
+    "based on my training": 0.18, "as an artificial intelligence": 0.18,
+    "i don't have the ability": 0.18, "i must clarify": 0.18, "certainly": 0.18,
+    "absolutely": 0.18, "of course": 0.18, "i understand your": 0.18, "it's worth noting": 0.18,
+    # assistant boilerplate
+    "as of my last": 0.15, "knowledge cutoff": 0.15, "i hope this helps": 0.12,
+    "feel free to": 0.08, "let me know if": 0.08, "i apologize for": 0.10,
+    "it is important to note": 0.10, "it's important to remember": 0.10,
+    # stock LLM phrasing
+    "delve into": 0.10, "delves into": 0.10, "a testament to": 0.08, "rich tapestry": 0.10,
+    "navigate the complexities": 0.10, "plays a crucial role": 0.08, "in today's fast-paced": 0.10,
+    "ever-evolving": 0.06, "in conclusion": 0.06, "in summary": 0.05, "key takeaways": 0.06,
+    "furthermore": 0.04, "moreover": 0.04, "multifaceted": 0.05, "seamlessly": 0.04,
+    "pivotal": 0.04, "foster": 0.03, "leverage": 0.03, "in the realm of": 0.06,
+}
+
+BASE_SCORE = 0.30
+MAX_SCORE  = 0.95
+
+_BASE     = 0x100000001B3                       # odd, so invertible mod 2**64
+_BASE_INV = pow(_BASE, -1, 1 << 64)
+_MASK     = (1 << 64) - 1
+_MIX      = 0x9E3779B97F4A7C15                  # Fibonacci hashing: spreads short-string hashes into the top bits
+
+_DOT, _BANG, _QUESTION, _COMMA = ord("."), ord("!"), ord("?"), ord(",")
+
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[[9, 10, 11, 12, 13, 32]] = True
+_WORDCHAR = np.zeros(256, dtype=bool)            # phrase anchors: start of an alphanumeric run
+_WORDCHAR[[*range(48, 58), *range(97, 123), *range(65, 91), *range(128, 256)]] = True
+
+
+def _phrase_hash(data):
+    h, p = 0, 1
+    for byte in data:
+        h = (h + byte * p) & _MASK
+        p = (p * _BASE) & _MASK
+    return h
+
+
+def load_lexicon(path=None):
+    """DEFAULT_LEXICON, or a JSON object {phrase: weight} from `path`."""
+    if not path:
+        return dict(DEFAULT_LEXICON)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {str(k).lower(): float(v) for k, v in data.items()}
+
+
+class TextEngine:
+    def __init__(self, lexicon=None):
+        self.lexicon = dict(DEFAULT_LEXICON if lexicon is None else lexicon)
+        self.phrases = list(self.lexicon)
+        self.weights = np.array([self.lexicon[p] for p in self.phrases], dtype=np.float64)
+
+        # Every (phrase hash, byte length, phrase index), sorted by hash, plus a
+        # 64K table from the hash of a phrase's first few bytes to the lengths
+        # starting with them — anchors whose prefix misses the table are skipped.
+        encoded_phrases = [p.encode("utf-8") for p in self.phrases]
+        self._key_bytes = min(4, min((len(e) for e in encoded_phrases), default=1))
+        entries, lengths_by_key = [], {}
+        for i, encoded in enumerate(encoded_phrases):
+            entries.append((_phrase_hash(encoded), len(encoded), i))
+            key = ((_phrase_hash(encoded[:self._key_bytes]) * _MIX) & _MASK) >> 48
+            lengths_by_key.setdefault(key, set()).add(len(encoded))
+        entries.sort()
+        self._hashes     = np.array([e[0] for e in entries], dtype=np.uint64)
+        self._hash_len   = np.array([e[1] for e in entries], dtype=np.int64)
+        self._hash_ids   = np.array([e[2] for e in entries], dtype=np.int64)
+
+        self._key_count  = np.zeros(1 << 16, dtype=np.int64)
+        self._key_offset = np.zeros(1 << 16, dtype=np.int64)
+        flat = []
+        for key, lengths in lengths_by_key.items():
+            self._key_count[key]  = len(lengths)
+            self._key_offset[key] = len(flat)
+            flat.extend(sorted(lengths))
+        self._key_lengths = np.array(flat, dtype=np.int64)
+
+        self._pow     = np.ones(1, dtype=np.uint64)
+        self._pow_inv = np.ones(1, dtype=np.uint64)
+
+    def _powers(self, n):
+        """BASE**k and BASE**-k (mod 2**64) for k < n, grown geometrically and reused."""
+        if len(self._pow) < n:
+            size = max(n, 2 * len(self._pow))
+            self._pow     = np.ones(size, dtype=np.uint64)
+            self._pow_inv = np.ones(size, dtype=np.uint64)
+            np.cumprod(np.full(size - 1, _BASE,     dtype=np.uint64), out=self._pow[1:])
+            np.cumprod(np.full(size - 1, _BASE_INV, dtype=np.uint64), out=self._pow_inv[1:])
+        return self._pow[:n], self._pow_inv[:n]
+
+    def features(self, texts):
+        """Per-document feature arrays for a batch of texts."""
+        n       = len(texts)
+        blobs   = [t.lower().encode("utf-8") for t in texts]
+        lengths = np.array([len(b) for b in blobs], dtype=np.int64)
+        data    = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+        size    = len(data)
+        ends    = np.cumsum(lengths)
+        doc_of  = np.repeat(np.arange(n), lengths)
+
+        doc_start = np.zeros(size, dtype=bool)
+        doc_start[(ends - lengths)[lengths > 0]] = True
+        doc_last  = np.zeros(size, dtype=bool)
+        doc_last[ends[lengths > 0] - 1] = True
+
+        # ── Punctuation ──────────────────────────────────────────────────
+        is_term     = (data == _DOT) | (data == _BANG) | (data == _QUESTION)
+        terminators = np.bincount(doc_of[is_term], minlength=n).astype(np.float64)
+        commas      = np.bincount(doc_of[data == _COMMA], minlength=n).astype(np.float64)
+
+        # ── Words (whitespace-separated, like str.split) ─────────────────
+        is_space   = _WHITESPACE[data]
+        prev_space = np.ones(size, dtype=bool)
+        prev_space[1:] = is_space[:-1]
+        next_space = np.ones(size, dtype=bool)
+        next_space[:-1] = is_space[1:]
+        word_start = np.flatnonzero(~is_space & (prev_space | doc_start))
+        word_end   = np.flatnonzero(~is_space & (next_space | doc_last)) + 1
+        words      = np.bincount(doc_of[word_start], minlength=n).astype(np.float64)
+
+        # ── Rolling hash over the whole batch ────────────────────────────
+        pw, pw_inv = self._powers(size + 1)
+        prefix = np.zeros(size + 1, dtype=np.uint64)
+        np.cumsum(data.astype(np.uint64) * pw[:size], out=prefix[1:])     # wraps mod 2**64
+
+        def span_hash(starts, stops):
+            return (prefix[stops] - prefix[starts]) * pw_inv[starts]
+
+        # ── Phrase matches at every word-character anchor ────────────────
+        is_word    = _WORDCHAR[data]
+        prev_word  = np.zeros(size, dtype=bool)
+        prev_word[1:] = is_word[:-1]
+        anchors    = np.flatnonzero(is_word & ~(prev_word & ~doc_start))
+        anchors    = anchors[anchors + self._key_bytes <= ends[doc_of[anchors]]]
+        anchor_key = ((span_hash(anchors, anchors + self._key_bytes) * np.uint64(_MIX)) >> np.uint64(48)).astype(np.int64)
+
+        # Expand each candidate anchor into one (start, length) pair per phrase
+        # length sharing its prefix key, then hash them all at once
+        counts   = self._key_count[anchor_key]
+        keep     = counts > 0
+        counts   = counts[keep]
+        starts   = np.repeat(anchors[keep], counts)
+        rank     = np.arange(len(starts)) - np.repeat(np.cumsum(counts) - counts, counts)
+        lengths_ = self._key_lengths[np.repeat(self._key_offset[anchor_key[keep]], counts) + rank]
+        inside   = starts + lengths_ <= ends[doc_of[starts]]
+        starts, lengths_ = starts[inside], lengths_[inside]
+
+        h     = span_hash(starts, starts + lengths_)
+        pos   = np.minimum(np.searchsorted(self._hashes, h), len(self._hashes) - 1)
+        found = (self._hashes[pos] == h) & (self._hash_len[pos] == lengths_)
+        hits  = np.unique(doc_of[starts[found]] * len(self.phrases) + self._hash_ids[pos[found]])
+
+        phrase_score = np.bincount(hits // len(self.phrases),
+                                   weights=self.weights[hits % len(self.phrases)], minlength=n).astype(np.float64)
+
+        # ── Type-token ratio: distinct (document, word hash) keys ────────
+        word_doc  = doc_of[word_start]
+        word_keys = np.sort((word_doc.astype(np.uint64) << np.uint64(40))
+                            | ((span_hash(word_start, word_end) * np.uint64(_MIX)) >> np.uint64(24)))
+        distinct  = np.ones(len(word_keys), dtype=bool)
+        distinct[1:] = word_keys[1:] != word_keys[:-1]
+        unique    = np.bincount((word_keys[distinct] >> np.uint64(40)).astype(np.int64), minlength=n).astype(np.float64)
+
+        # ── Sentence lengths: runs of words between terminators ──────────
+        sentence_of = np.searchsorted(np.flatnonzero(is_term), word_start) + word_doc
+        run_start   = np.flatnonzero(np.diff(sentence_of, prepend=-1))
+        s_doc       = word_doc[run_start]
+        s_len       = np.diff(run_start, append=len(word_start)).astype(np.float64)
+        s_count     = np.bincount(s_doc, minlength=n).astype(np.float64)
+        s_sum       = np.bincount(s_doc, weights=s_len,         minlength=n)
+        s_sumsq     = np.bincount(s_doc, weights=s_len * s_len, minlength=n)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s_mean     = np.where(s_count > 0, s_sum / s_count, 0.0)
+            s_var      = np.where(s_count > 0, s_sumsq / s_count - s_mean ** 2, 0.0).clip(min=0)
+            s_std      = np.sqrt(s_var)
+            burstiness = np.where(s_std + s_mean > 0, (s_std - s_mean) / (s_std + s_mean), 0.0)
+            ttr        = np.where(words > 0, unique / words, 0.0)
+            comma_rate = np.where(words > 0, commas / words, 0.0)
+
+        return {
+            "phrase_score":         phrase_score,
+            "words":                words,
+            "avg_sentence_words":   words / np.maximum(terminators, 1),
+            "sentence_count":       s_count,
+            "sentence_length_var":  s_var,
+            "burstiness":           burstiness,
+            "type_token_ratio":     ttr,
+            "comma_rate":           comma_rate,
+        }
+
+    def score_batch(self, texts):
+        """AI-likelihood scores in [0, MAX_SCORE] for a list of texts (NumPy array)."""
+        if not texts:
+            return np.zeros(0)
+        f     = self.features(texts)
+        score = BASE_SCORE + f["phrase_score"]
+
+        avg = f["avg_sentence_words"]
+        score += 0.08 * ((avg >= 13) & (avg <= 22))                                # typical LLM sentence length
+        score += 0.05 * (f["comma_rate"] > 0.07)                                    # uniform comma use
+        score += 0.05 * ((f["sentence_count"] >= 4) & (f["burstiness"] < -0.55))    # low burstiness
+
+        # Human cues, only with enough sentences to measure: uneven sentence
+        # lengths and a varied vocabulary.  All three together take a text
+        # with no AI cue from BASE_SCORE to 0.10, below the cascade's low edge.
+        varied = f["sentence_count"] >= 4
+        score -= 0.08 * (varied & (f["burstiness"] > -0.20))                       # bursty sentence lengths
+        score -= 0.06 * (varied & (f["sentence_length_var"] >= 60))                # sentence std ≥ ~8 words
+        score -= 0.06 * (varied & (f["words"] >= 50) & (f["type_token_ratio"] >= 0.75))   # rich vocabulary
+
+        return np.round(np.clip(score, 0.0, MAX_SCORE), 4)
+
+    def score(self, text):
+        return float(self.score_batch([text])[0])
+
+
+engine = TextEngine(load_lexicon(Config.TEXT_LEXICON_PATH))